@@ -11,6 +11,7 @@ from __future__ import annotations
 
 from collections import Counter
 from typing import List, Dict, Any, Optional
+from src.utils.metrics import timed
 from src.utils.observability import log_event
 from src.utils.llm_validation import (
     validate_creative_output,
@@ -194,6 +195,7 @@ def _generate_creative_from_insight(
     }
 
 
+@timed("generate_creatives")
 def generate_creatives(
     validated_insights: List[Dict[str, Any]],
     summary: Dict[str, Any],
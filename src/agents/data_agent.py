@@ -10,23 +10,193 @@ Responsibilities:
       "by_campaign": [{ "campaign": "...", "spend": x, "ctr": y, "impressions": i, "clicks": c}, ...]
     }
 - Handle missing columns, NaN values, empty groups gracefully
+- Stream very large CSVs into mergeable partial aggregates (bounded memory)
 - Optionally write schema fingerprint (reports/schema_fingerprint.json)
 """
 from __future__ import annotations
 
+import io
 import os
-from typing import Any, Dict, List, Optional
+import re
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Dict, List, Optional, Sequence, Tuple
 import numpy as np
 
 import pandas as pd
 
-from src.utils.schema import fingerprint_and_write, validate_schema
+from src.utils.aggregates import DailyAggregate, PartialAggregates, campaign_records, daily_roas_records
+from src.utils.frame_cache import evict_lru, file_fingerprint, load_cached_frame, store_cached_frame
+from src.utils.incremental import (
+    ByteRangeReader,
+    complete_lines_end,
+    make_watermark,
+    read_header_line,
+    read_watermark,
+    watermark_is_valid,
+    write_watermark,
+)
+from src.utils.partitions import is_partitioned, load_partition_state, resolve_partitions, store_partition_state
+from src.utils.sampling import ReservoirSampler
+from src.utils.schema import EXPECTED_SCHEMA, fingerprint_and_write, typed_read_options, validate_schema
+from src.utils.metrics import timed
 from src.utils.observability import log_event
 
 _DEFAULT_DATE_COL = "date"
+_PARTITION_DATE_RE = re.compile(r"(\d{4}-\d{2}-\d{2})")
 
 
-def load_csv_safe(path: str, *, date_col: str = _DEFAULT_DATE_COL, chunksize: Optional[int] = None) -> pd.DataFrame:
+def _reader_kwargs(typed: bool, prune: bool, include_creative: bool) -> Dict[str, Any]:
+    """pd.read_csv kwargs for the schema-driven reader (usecols as a callable so absent columns are fine)."""
+    if not typed and not prune:
+        return {}
+    opts = typed_read_options(prune=prune, include_creative=include_creative)
+    if not typed:
+        opts.pop("dtype", None)
+    if "usecols" in opts:
+        keep = set(opts["usecols"])
+        opts["usecols"] = lambda c: c in keep
+    return opts
+
+
+def _read_csv(path: str, read_kwargs: Dict[str, Any], **kwargs: Any) -> pd.DataFrame:
+    """
+    pd.read_csv with declared dtypes; if a numeric column holds unparseable text,
+    retry with only the categorical hints so the load still succeeds.
+    """
+    try:
+        return _restore_dtypes(pd.read_csv(path, **read_kwargs, **kwargs), read_kwargs)
+    except (pd.errors.ParserError, pd.errors.EmptyDataError):
+        raise
+    except (ValueError, TypeError) as e:
+        if not read_kwargs.get("dtype"):
+            raise
+        log_event("data_agent", "typed_read_fallback", {"path": path, "error": str(e)})
+        relaxed = dict(read_kwargs)
+        relaxed["dtype"] = {c: t for c, t in read_kwargs["dtype"].items() if t == "category"}
+        return _restore_dtypes(pd.read_csv(path, **relaxed, **kwargs), relaxed)
+
+
+def _restore_dtypes(df: pd.DataFrame, read_kwargs: Dict[str, Any]) -> pd.DataFrame:
+    """
+    Undo reader artifacts of the declared dtypes:
+    - chunks carry different category sets, so concat yields object columns; re-encode them
+    - counts are declared float64 so NaN-bearing ones still parse; cast whole, NaN-free ones
+      back to int64, the dtype an untyped read infers (frame dtypes and fingerprints stay put)
+    """
+    counts = set(EXPECTED_SCHEMA["count_columns"])
+    for col, t in (read_kwargs.get("dtype") or {}).items():
+        if col not in df.columns:
+            continue
+        if t == "category" and df[col].dtype == object:
+            df[col] = df[col].astype("category")
+        elif col in counts and df[col].dtype == np.float64:
+            values = df[col].to_numpy()
+            if np.isfinite(values).all() and (np.trunc(values) == values).all():
+                df[col] = values.astype(np.int64)
+    return df
+
+
+def _as_date_range(date_range: Any) -> Optional[Tuple[Optional[pd.Timestamp], Optional[pd.Timestamp]]]:
+    """Normalize a (start, end) pair of date-likes (either may be None) to day Timestamps."""
+    if not date_range:
+        return None
+    start, end = date_range
+    start = pd.Timestamp(start).normalize() if start is not None else None
+    end = pd.Timestamp(end).normalize() if end is not None else None
+    return start, end
+
+
+def partition_date(path: str) -> Optional[pd.Timestamp]:
+    """
+    Date encoded in a partition path, e.g. ads_2025-01-03.csv or date=2025-01-03/part.csv.
+    The last YYYY-MM-DD in the path wins; None if the path carries no date.
+    """
+    matches = _PARTITION_DATE_RE.findall(path)
+    if not matches:
+        return None
+    try:
+        return pd.Timestamp(matches[-1])
+    except Exception:
+        return None
+
+
+def _tail_max_date(path: str, date_col: str, tail_bytes: int) -> Optional[pd.Timestamp]:
+    """Latest date among the rows in the last tail_bytes of a CSV (header + complete lines only)."""
+    size = os.path.getsize(path)
+    with open(path, "rb") as fh:
+        header = fh.readline()
+        start = max(len(header), size - tail_bytes)
+        fh.seek(start)
+        tail = fh.read()
+    if start > len(header):
+        # drop the partial line the window starts in
+        tail = tail[tail.find(b"\n") + 1:] if b"\n" in tail else b""
+    if not tail.strip():
+        return None
+    dates = pd.read_csv(io.BytesIO(header + tail), usecols=[date_col])[date_col]
+    latest = pd.to_datetime(dates, errors="coerce").max()
+    return None if pd.isna(latest) else latest.normalize()
+
+
+def latest_data_date(path: str, date_col: str = _DEFAULT_DATE_COL, *,
+                     tail_bytes: int = 1 << 20) -> Optional[pd.Timestamp]:
+    """
+    Cheap estimate of the newest day in `path` (file, directory or glob), without a full parse:
+    partition dates in file names where present, else the rows in the last tail_bytes of each
+    file (append-ordered exports end with their newest rows). None if it cannot be determined.
+    """
+    latest = None
+    for f in resolve_partitions(path):
+        try:
+            day = partition_date(f) or _tail_max_date(f, date_col, tail_bytes)
+        except Exception as e:
+            log_event("data_agent", "latest_date_unavailable", {"path": f, "error": str(e)})
+            day = None
+        if day is not None and (latest is None or day > latest):
+            latest = day
+    return latest
+
+
+def _partition_outside(path: str, date_range: Any) -> bool:
+    rng = _as_date_range(date_range)
+    day = partition_date(path) if rng else None
+    if day is None:
+        return False
+    start, end = rng
+    return (start is not None and day < start) or (end is not None and day > end)
+
+
+def _filter_date_range(df: pd.DataFrame, date_col: str, date_range: Any) -> pd.DataFrame:
+    """Keep only rows whose date falls in the inclusive [start, end] day range (NaT rows are dropped)."""
+    rng = _as_date_range(date_range)
+    if rng is None or date_col not in df.columns:
+        return df
+    if not pd.api.types.is_datetime64_any_dtype(df[date_col]):
+        df[date_col] = pd.to_datetime(df[date_col], errors="coerce")
+    start, end = rng
+    dates = df[date_col]
+    mask = dates.notna()
+    if start is not None:
+        mask &= dates >= start
+    if end is not None:
+        mask &= dates < end + pd.Timedelta(days=1)
+    return df if bool(mask.all()) else df[mask]
+
+
+@timed("load_csv_safe")
+def load_csv_safe(
+    path: str,
+    *,
+    date_col: str = _DEFAULT_DATE_COL,
+    chunksize: Optional[int] = None,
+    cache_dir: Optional[str] = None,
+    cache_max_bytes: Optional[int] = None,
+    typed: bool = True,
+    prune: bool = False,
+    include_creative: bool = True,
+    date_range: Optional[Tuple[Any, Any]] = None,
+) -> pd.DataFrame:
     """
     Load a CSV defensively with comprehensive error handling.
 
@@ -36,11 +206,19 @@ def load_csv_safe(path: str, *, date_col: str = _DEFAULT_DATE_COL, chunksize: Op
     - Date conversion issues
     - Missing columns
     - Large files with chunked loading (if chunksize specified)
+    - Warm starts from the columnar frame cache (if cache_dir specified)
 
     Args:
         path: Path to CSV file
         date_col: Name of date column to parse
         chunksize: If specified, load file in chunks and combine (for large files)
+        cache_dir: If specified, reuse/store the parsed frame in this on-disk cache
+        cache_max_bytes: Size cap for cache_dir (least recently used entries are evicted)
+        typed: Declare numeric dtypes and load dimension columns as 'category' (EXPECTED_SCHEMA)
+        prune: Skip columns no downstream stage reads
+        include_creative: With prune, keep creative text for the creative generator
+        date_range: Optional inclusive (start, end) day range; rows outside it are dropped
+            as they are read, and a date-partitioned file outside it is not parsed at all
 
     Returns:
         DataFrame with loaded data
@@ -48,6 +226,29 @@ def load_csv_safe(path: str, *, date_col: str = _DEFAULT_DATE_COL, chunksize: Op
     if not os.path.exists(path):
         raise FileNotFoundError(f"Data file not found: {path}")
 
+    read_kwargs = _reader_kwargs(typed, prune, include_creative)
+    if _partition_outside(path, date_range):
+        log_event("data_agent", "partition_skipped", {"path": path, "date_range": date_range})
+        df = _restore_dtypes(pd.read_csv(path, nrows=0, **read_kwargs), read_kwargs)
+        if date_col in df.columns:
+            df[date_col] = pd.to_datetime(df[date_col], errors="coerce")
+        return df
+
+    fingerprint = None
+    read_opts = {"date_col": date_col, "typed": typed, "prune": prune, "include_creative": include_creative}
+    if date_range:
+        read_opts["date_range"] = [str(d) if d is not None else None for d in _as_date_range(date_range)]
+    if cache_dir:
+        try:
+            fingerprint = file_fingerprint(path, cache_dir)
+            cached = load_cached_frame(path, cache_dir, read_opts=read_opts, fingerprint=fingerprint)
+            if cached is not None:
+                log_event("data_agent", "frame_cache_hit", {"path": path, "rows": len(cached)})
+                return _restore_dtypes(cached, read_kwargs)
+            log_event("data_agent", "frame_cache_miss", {"path": path})
+        except Exception as e:
+            log_event("data_agent", "frame_cache_error", {"path": path, "error": str(e)})
+
     try:
         # If chunksize specified, load in batches
         if chunksize and chunksize > 0:
@@ -60,8 +261,9 @@ def load_csv_safe(path: str, *, date_col: str = _DEFAULT_DATE_COL, chunksize: Op
             chunk_count = 0
 
             try:
-                for chunk in pd.read_csv(path, chunksize=chunksize):
-                    chunks.append(chunk)
+                for chunk in pd.read_csv(path, chunksize=chunksize, **read_kwargs):
+                    # out-of-window rows are dropped before the chunk is retained
+                    chunks.append(_filter_date_range(chunk, date_col, date_range))
                     chunk_count += 1
 
                     if chunk_count % 10 == 0:
@@ -70,7 +272,7 @@ def load_csv_safe(path: str, *, date_col: str = _DEFAULT_DATE_COL, chunksize: Op
                             "rows_so_far": sum(len(c) for c in chunks)
                         })
 
-                df = pd.concat(chunks, ignore_index=True)
+                df = _restore_dtypes(pd.concat(chunks, ignore_index=True), read_kwargs)
 
                 log_event("data_agent", "chunked_loading_complete", {
                     "total_chunks": chunk_count,
@@ -79,10 +281,10 @@ def load_csv_safe(path: str, *, date_col: str = _DEFAULT_DATE_COL, chunksize: Op
             except Exception as e:
                 log_event("data_agent", "chunked_loading_error", {"error": str(e)})
                 # Fallback to regular loading
-                df = pd.read_csv(path)
+                df = _read_csv(path, read_kwargs)
         else:
             # Regular single-read loading
-            df = pd.read_csv(path)
+            df = _read_csv(path, read_kwargs)
 
     except pd.errors.EmptyDataError:
         raise ValueError(f"CSV file is empty: {path}")
@@ -90,7 +292,7 @@ def load_csv_safe(path: str, *, date_col: str = _DEFAULT_DATE_COL, chunksize: Op
         log_event("data_agent", "parse_error", {"path": path, "error": str(e)})
         # try with more permissive options
         try:
-            df = pd.read_csv(path, low_memory=False, on_bad_lines='skip')
+            df = _read_csv(path, read_kwargs, low_memory=False, on_bad_lines='skip')
         except Exception as e2:
             raise ValueError(f"Failed to parse CSV {path}: {e2}")
     except Exception as e:
@@ -110,7 +312,8 @@ def load_csv_safe(path: str, *, date_col: str = _DEFAULT_DATE_COL, chunksize: Op
     # coerce date if present
     if date_col in df.columns:
         try:
-            df[date_col] = pd.to_datetime(df[date_col], errors="coerce")
+            if not pd.api.types.is_datetime64_any_dtype(df[date_col]):
+                df[date_col] = pd.to_datetime(df[date_col], errors="coerce")
             # Count and log NaT values
             nat_count = df[date_col].isna().sum()
             if nat_count > 0:
@@ -121,13 +324,40 @@ def load_csv_safe(path: str, *, date_col: str = _DEFAULT_DATE_COL, chunksize: Op
         except Exception as e:
             log_event("data_agent", "date_conversion_error", {"error": str(e)})
 
+    if date_range:
+        before = len(df)
+        df = _filter_date_range(df, date_col, date_range).reset_index(drop=True)
+        log_event("data_agent", "date_window_applied", {
+            "date_range": read_opts["date_range"],
+            "rows_kept": len(df),
+            "rows_read": before,
+        })
+
+    if cache_dir and fingerprint is not None:
+        try:
+            entry = store_cached_frame(path, df, cache_dir, read_opts=read_opts,
+                                       fingerprint=fingerprint, max_bytes=cache_max_bytes)
+            if entry is None:
+                log_event("data_agent", "frame_cache_skipped", {"path": path, "reason": "uncacheable_columns"})
+        except Exception as e:
+            log_event("data_agent", "frame_cache_error", {"path": path, "error": str(e)})
+
     return df
 
 
-def summarize_df(df: pd.DataFrame, *, date_col: str = _DEFAULT_DATE_COL) -> Dict[str, Any]:
+@timed("summarize_df")
+def summarize_df(
+    df: pd.DataFrame,
+    *,
+    date_col: str = _DEFAULT_DATE_COL,
+    daily: Optional[DailyAggregate] = None,
+) -> Dict[str, Any]:
     """
     Compute a minimal summary used by insight & evaluator agents.
 
+    If `daily` (built once per run) is given, the daily series is read from it
+    instead of re-grouping the frame by date.
+
     Handles:
     - Missing columns gracefully
     - NaN/infinity values
@@ -168,37 +398,13 @@ def summarize_df(df: pd.DataFrame, *, date_col: str = _DEFAULT_DATE_COL) -> Dict
         out["global"]["total_clicks"] = clicks
         out["global"]["num_creatives"] = int(df["creative_id"].nunique()) if "creative_id" in df.columns else None
 
-        # daily roas series (sorted)
-        if date_col in df.columns and "spend" in df.columns and "revenue" in df.columns:
-            try:
-                # Filter out NaT dates
-                df_clean = df[df[date_col].notna()].copy()
-
-                daily = (
-                    df_clean.groupby(pd.Grouper(key=date_col, freq="D"))
-                    .agg({"spend": "sum", "revenue": "sum"})
-                    .reset_index()
-                    .sort_values(date_col)
-                )
-
-                # Safe division for ROAS
-                daily["roas"] = daily.apply(
-                    lambda r: float(r["revenue"] / r["spend"]) if (r["spend"]
-                                                                   > 0 and not np.isnan(r["spend"])) else 0.0,
-                    axis=1
-                )
-
-                # Filter out invalid ROAS values
-                daily = daily[daily["roas"].notna() & ~np.isinf(daily["roas"])]
-
-                out["global"]["daily_roas"] = [
-                    {"date": str(d[date_col].date()), "roas": float(d["roas"])}
-                    for _, d in daily.iterrows()
-                ]
-            except Exception as e:
-                log_event("data_agent", "daily_roas_error", {"error": str(e)})
-                out["global"]["daily_roas"] = []
-        else:
+        # daily roas series (sorted), read from the shared day-indexed aggregate
+        try:
+            if daily is None:
+                daily = DailyAggregate.from_frame(df, date_col=date_col)
+            out["global"]["daily_roas"] = daily_roas_records(daily)
+        except Exception as e:
+            log_event("data_agent", "daily_roas_error", {"error": str(e)})
             out["global"]["daily_roas"] = []
 
         # by-campaign aggregation with robust error handling
@@ -212,52 +418,13 @@ def summarize_df(df: pd.DataFrame, *, date_col: str = _DEFAULT_DATE_COL) -> Dict
         if campaign_col:
             try:
                 # Remove rows with NaN campaign names
-                df_campaign = df[df[campaign_col].notna()].copy()
+                df_campaign = df[df[campaign_col].notna()]
 
                 if len(df_campaign) == 0:
                     log_event("data_agent", "empty_campaigns", {"message": "No valid campaign data after filtering"})
                     out["by_campaign"] = []
                 else:
-                    grp = (
-                        df_campaign.groupby(campaign_col)
-                        .agg({
-                            "spend": "sum" if "spend" in df.columns else lambda x: 0,
-                            "impressions": "sum" if "impressions" in df.columns else lambda x: 0,
-                            "clicks": "sum" if "clicks" in df.columns else lambda x: 0,
-                            "revenue": "sum" if "revenue" in df.columns else lambda x: 0,
-                        })
-                        .reset_index()
-                    )
-
-                    rows: List[Dict[str, Any]] = []
-                    for _, r in grp.iterrows():
-                        impressions_i = int(r.get("impressions", 0) or 0)
-                        clicks_i = int(r.get("clicks", 0) or 0)
-                        spend_i = float(r.get("spend", 0.0) or 0.0)
-                        revenue_i = float(r.get("revenue", 0.0) or 0.0)
-
-                        # Safe CTR calculation
-                        ctr = float(clicks_i / impressions_i) if impressions_i > 0 else 0.0
-                        # Safe ROAS calculation
-                        roas = float(revenue_i / spend_i) if spend_i > 0 else 0.0
-
-                        # Filter out NaN/inf
-                        ctr = 0.0 if (np.isnan(ctr) or np.isinf(ctr)) else ctr
-                        roas = 0.0 if (np.isnan(roas) or np.isinf(roas)) else roas
-
-                        rows.append(
-                            {
-                                "campaign": str(r.get(campaign_col, "")),
-                                "spend": spend_i,
-                                "impressions": impressions_i,
-                                "clicks": clicks_i,
-                                "ctr": ctr,
-                                "revenue": revenue_i,
-                                "roas": roas,
-                            }
-                        )
-                    # sort by spend desc
-                    out["by_campaign"] = sorted(rows, key=lambda x: x.get("spend", 0.0), reverse=True)
+                    out["by_campaign"] = campaign_records(df_campaign, campaign_col)
             except Exception as e:
                 log_event("data_agent", "campaign_aggregation_error", {"error": str(e)})
                 out["by_campaign"] = []
@@ -276,6 +443,325 @@ def summarize_df(df: pd.DataFrame, *, date_col: str = _DEFAULT_DATE_COL) -> Dict
     return out
 
 
+def _fold_chunks(
+    partials: PartialAggregates,
+    chunks: Any,
+    path: str,
+    date_col: str,
+    date_range: Optional[Tuple[Any, Any]],
+    read_kwargs: Dict[str, Any],
+) -> Tuple[int, int]:
+    """Fold an iterator of raw chunks into `partials`. Returns (chunk_count, nat_count)."""
+    chunk_count = 0
+    nat_count = 0
+    for chunk in chunks:
+        chunk = _restore_dtypes(chunk, read_kwargs)
+        if chunk_count == 0:
+            try:
+                is_valid, errors = validate_schema(chunk, strict=False)
+                if not is_valid:
+                    log_event("data_agent", "schema_validation_warning", {"path": path, "errors": errors})
+            except Exception as e:
+                log_event("data_agent", "schema_validation_error", {"error": str(e)})
+
+        if date_col in chunk.columns:
+            chunk[date_col] = pd.to_datetime(chunk[date_col], errors="coerce")
+            nat_count += int(chunk[date_col].isna().sum())
+        chunk = _filter_date_range(chunk, date_col, date_range)
+
+        partials.update(chunk)
+        chunk_count += 1
+
+        if chunk_count % 10 == 0:
+            log_event("data_agent", "chunk_aggregated", {
+                "chunk_number": chunk_count,
+                "rows_so_far": partials.rows,
+            })
+    return chunk_count, nat_count
+
+
+def stream_csv_aggregates(
+    path: str,
+    *,
+    date_col: str = _DEFAULT_DATE_COL,
+    chunksize: int = 100_000,
+    typed: bool = True,
+    prune: bool = False,
+    date_range: Optional[Tuple[Any, Any]] = None,
+    distinct: str = "exact",
+    hll_precision: int = 12,
+    segment_dims: Sequence[str] = (),
+) -> PartialAggregates:
+    """
+    Single-pass streaming load: fold each chunk into mergeable partial aggregates and drop it.
+
+    Unlike load_csv_safe(chunksize=...), chunks are never concatenated, so peak memory is
+    bounded by the chunk size plus the (day, campaign) aggregate state.
+
+    Args:
+        path: Path to CSV file
+        date_col: Name of date column to parse
+        chunksize: Rows per chunk
+        typed: Declare numeric dtypes / categorical dimensions (see load_csv_safe)
+        prune: Skip columns the aggregates never read (creative text included)
+        date_range: Optional inclusive (start, end) day range; out-of-window rows are
+            discarded per chunk and out-of-window date partitions are skipped
+        distinct: "exact" (creative_id set) or "hll" (HyperLogLog sketches of
+            creative_id / campaign / adset with 2**hll_precision registers)
+        segment_dims: Dimension columns kept next to (day, campaign) in the aggregate
+            state, e.g. for the rollup cube (see PartialAggregates)
+
+    Returns:
+        PartialAggregates covering every (in-window) row of the file
+    """
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"Data file not found: {path}")
+
+    read_kwargs = _reader_kwargs(typed, prune, False)
+    partials = PartialAggregates(date_col=date_col, distinct=distinct, hll_precision=hll_precision,
+                                 segment_dims=segment_dims)
+    if _partition_outside(path, date_range):
+        log_event("data_agent", "partition_skipped", {"path": path, "date_range": date_range})
+        partials.sample = _restore_dtypes(pd.read_csv(path, nrows=0, **read_kwargs), read_kwargs)
+        partials.columns = list(partials.sample.columns)
+        return partials
+
+    chunksize = int(chunksize) if chunksize and int(chunksize) > 0 else 100_000
+    log_event("data_agent", "streaming_load_start", {"path": path, "chunksize": chunksize})
+
+    try:
+        chunk_count, nat_count = _fold_chunks(
+            partials, pd.read_csv(path, chunksize=chunksize, **read_kwargs), path, date_col, date_range, read_kwargs
+        )
+    except pd.errors.EmptyDataError:
+        raise ValueError(f"CSV file is empty: {path}")
+    except Exception as e:
+        log_event("data_agent", "streaming_load_error", {"path": path, "error": str(e)})
+        raise ValueError(f"Failed to stream CSV {path}: {e}")
+
+    if nat_count > 0:
+        log_event("data_agent", "date_conversion_warning", {"nat_count": nat_count, "total_rows": partials.rows})
+
+    log_event("data_agent", "streaming_load_complete", {
+        "total_chunks": chunk_count,
+        "total_rows": partials.rows,
+        "aggregate_rows": len(partials.to_frame()),
+    })
+    return partials
+
+
+def incremental_csv_aggregates(
+    path: str,
+    *,
+    state_path: str = "reports/ingest_state.json",
+    date_col: str = _DEFAULT_DATE_COL,
+    chunksize: int = 100_000,
+    typed: bool = True,
+    prune: bool = False,
+    distinct: str = "exact",
+    hll_precision: int = 12,
+    segment_dims: Sequence[str] = (),
+) -> PartialAggregates:
+    """
+    Incremental streaming load for append-only exports.
+
+    A byte-offset watermark (see src/utils/incremental.py) persisted at `state_path`
+    records how much of the file has already been aggregated, together with the running
+    partial aggregates. Only the bytes appended since the last run are parsed and merged
+    in, so a daily run costs O(new rows). If the file was rewritten or truncated (header
+    or anchor hash mismatch) the watermark is discarded and the whole file is re-ingested.
+    A trailing line without a newline is left for the next run. A watermark written with
+    a different distinct-count mode / precision or segment_dims is also discarded.
+
+    Returns:
+        PartialAggregates covering every complete row of the file
+    """
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"Data file not found: {path}")
+
+    read_kwargs = _reader_kwargs(typed, prune, False)
+    chunksize = int(chunksize) if chunksize and int(chunksize) > 0 else 100_000
+    end = complete_lines_end(path)
+    header = read_header_line(path)
+
+    state = read_watermark(state_path)
+    saved = (state or {}).get("partials") or {}
+    same_mode = (saved.get("distinct", "exact") == distinct and saved.get("hll_precision", 12) == hll_precision
+                 and list(saved.get("segment_dims") or []) == list(segment_dims))
+    if same_mode and watermark_is_valid(path, state, end):
+        partials = PartialAggregates.from_state(state["partials"])
+        offset = int(state["byte_offset"])
+        mode = "incremental"
+    else:
+        if state is not None:
+            log_event("data_agent", "ingest_watermark_reset", {"path": path, "state_path": state_path})
+        partials = PartialAggregates(date_col=date_col, distinct=distinct, hll_precision=hll_precision,
+                                     segment_dims=segment_dims)
+        offset = len(header)
+        mode = "full"
+
+    rows_before = partials.rows
+    log_event("data_agent", "incremental_load_start", {
+        "path": path, "mode": mode, "byte_offset": offset, "end_offset": end,
+    })
+
+    chunk_count = nat_count = 0
+    if end > offset:
+        tail = io.BufferedReader(ByteRangeReader(path, offset, end, prefix=header))
+        try:
+            chunk_count, nat_count = _fold_chunks(
+                partials, pd.read_csv(tail, chunksize=chunksize, **read_kwargs), path, date_col, None, read_kwargs
+            )
+        except pd.errors.EmptyDataError:
+            raise ValueError(f"CSV file is empty: {path}")
+        except Exception as e:
+            log_event("data_agent", "incremental_load_error", {"path": path, "error": str(e)})
+            raise ValueError(f"Failed to ingest CSV tail {path}: {e}")
+        finally:
+            tail.close()
+    elif partials.sample is None:
+        partials.sample = _restore_dtypes(pd.read_csv(path, nrows=0, **read_kwargs), read_kwargs)
+        partials.columns = list(partials.sample.columns)
+
+    if nat_count > 0:
+        log_event("data_agent", "date_conversion_warning", {"nat_count": nat_count, "total_rows": partials.rows})
+
+    try:
+        write_watermark(state_path, make_watermark(path, max(end, len(header)), partials.rows, partials.to_state()))
+    except Exception as e:
+        log_event("data_agent", "ingest_state_write_failed", {"state_path": state_path, "error": str(e)})
+
+    log_event("data_agent", "incremental_load_complete", {
+        "mode": mode,
+        "new_rows": partials.rows - rows_before,
+        "total_rows": partials.rows,
+        "total_chunks": chunk_count,
+        "byte_offset": end,
+    })
+    return partials
+
+
+def _partition_worker(task: Tuple[str, Dict[str, Any]]) -> Dict[str, Any]:
+    """Process-pool entry point: aggregate one partition and return its serializable state."""
+    path, kwargs = task
+    return stream_csv_aggregates(path, **kwargs).to_state()
+
+
+def load_partitioned_aggregates(
+    path: str,
+    *,
+    cache_dir: Optional[str] = None,
+    cache_max_bytes: Optional[int] = None,
+    date_col: str = _DEFAULT_DATE_COL,
+    chunksize: int = 100_000,
+    typed: bool = True,
+    prune: bool = False,
+    date_range: Optional[Tuple[Any, Any]] = None,
+    max_workers: Optional[int] = None,
+    distinct: str = "exact",
+    hll_precision: int = 12,
+    segment_dims: Sequence[str] = (),
+) -> PartialAggregates:
+    """
+    Aggregate a directory / glob of CSVs, one partition per file.
+
+    Each file is streamed into its own PartialAggregates, in parallel across processes
+    when more than one file needs work. Per-file results are cached under cache_dir keyed
+    by the file fingerprint, so re-runs only parse new or changed files. The per-file
+    aggregates are then merged in path order.
+
+    Args:
+        path: Directory, glob pattern or single CSV path
+        cache_dir: If specified, per-partition aggregate cache root
+        cache_max_bytes: Size cap for cache_dir, shared with cached frames (LRU eviction)
+        max_workers: Process pool size (None = CPU count, 1 = serial)
+        (remaining args as in stream_csv_aggregates)
+
+    Returns:
+        Merged PartialAggregates over every partition
+    """
+    files = resolve_partitions(path)
+    if not files:
+        raise FileNotFoundError(f"No CSV partitions found: {path}")
+
+    stream_kwargs = {"date_col": date_col, "chunksize": chunksize, "typed": typed, "prune": prune,
+                     "date_range": date_range, "distinct": distinct, "hll_precision": hll_precision,
+                     "segment_dims": list(segment_dims)}
+    read_opts = {"kind": "partial_aggregates", "date_col": date_col, "typed": typed, "prune": prune,
+                 "distinct": distinct, "hll_precision": hll_precision, "segment_dims": list(segment_dims)}
+    if date_range:
+        read_opts["date_range"] = [str(d) if d is not None else None for d in _as_date_range(date_range)]
+
+    states: Dict[str, Dict[str, Any]] = {}
+    fingerprints: Dict[str, Dict[str, Any]] = {}
+    misses: List[str] = []
+    for f in files:
+        if not os.path.exists(f):
+            raise FileNotFoundError(f"Data file not found: {f}")
+        if cache_dir:
+            try:
+                fingerprints[f] = file_fingerprint(f, cache_dir)
+                cached = load_partition_state(cache_dir, fingerprints[f], read_opts)
+                if cached is not None:
+                    states[f] = cached
+                    continue
+            except Exception as e:
+                log_event("data_agent", "partition_cache_error", {"path": f, "error": str(e)})
+        misses.append(f)
+
+    log_event("data_agent", "partitioned_load_start", {
+        "path": path, "partitions": len(files), "cache_hits": len(files) - len(misses),
+    })
+
+    tasks = [(f, stream_kwargs) for f in misses]
+    results: List[Dict[str, Any]] = []
+    if len(tasks) > 1 and (max_workers is None or max_workers > 1):
+        try:
+            with ProcessPoolExecutor(max_workers=max_workers) as pool:
+                results = list(pool.map(_partition_worker, tasks))
+        except (BrokenProcessPool, OSError, NotImplementedError) as e:
+            # no usable process pool (e.g. restricted sandbox); fall back to serial
+            log_event("data_agent", "partition_pool_unavailable", {"error": str(e)})
+            results = []
+    if len(results) != len(tasks):
+        results = [_partition_worker(t) for t in tasks]
+
+    for f, state in zip(misses, results):
+        states[f] = state
+        if cache_dir and f in fingerprints:
+            try:
+                store_partition_state(cache_dir, fingerprints[f], state, read_opts)
+            except Exception as e:
+                log_event("data_agent", "partition_cache_error", {"path": f, "error": str(e)})
+    if cache_dir and misses and cache_max_bytes is not None:
+        try:
+            evict_lru(cache_dir, cache_max_bytes)
+        except Exception as e:
+            log_event("data_agent", "partition_cache_error", {"path": path, "error": str(e)})
+
+    merged = PartialAggregates(date_col=date_col, distinct=distinct, hll_precision=hll_precision,
+                               segment_dims=segment_dims)
+    for f in files:
+        merged.merge(PartialAggregates.from_state(states[f]))
+
+    log_event("data_agent", "partitioned_load_complete", {
+        "partitions": len(files),
+        "parsed": len(misses),
+        "total_rows": merged.rows,
+    })
+    return merged
+
+
+def summarize_partials(partials: PartialAggregates, *, daily: Optional[DailyAggregate] = None) -> Dict[str, Any]:
+    """
+    Build the same summary dict as summarize_df from merged partial aggregates.
+
+    Sums come from the compact (day, campaign) frame; row counts, missing-value
+    counts and distinct creatives come from the state tracked alongside it.
+    """
+    return partials.finalize(daily=daily)
+
+
 def load_and_summarize(
     path: str,
     *,
@@ -327,14 +813,91 @@ def summarize_data(df: pd.DataFrame, cfg: Dict[str, Any], *, base_dir: str = "lo
     return summarize_df(df, date_col=date_col)
 
 
+def sample_csv(
+    path: str,
+    *,
+    sample_size: int = 5000,
+    strata: Optional[List[str]] = None,
+    seed: Optional[int] = None,
+    date_col: str = _DEFAULT_DATE_COL,
+    chunksize: Optional[int] = None,
+    typed: bool = True,
+    prune: bool = False,
+    include_creative: bool = True,
+    date_range: Optional[Tuple[Any, Any]] = None,
+    **_: Any,
+) -> pd.DataFrame:
+    """
+    One-pass reservoir sample of a CSV (or every partition of a directory / glob).
+
+    Rows are read in chunks and folded into a ReservoirSampler, so memory is bounded by
+    sample_size plus one chunk regardless of file size. With `strata` the sample is
+    stratified (see ReservoirSampler) so small campaigns / days keep at least one row.
+
+    The returned frame carries df.attrs["sampling"] = {mode, sample_rows, rows_seen, fraction, ...}.
+    """
+    files = resolve_partitions(path)
+    if not files:
+        raise FileNotFoundError(f"No CSV partitions found: {path}")
+
+    read_kwargs = _reader_kwargs(typed, prune, include_creative)
+    chunksize = int(chunksize) if chunksize and int(chunksize) > 0 else 100_000
+    sampler = ReservoirSampler(sample_size, strata=strata, seed=seed)
+    log_event("data_agent", "sampling_start", {"path": path, "sample_size": sample_size, "strata": strata})
+
+    for f in files:
+        if not os.path.exists(f):
+            raise FileNotFoundError(f"Data file not found: {f}")
+        if _partition_outside(f, date_range):
+            log_event("data_agent", "partition_skipped", {"path": f, "date_range": date_range})
+            continue
+        try:
+            for chunk in pd.read_csv(f, chunksize=chunksize, **read_kwargs):
+                if date_col in chunk.columns:
+                    chunk[date_col] = pd.to_datetime(chunk[date_col], errors="coerce")
+                sampler.update(_filter_date_range(chunk, date_col, date_range))
+        except pd.errors.EmptyDataError:
+            raise ValueError(f"CSV file is empty: {f}")
+        except Exception as e:
+            log_event("data_agent", "sampling_error", {"path": f, "error": str(e)})
+            raise ValueError(f"Failed to sample CSV {f}: {e}")
+
+    df = _restore_dtypes(sampler.result(), read_kwargs)
+    df.attrs["sampling"] = sampler.info(len(df))
+    log_event("data_agent", "sampling_complete", df.attrs["sampling"])
+    return df
+
+
 # Backward-compatible aliases for tests
 def load_data(path: str, *, sample_mode: bool = False, **kwargs) -> pd.DataFrame:
-    """Backward-compatible wrapper for tests."""
-    # Remove sample_size from kwargs if present (not supported by load_csv_safe)
-    kwargs.pop('sample_size', None)
-    return load_csv_safe(path, **kwargs)
-
+    """
+    Backward-compatible wrapper for tests.
 
-def summarize(df: pd.DataFrame, *, date_col: str = _DEFAULT_DATE_COL) -> Dict[str, Any]:
+    With sample_mode the file is reservoir-sampled instead (see sample_csv; pass
+    sample_size / strata / seed). `path` may also be a directory or glob; each file is then loaded as a partition
+    (through the frame cache when cache_dir is given) and the frames are concatenated.
+    """
+    if sample_mode:
+        return sample_csv(path, **kwargs)
+    for key in ("sample_size", "strata", "seed"):
+        kwargs.pop(key, None)
+    if not is_partitioned(path):
+        return load_csv_safe(path, **kwargs)
+
+    files = resolve_partitions(path)
+    if not files:
+        raise FileNotFoundError(f"No CSV partitions found: {path}")
+    frames = [load_csv_safe(f, **kwargs) for f in files]
+    read_kwargs = _reader_kwargs(kwargs.get("typed", True), kwargs.get("prune", False),
+                                 kwargs.get("include_creative", True))
+    return _restore_dtypes(pd.concat(frames, ignore_index=True), read_kwargs)
+
+
+def summarize(
+    df: pd.DataFrame,
+    *,
+    date_col: str = _DEFAULT_DATE_COL,
+    daily: Optional[DailyAggregate] = None,
+) -> Dict[str, Any]:
     """Backward-compatible wrapper for tests."""
-    return summarize_df(df, date_col=date_col)
+    return summarize_df(df, date_col=date_col, daily=daily)
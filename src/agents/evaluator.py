@@ -3,8 +3,9 @@
 from __future__ import annotations
 
 import math
-from typing import Any, Dict, List, Tuple
+from typing import Any, Dict, List, Optional, Tuple
 
+from src.utils.metrics import timed
 from src.utils.observability import log_event
 from src.utils.baseline import evidence_from_summary_and_baseline
 from src.utils.thresholds import compute_dynamic_thresholds
@@ -29,17 +30,22 @@ def _normalize_confidence(v: Any) -> float:
     return max(0.0, min(1.0, x))
 
 
-def _severity_from_delta(delta: float) -> str:
+def _severity_from_delta(delta: float, cfg: Optional[Dict[str, Any]] = None) -> str:
     """
     Categorize severity of issue based on percent delta.
+
+    The high / medium / low bucket boundaries come from cfg's
+    severity_critical_threshold / severity_high_threshold / severity_medium_threshold
+    (defaults -0.40 / -0.20 / -0.05), so they can be tuned (see src/orchestrator/sweep.py).
     """
+    cfg = cfg or {}
     if delta == float("inf"):
         return "critical"
-    if delta < -0.40:
+    if delta < _safe_float(cfg.get("severity_critical_threshold"), -0.40):
         return "high"
-    if delta < -0.20:
+    if delta < _safe_float(cfg.get("severity_high_threshold"), -0.20):
         return "medium"
-    if delta < -0.05:
+    if delta < _safe_float(cfg.get("severity_medium_threshold"), -0.05):
         return "low"
     return "none"
 
@@ -54,13 +60,19 @@ def _evaluate_one(h: Dict[str, Any], evidence: Dict[str, Any], cfg: Dict[str, An
     """
     base_conf = _normalize_confidence(h.get("initial_confidence", 0.0))
 
+    # segment hypotheses (anomaly scan) are judged on their own segment-level deltas
+    if h.get("segment"):
+        hint = h.get("evidence_hint") or {}
+        evidence = {**evidence, "ctr_delta_pct": _safe_float(hint.get("ctr_delta_pct")),
+                    "roas_delta_pct": _safe_float(hint.get("roas_delta_pct"))}
+
     # Evidence deltas
     ctr_delta = evidence.get("ctr_delta_pct", 0.0)
     roas_delta = evidence.get("roas_delta_pct", 0.0)
 
     # Severity buckets
-    ctr_sev = _severity_from_delta(ctr_delta)
-    roas_sev = _severity_from_delta(roas_delta)
+    ctr_sev = _severity_from_delta(ctr_delta, cfg)
+    roas_sev = _severity_from_delta(roas_delta, cfg)
 
     # Choose stronger of the two
     severity_rank = {"none": 0, "low": 1, "medium": 2, "high": 3, "critical": 4}
@@ -77,7 +89,7 @@ def _evaluate_one(h: Dict[str, Any], evidence: Dict[str, Any], cfg: Dict[str, An
     min_conf = _safe_float(cfg.get("confidence_min", 0.3))
     passed = adj_conf >= min_conf
 
-    return {
+    out = {
         "id": h.get("id"),
         "hypothesis": h.get("hypothesis", ""),
         "impact": impact,
@@ -93,19 +105,25 @@ def _evaluate_one(h: Dict[str, Any], evidence: Dict[str, Any], cfg: Dict[str, An
             "rows_used_for_baseline": evidence.get("rows_used_for_baseline", 0),
         },
     }
+    if h.get("segment"):
+        out["segment"] = h["segment"]
+    return out
 
 
+@timed("validate")
 def validate(
     hypotheses: List[Dict[str, Any]],
     summary: Dict[str, Any],
     cfg: Dict[str, Any],
     *,
     df=None,
+    baseline: Optional[Dict[str, Any]] = None,
     base_dir: str = "logs/observability"
 ) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
     """
     Full V2 evaluator:
-    - computes baselines if df is provided
+    - computes baselines if df (raw frame or DailyAggregate) is provided, unless a
+      precomputed baseline (e.g. EwmaBaselines.baselines()) is passed
     - merges baseline evidence with summary
     - evaluates hypotheses using severity + confidence logic
     - logs observability events
@@ -119,9 +137,20 @@ def validate(
         base_dir=base_dir,
     )
 
-    # Compute thresholds + baselines if df available
-    dynamic = compute_dynamic_thresholds(df) if df is not None else {}
-    baseline = dynamic.get("roas_baseline") or {}
+    # Compute thresholds + baselines if df available (memoized; the orchestrator has
+    # usually computed the same thresholds already with these parameters)
+    dynamic = {}
+    if baseline is None and df is not None:
+        dynamic = compute_dynamic_thresholds(
+            df,
+            window_days=cfg.get("window_days", 30),
+            min_days=cfg.get("min_days", 7),
+            ctr_z=cfg.get("ctr_z", 1.5),
+            roas_z=cfg.get("roas_z", 1.0),
+            cache_dir=cfg.get("threshold_cache_dir"),
+        )
+    if baseline is None:
+        baseline = dynamic.get("roas_baseline") or {}
     evidence = evidence_from_summary_and_baseline(summary, baseline) if baseline else {}
 
     validated = []
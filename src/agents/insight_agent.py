@@ -8,7 +8,7 @@ Responsibilities:
 """
 from __future__ import annotations
 
-from typing import Any, Dict, List
+from typing import Any, Dict, List, Optional
 import uuid
 
 from src.utils.baseline import evidence_from_summary_and_baseline
@@ -28,11 +28,15 @@ def generate_insights(
     baseline: Dict[str, Any],
     *,
     top_k: int = 5,
+    segment_anomalies: Optional[List[Dict[str, Any]]] = None,
     base_dir: str = "logs/observability",
 ) -> List[Dict[str, Any]]:
     """
     Generate a short list of prioritized hypotheses with pointers to evidence.
 
+    segment_anomalies (from src/utils/anomaly.scan_segment_anomalies) add one
+    segment-level hypothesis per anomalous segment next to the global ones.
+
     Each hypothesis:
     {
       "id": str,
@@ -49,6 +53,7 @@ def generate_insights(
         "has_baseline": bool(baseline),
         "summary_keys": list(summary.keys()) if summary else [],
         "num_campaigns": len(summary.get("by_campaign", [])) if summary else 0,
+        "num_segment_anomalies": len(segment_anomalies or []),
     }
 
     out: List[Dict[str, Any]] = []
@@ -137,6 +142,39 @@ def generate_insights(
             }
         )
 
+    # Segment-level signals: a failing campaign/adset/platform/country mix that the
+    # global deltas average away
+    for a in segment_anomalies or []:
+        try:
+            metric = a["metric"]
+            delta = a.get("delta_pct")
+            z = float(a["z_score"])
+            where = ", ".join(f"{k}={v}" for k, v in a["segment"].items())
+            change = f"{round(delta * 100, 1)}%" if delta is not None else "sharply"
+            text = (
+                f"{metric.upper()} for {where} moved {change} vs its {a['baseline_days']}-day baseline "
+                f"(z={z:.1f}) on {a['latest_date']}"
+            )
+            out.append(
+                {
+                    "id": _make_id(),
+                    "hypothesis": text,
+                    "metrics_used": [metric],
+                    "initial_confidence": min(0.9, max(0.2, abs(z) / 5.0)),
+                    "segment": dict(a["segment"]),
+                    "evidence_hint": {
+                        f"{metric}_delta_pct": float(delta) if delta is not None else 0.0,
+                        "z_score": z,
+                        "latest": a["latest"],
+                        "baseline": a["baseline"],
+                        "baseline_days": a["baseline_days"],
+                        "spend": a.get("spend"),
+                    },
+                }
+            )
+        except Exception as e:
+            log_event("insight_agent", "segment_anomaly_skipped", {"error": str(e)}, base_dir=base_dir)
+
     # Additional generic but evidence-linked recommendations (kept short)
     # e.g., if roas drop is large and creatives are few -> suggest creative refresh
     num_creatives = summary.get("global", {}).get("num_creatives", None)
@@ -235,4 +273,5 @@ def generate_hypotheses(
     # Extract baseline from cfg if available
     baseline = cfg.get("roas_baseline", {})
     top_k = cfg.get("top_k_insights", 5)
-    return generate_insights(summary, baseline, top_k=top_k, base_dir=base_dir)
+    return generate_insights(summary, baseline, top_k=top_k, segment_anomalies=cfg.get("segment_anomalies"),
+                             base_dir=base_dir)
@@ -1,4 +1,37 @@
-from typing import Dict, Any
+import re
+from datetime import date, datetime, timedelta
+from typing import Dict, Any, Optional, Tuple
+
+_UNIT_DAYS = {"day": 1, "week": 7, "month": 30, "year": 365}
+_WINDOW_RE = re.compile(r"\b(?:last|past|previous)\s+(\d+)?\s*(day|week|month|year)s?\b", re.IGNORECASE)
+
+
+def infer_window_days(query: str) -> Optional[int]:
+    """Time window named in the query ("last 14 days", "past week", "yesterday"), or None."""
+    q = query or ""
+    if re.search(r"\byesterday\b", q, re.IGNORECASE):
+        return 1
+    m = _WINDOW_RE.search(q)
+    if not m:
+        return None
+    return int(m.group(1) or 1) * _UNIT_DAYS[m.group(2).lower()]
+
+
+def date_predicate(window_days: int, *, lookback_days: int = 0, as_of: Any = None) -> Tuple[str, str]:
+    """
+    Inclusive (start, end) ISO dates covering the analysis window plus the baseline lookback,
+    ending at `as_of`. Used to push the date filter down into the loader; pass the data's
+    latest day (data_agent.latest_data_date) -- the today (UTC) default filters historical
+    exports to nothing.
+    """
+    if as_of is None:
+        end = datetime.utcnow().date()
+    elif isinstance(as_of, date):
+        end = as_of
+    else:
+        end = datetime.fromisoformat(str(as_of)).date()
+    start = end - timedelta(days=max(1, int(window_days) + int(lookback_days)) - 1)
+    return start.isoformat(), end.isoformat()
 
 
 def plan(query: str) -> Dict[str, Any]:
@@ -12,4 +45,5 @@ def plan(query: str) -> Dict[str, Any]:
         {"step": "generate_creatives", "description": "produce creative recommendations"},
         {"step": "write_reports", "description": "persist outputs and observability traces"},
     ]
-    return {"query": query, "steps": steps}
+    # window_days is None when the query names no time range (analyze all available data)
+    return {"query": query, "steps": steps, "window_days": infer_window_days(query)}
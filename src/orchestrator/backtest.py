@@ -0,0 +1,376 @@
+# File: src/orchestrator/backtest.py
+# Historical replay of the insight -> evaluator -> alert decisions as of every day.
+
+"""
+Backtest / replay engine for tuning ctr_z, roas_z and the severity thresholds.
+
+Calling orchestrator.run once per day would re-read and re-aggregate the whole history
+each time (O(days^2)). Instead the data is aggregated by day once and
+`backfill_thresholds` turns it into as-of-day baselines, stds and drop statistics with
+prefix sums. Every parameter-independent series is computed once (`replay_inputs`).
+A parameter combination then costs a few O(days) array operations (`replay`), and
+combinations are scored in parallel on a process pool (`backtest`).
+
+Per day d the replay mirrors the pipeline:
+- thresholds: CTR low / ROAS drop thresholds from the data through d (ctr_z, roas_z)
+- alert rules: day d's CTR under its low threshold, or its ROAS drop vs the previous
+  valid day over the drop threshold
+- insight agent: a hypothesis per metric whose delta vs baseline is below the
+  decline threshold (ctr_decline_threshold / roas_decline_threshold)
+- evaluator: impact from the severity thresholds (same buckets as
+  evaluator._severity_from_delta), confidence bumped by 0.25 for medium+ impact and
+  0.10 for low impact and checked against confidence_min
+
+Unlike validate(), which takes its evidence from the whole-history summary (last day's
+ROAS, CTR over all rows), the replay judges day d on day d's own CTR / ROAS against the
+baselines as of d: a backtest asks what each day would have raised, not what the
+summary of the full file says.
+
+Usage:
+    python -m src.orchestrator.backtest --start 2025-02-01 --end 2025-03-31 \
+        --ctr-z 1 1.5 2 --roas-z 0.5 1 --out reports/backtest.csv
+"""
+from __future__ import annotations
+
+import argparse
+import itertools
+import os
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Union
+import numpy as np
+import pandas as pd
+import yaml
+
+from src.agents.data_agent import load_data
+from src.utils.aggregates import DailyAggregate, as_daily_aggregate
+from src.utils.backfill import backfill_thresholds
+from src.utils.observability import log_event
+
+BACKTEST_PARAMS = (
+    "ctr_z",
+    "roas_z",
+    "severity_critical_threshold",
+    "severity_high_threshold",
+    "severity_medium_threshold",
+)
+SEVERITY_LEVELS = ["none", "low", "medium", "high", "critical"]
+
+# defaults mirror config/config.yaml
+DEFAULT_PARAMS: Dict[str, float] = {
+    "ctr_z": 1.5,
+    "roas_z": 1.0,
+    "severity_critical_threshold": -0.40,
+    "severity_high_threshold": -0.20,
+    "severity_medium_threshold": -0.05,
+}
+
+# replay inputs shared by the pool workers (set once per worker by the initializer)
+_WORKER_INPUTS: Dict[str, Any] = {}
+
+
+def _ratio(num: np.ndarray, den: np.ndarray) -> np.ndarray:
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return num / np.where(den == 0, np.nan, den)
+
+
+def replay_inputs(
+    data: Union[pd.DataFrame, DailyAggregate],
+    *,
+    window_days: int = 30,
+    min_days: int = 7,
+    min_threshold: float = 0.08,
+) -> Dict[str, np.ndarray]:
+    """
+    Parameter-independent per-day series for replay(): observed CTR / ROAS / ROAS drop
+    of each day, and the as-of-day baselines, stds and history counts.
+    """
+    daily = as_daily_aggregate(data)
+    bf = backfill_thresholds(daily, window_days=window_days, min_days=min_days, min_threshold=min_threshold)
+    n = daily.n_days
+    if daily.has("impressions", "clicks"):
+        last_ctr = _ratio(daily.column("clicks"), daily.column("impressions"))
+    else:
+        last_ctr = np.full(n, np.nan)
+    if daily.has("revenue", "spend"):
+        last_roas = _ratio(daily.column("revenue"), daily.column("spend"))
+    else:
+        last_roas = np.full(n, np.nan)
+
+    # ROAS drop of each valid day vs the previous valid day (what the drop threshold is for)
+    valid = ~np.isnan(last_roas)
+    prev_idx = np.maximum.accumulate(np.where(valid, np.arange(n), -1))
+    prev_idx = np.concatenate([[-1], prev_idx[:-1]])
+    prev = np.where(prev_idx >= 0, last_roas[np.maximum(prev_idx, 0)], np.nan)
+    last_drop = np.where(valid, _ratio(prev - last_roas, prev), np.nan)
+
+    return {
+        "dates": daily.dates,
+        "last_ctr": last_ctr,
+        "last_roas": last_roas,
+        "last_roas_drop": last_drop,
+        "baseline_ctr": bf["baseline_ctr"].to_numpy(dtype=np.float64),
+        "ctr_std": bf["ctr_std"].to_numpy(dtype=np.float64),
+        "ctr_short": (bf["ctr_rows_used"].to_numpy() < min_days),
+        "baseline_roas": bf["baseline_roas"].to_numpy(dtype=np.float64),
+        "median_drop": bf["median_drop"].to_numpy(dtype=np.float64),
+        "drop_std": bf["drop_std"].to_numpy(dtype=np.float64),
+        "min_threshold": np.float64(min_threshold),
+    }
+
+
+def _pct_delta(latest: np.ndarray, base: np.ndarray) -> np.ndarray:
+    """Vectorized baseline._pct_delta: a zero baseline gives 0 (latest 0) or inf."""
+    with np.errstate(divide="ignore", invalid="ignore"):
+        delta = latest / base - 1.0
+    return np.where(base == 0, np.where(latest == 0, 0.0, np.inf), delta)
+
+
+def _severity(delta: np.ndarray, params: Dict[str, float]) -> np.ndarray:
+    """
+    Vectorized evaluator._severity_from_delta as indexes into SEVERITY_LEVELS;
+    NaN deltas are 'none'.
+    """
+    out = np.zeros(len(delta), dtype=np.int8)
+    with np.errstate(invalid="ignore"):
+        out[delta < params["severity_medium_threshold"]] = 1
+        out[delta < params["severity_high_threshold"]] = 2
+        out[delta < params["severity_critical_threshold"]] = 3
+    out[delta == np.inf] = 4
+    return out
+
+
+def replay(
+    inputs: Dict[str, np.ndarray],
+    params: Optional[Dict[str, float]] = None,
+    *,
+    ctr_decline_threshold: float = -0.05,
+    roas_decline_threshold: float = -0.05,
+    confidence_min: float = 0.5,
+) -> pd.DataFrame:
+    """
+    Day-by-day decisions for one parameter combination (missing params use DEFAULT_PARAMS).
+
+    Thresholds are rebuilt from the z-independent baselines/stds with the same rules as
+    compute_global_ctr_baseline / compute_roas_drop_threshold.
+    """
+    p = dict(DEFAULT_PARAMS)
+    p.update(params or {})
+    base_ctr, ctr_std = inputs["baseline_ctr"], inputs["ctr_std"]
+    ctr_thr = np.where(
+        inputs["ctr_short"],
+        np.maximum(1e-6, base_ctr * 0.5),
+        np.maximum(base_ctr - p["ctr_z"] * ctr_std, np.maximum(1e-6, base_ctr * 0.3)),
+    )
+    roas_thr = np.maximum(inputs["median_drop"] + p["roas_z"] * inputs["drop_std"], inputs["min_threshold"])
+
+    last_ctr, last_roas = inputs["last_ctr"], inputs["last_roas"]
+    with np.errstate(invalid="ignore"):
+        ctr_alert = last_ctr < ctr_thr
+        roas_alert = inputs["last_roas_drop"] > roas_thr
+        ctr_delta = _pct_delta(last_ctr, base_ctr)
+        roas_delta = _pct_delta(last_roas, inputs["baseline_roas"])
+        ctr_hyp = ctr_delta < ctr_decline_threshold
+        roas_hyp = roas_delta < roas_decline_threshold
+
+    impact = np.maximum(_severity(ctr_delta, p), _severity(roas_delta, p))
+    bump = np.select([impact >= 2, impact == 1], [0.25, 0.10], 0.0)
+    ctr_conf = np.minimum(1.0, np.clip(np.abs(np.nan_to_num(ctr_delta)), 0.2, 0.85) + bump)
+    roas_conf = np.minimum(1.0, np.clip(np.abs(np.nan_to_num(roas_delta)), 0.2, 0.9) + bump)
+    validated = (ctr_hyp & (ctr_conf >= confidence_min)).astype(np.int64) + \
+        (roas_hyp & (roas_conf >= confidence_min)).astype(np.int64)
+
+    return pd.DataFrame({
+        "date": pd.to_datetime(inputs["dates"]),
+        "ctr_low_threshold": ctr_thr,
+        "roas_drop_threshold": roas_thr,
+        "ctr_delta_pct": ctr_delta,
+        "roas_delta_pct": roas_delta,
+        "ctr_alert": ctr_alert,
+        "roas_alert": roas_alert,
+        "alert": ctr_alert | roas_alert,
+        "impact": np.asarray(SEVERITY_LEVELS, dtype=object)[impact],
+        "num_hypotheses": ctr_hyp.astype(np.int64) + roas_hyp.astype(np.int64),
+        "num_validated": validated,
+    })
+
+
+def _score(inputs: Dict[str, Any], params: Dict[str, float], options: Dict[str, Any]) -> Dict[str, Any]:
+    """Replay one combination and reduce the evaluated days to a results row."""
+    days = replay(inputs, params, **options["replay"])
+    mask = options["mask"]
+    days = days[mask]
+    row: Dict[str, Any] = {k: params.get(k, DEFAULT_PARAMS[k]) for k in BACKTEST_PARAMS}
+    row.update({
+        "days": int(len(days)),
+        "ctr_alerts": int(days["ctr_alert"].sum()),
+        "roas_alerts": int(days["roas_alert"].sum()),
+        "alert_days": int(days["alert"].sum()),
+        "alert_rate": float(days["alert"].mean()) if len(days) else 0.0,
+        "num_hypotheses": int(days["num_hypotheses"].sum()),
+        "num_validated": int(days["num_validated"].sum()),
+    })
+    for level in SEVERITY_LEVELS[1:]:
+        row[f"{level}_days"] = int((days["impact"] == level).sum())
+    incidents = options.get("incidents")
+    if incidents is not None:
+        truth = incidents[mask]
+        hits = int((days["alert"].to_numpy() & truth).sum())
+        precision = hits / row["alert_days"] if row["alert_days"] else 0.0
+        recall = hits / int(truth.sum()) if truth.any() else 0.0
+        row.update({
+            "precision": precision,
+            "recall": recall,
+            "f1": 2 * precision * recall / (precision + recall) if precision + recall else 0.0,
+        })
+    return row
+
+
+def _init_worker(inputs: Dict[str, Any], options: Dict[str, Any]) -> None:
+    _WORKER_INPUTS["inputs"] = inputs
+    _WORKER_INPUTS["options"] = options
+
+
+def _score_worker(params: Dict[str, float]) -> Dict[str, Any]:
+    """Process-pool entry point: score one combination against the worker's shared inputs."""
+    return _score(_WORKER_INPUTS["inputs"], params, _WORKER_INPUTS["options"])
+
+
+def param_grid(grid: Dict[str, Sequence[Any]]) -> List[Dict[str, Any]]:
+    """Cartesian product of {param: [values]} as a list of combinations."""
+    keys = list(grid)
+    return [dict(zip(keys, values)) for values in itertools.product(*(grid[k] for k in keys))]
+
+
+def _day_mask(dates: np.ndarray, start: Any, end: Any) -> np.ndarray:
+    mask = np.ones(len(dates), dtype=bool)
+    if start is not None:
+        mask &= dates >= np.datetime64(pd.Timestamp(start).date(), "D")
+    if end is not None:
+        mask &= dates <= np.datetime64(pd.Timestamp(end).date(), "D")
+    return mask
+
+
+def backtest(
+    data: Union[pd.DataFrame, DailyAggregate],
+    combos: Union[Dict[str, Sequence[Any]], Iterable[Dict[str, Any]]],
+    *,
+    start: Any = None,
+    end: Any = None,
+    window_days: int = 30,
+    min_days: int = 7,
+    incidents: Optional[Iterable[Any]] = None,
+    ctr_decline_threshold: float = -0.05,
+    roas_decline_threshold: float = -0.05,
+    confidence_min: float = 0.5,
+    max_workers: Optional[int] = None,
+    base_dir: str = "logs/observability",
+) -> pd.DataFrame:
+    """
+    Replay every day in [start, end] for each parameter combination.
+
+    Args:
+        data: Raw frame or DailyAggregate with the full history (days before `start`
+            feed the as-of-day baselines)
+        combos: {param: [values]} grid (see param_grid) or an iterable of param dicts;
+            keys from BACKTEST_PARAMS, missing ones use DEFAULT_PARAMS
+        incidents: Optional known incident dates; adds precision / recall / f1 of the
+            alert days against them
+        max_workers: Process pool size (None = CPU count, 1 = serial)
+
+    Returns:
+        One row per combination: the parameters, alert / hypothesis / severity counts
+        over the evaluated days and, with incidents, precision / recall / f1.
+    """
+    combos = param_grid(combos) if isinstance(combos, dict) else list(combos)
+    for c in combos:
+        unknown = set(c) - set(BACKTEST_PARAMS)
+        if unknown:
+            raise ValueError(f"Unknown backtest parameters: {sorted(unknown)}")
+
+    inputs = replay_inputs(data, window_days=window_days, min_days=min_days)
+    options: Dict[str, Any] = {
+        "mask": _day_mask(inputs["dates"], start, end),
+        "replay": {
+            "ctr_decline_threshold": ctr_decline_threshold,
+            "roas_decline_threshold": roas_decline_threshold,
+            "confidence_min": confidence_min,
+        },
+        "incidents": None,
+    }
+    if incidents is not None:
+        wanted = np.array([np.datetime64(pd.Timestamp(d).date(), "D") for d in incidents], dtype="datetime64[D]")
+        options["incidents"] = np.isin(inputs["dates"], wanted)
+
+    log_event("backtest", "backtest_start", {"combinations": len(combos), "days": int(options["mask"].sum())},
+              base_dir=base_dir)
+    rows: List[Dict[str, Any]] = []
+    if len(combos) > 1 and (max_workers is None or max_workers > 1):
+        try:
+            with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker,
+                                     initargs=(inputs, options)) as pool:
+                chunk = max(1, len(combos) // (4 * (max_workers or os.cpu_count() or 1)))
+                rows = list(pool.map(_score_worker, combos, chunksize=chunk))
+        except (BrokenProcessPool, OSError, NotImplementedError) as e:
+            # no usable process pool (e.g. restricted sandbox); fall back to serial
+            log_event("backtest", "backtest_pool_unavailable", {"error": str(e)}, base_dir=base_dir)
+            rows = []
+    if not rows:
+        rows = [_score(inputs, c, options) for c in combos]
+
+    log_event("backtest", "backtest_complete", {"combinations": len(rows)}, base_dir=base_dir)
+    return pd.DataFrame(rows)
+
+
+def _parse_args(argv: Optional[Sequence[str]] = None) -> argparse.Namespace:
+    ap = argparse.ArgumentParser(description="Replay the pipeline as of every day and score parameter combinations.")
+    ap.add_argument("--config", default="config/config.yaml")
+    ap.add_argument("--data", default=None, help="CSV to replay (defaults to data_csv from the config)")
+    ap.add_argument("--start", default=None)
+    ap.add_argument("--end", default=None)
+    ap.add_argument("--ctr-z", type=float, nargs="+", default=None)
+    ap.add_argument("--roas-z", type=float, nargs="+", default=None)
+    ap.add_argument("--critical", type=float, nargs="+", default=None, help="severity_critical_threshold values")
+    ap.add_argument("--high", type=float, nargs="+", default=None, help="severity_high_threshold values")
+    ap.add_argument("--medium", type=float, nargs="+", default=None, help="severity_medium_threshold values")
+    ap.add_argument("--incidents", nargs="*", default=None, help="known incident dates (YYYY-MM-DD)")
+    ap.add_argument("--workers", type=int, default=None)
+    ap.add_argument("--out", default="reports/backtest.csv")
+    return ap.parse_args(argv)
+
+
+def main(argv: Optional[Sequence[str]] = None) -> pd.DataFrame:
+    args = _parse_args(argv)
+    with open(args.config, "r", encoding="utf-8") as f:
+        cfg = yaml.safe_load(f) or {}
+
+    grid: Dict[str, Sequence[float]] = {}
+    for key, values in (("ctr_z", args.ctr_z), ("roas_z", args.roas_z),
+                        ("severity_critical_threshold", args.critical),
+                        ("severity_high_threshold", args.high),
+                        ("severity_medium_threshold", args.medium)):
+        grid[key] = values if values else [cfg.get(key, DEFAULT_PARAMS[key])]
+
+    df = load_data(args.data or cfg.get("data_csv", "data/sample_fb_ads.csv"))
+    results = backtest(
+        df,
+        grid,
+        start=args.start,
+        end=args.end,
+        window_days=cfg.get("window_days", 30),
+        min_days=cfg.get("min_days", 7),
+        incidents=args.incidents,
+        ctr_decline_threshold=cfg.get("ctr_decline_threshold", -0.05),
+        roas_decline_threshold=cfg.get("roas_decline_threshold", -0.05),
+        confidence_min=cfg.get("confidence_min", 0.5),
+        max_workers=args.workers,
+        base_dir=cfg.get("observability_dir", "logs/observability"),
+    )
+    os.makedirs(os.path.dirname(args.out) or ".", exist_ok=True)
+    results.to_csv(args.out, index=False)
+    print(f"{len(results)} combinations -> {args.out}")
+    return results
+
+
+if __name__ == "__main__":
+    main()
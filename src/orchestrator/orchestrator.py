@@ -2,18 +2,35 @@ import yaml
 import os
 import uuid
 from datetime import datetime
-from typing import Any, Dict, Tuple
+from typing import Any, Dict, Optional, Tuple
 
 from src.agents.creative_generator import find_low_ctr, generate_creatives
-from src.agents.data_agent import load_data, summarize
+from src.agents.data_agent import (
+    incremental_csv_aggregates,
+    latest_data_date,
+    load_data,
+    load_partitioned_aggregates,
+    stream_csv_aggregates,
+    summarize,
+    summarize_partials,
+)
 from src.agents.evaluator import validate
 from src.agents.insight_agent import generate_hypotheses
+from src.agents.planner import date_predicate, plan
 from src.utils.io_utils import write_json
-from src.utils.observability import log_event, write_metrics
+from src.utils.memprof import MemoryProfiler, check_memory_budget
+from src.utils.metrics import REGISTRY
+from src.utils.observability import configure_sink, event_stats, flush_events, log_event, write_metrics
+from src.utils.partitions import is_partitioned
 from src.utils.schema import fingerprint_and_write, read_schema_fingerprint, detect_schema_drift
+from src.utils.aggregates import DailyAggregate
+from src.utils.anomaly import DEFAULT_ANOMALY_DIMS, scan_segment_anomalies
+from src.utils.baseline import BaselineSketches, EwmaBaselines, compute_global_baselines
+from src.utils.cube import RollupCube
 from src.utils.alerts import write_alert, alert_rule_roas_drop
 from src.utils.retry_utils import apply_retry_logic, compute_extra_aggregates
-from src.utils.thresholds import compute_dynamic_thresholds
+from src.utils.thresholds import compute_dynamic_thresholds, compute_segment_thresholds
+from src.utils.tracing import Tracer, span, start_trace
 
 
 def load_config(path: str = "config/config.yaml") -> Dict[str, Any]:
@@ -25,12 +42,51 @@ def _ts() -> str:
     return datetime.utcnow().isoformat() + "Z"
 
 
+def _input_bytes(path: str) -> int:
+    """Size of a file (0 for directories / globs / missing files)."""
+    try:
+        return os.path.getsize(path) if os.path.isfile(path) else 0
+    except OSError:
+        return 0
+
+
 def run(query: str) -> Tuple[Any, Any]:
     cfg = load_config()
     obs_dir = cfg.get("observability_dir", "logs/observability")
     os.makedirs(obs_dir, exist_ok=True)
+    # one buffered events_<run>.jsonl per run (event_sink: file keeps one JSON file per event),
+    # written by a background thread off a bounded queue when event_queue_size is set
+    try:
+        configure_sink(cfg.get("event_sink", "jsonl"),
+                       flush_bytes=cfg.get("event_flush_bytes", 64 * 1024),
+                       flush_interval_s=cfg.get("event_flush_interval_s", 1.0),
+                       queue_size=cfg.get("event_queue_size"),
+                       overflow=cfg.get("event_overflow", "block"),
+                       sample_every=cfg.get("event_sample_every", 10))
+    except ValueError:
+        configure_sink("jsonl")
 
     correlation_id = str(uuid.uuid4())
+    tracer = start_trace("orchestrator.run", query=query, correlation_id=correlation_id)
+    # stage counters / latency histograms: this run only, or accumulated via metrics_state_path
+    REGISTRY.reset()
+    REGISTRY.load(cfg.get("metrics_state_path"))
+    # opt-in per-stage memory profile (tracemalloc + RSS sampling) recorded around every span
+    profiler = None
+    if cfg.get("memory_profiling", False):
+        profiler = MemoryProfiler(top_n=cfg.get("memory_top_n", 5),
+                                  rss_interval_s=cfg.get("memory_rss_interval_s", 0.05)).start()
+        tracer.add_hook(profiler)
+    try:
+        return _run_stages(query, cfg, obs_dir, tracer, profiler, correlation_id)
+    finally:
+        # also on data_load_failed or any later error: no tracemalloc / rss-sampler left running
+        if profiler is not None:
+            profiler.stop()
+
+
+def _run_stages(query: str, cfg: Dict[str, Any], obs_dir: str, tracer: Tracer,
+                profiler: Optional[MemoryProfiler], correlation_id: str) -> Dict[str, Any]:
     start_ts = _ts()
     trace_id = datetime.utcnow().strftime("%Y%m%d%H%M%S")
 
@@ -41,137 +97,401 @@ def run(query: str) -> Tuple[Any, Any]:
         base_dir=obs_dir,
     )
 
+    # optional date-window pushdown: only the analysis window plus baseline lookback is loaded
+    plan_info = plan(query)
+    date_range = None
+    if cfg.get("date_pushdown", False):
+        window = plan_info.get("window_days") or cfg.get("window_days", 30)
+        lookback = cfg.get("baseline_lookback_days") or cfg.get("window_days", 30)
+        as_of = cfg.get("as_of_date")
+        if as_of is not None:
+            date_range = date_predicate(window, lookback_days=lookback, as_of=as_of)
+        else:
+            # anchor on the data, not today (historical exports would filter to nothing); the
+            # tail-read estimate can undershoot an unsorted file, so the window is left open-ended
+            as_of = latest_data_date(cfg["data_csv"])
+            if as_of is not None:
+                date_range = (date_predicate(window, lookback_days=lookback, as_of=as_of.date())[0], None)
+        log_event("orchestrator", "date_pushdown", {"date_range": date_range, "window_days": window,
+                                                    "lookback_days": lookback, "as_of": str(as_of)},
+                  base_dir=obs_dir)
+
     # load data (support sample flags and chunksize via config)
-    try:
-        df = load_data(
-            cfg["data_csv"],
-            sample_mode=cfg.get("sample_mode", False),
-            sample_size=cfg.get("sample_size", 5000),
-            chunksize=cfg.get("chunksize", None),
-        )
-    except Exception as e:
-        log_event(
-            "orchestrator",
-            "data_load_failed",
-            {"error": str(e), "correlation_id": correlation_id},
-            base_dir=obs_dir,
-        )
-        write_alert({"level": "critical", "reason": "data_load_failed", "detail": str(e)},
-                    path=os.path.join(obs_dir, "alerts.json"))
-        raise
+    # streaming mode folds chunks into partial aggregates instead of materializing the frame;
+    # incremental mode additionally persists them with a byte-offset watermark and parses only the new tail;
+    # a directory / glob data_csv is aggregated per file (cached by file fingerprint) and merged;
+    # sample_mode reservoir-samples the input (any layout) and takes the load_data path
+    sample_mode = bool(cfg.get("sample_mode", False))
+    streaming = bool(cfg.get("streaming", False)) and bool(cfg.get("chunksize")) and not sample_mode
+    incremental = bool(cfg.get("incremental", False)) and not sample_mode
+    partitioned = is_partitioned(cfg["data_csv"]) and not sample_mode
+    creatives_enabled = bool(cfg.get("creatives_enabled", True))
+    # distinct counts on the aggregate paths: exact creative_id set or HyperLogLog sketches;
+    # the segment dims stay in the aggregate state so the rollup cube / anomaly scan still see them
+    segment_dims = cfg.get("aggregate_dims")
+    if segment_dims is None:
+        segment_dims = list(cfg.get("anomaly_dims") or DEFAULT_ANOMALY_DIMS) + list(cfg.get("segment_thresholds") or [])
+        segment_dims = list(dict.fromkeys(segment_dims))
+    distinct_opts = {"distinct": cfg.get("distinct_counting", "exact"), "hll_precision": cfg.get("hll_precision", 12),
+                     "segment_dims": segment_dims}
+    with span("load", source=cfg["data_csv"]) as sp:
+        partials = None
+        try:
+            if partitioned:
+                partials = load_partitioned_aggregates(
+                    cfg["data_csv"],
+                    cache_dir=cfg.get("cache_dir"),
+                    cache_max_bytes=int(cfg.get("cache_max_mb", 512)) * 1024 * 1024,
+                    chunksize=cfg.get("chunksize") or 100_000,
+                    date_range=date_range,
+                    max_workers=cfg.get("partition_workers"),
+                    **distinct_opts,
+                )
+                df = partials.to_frame()
+            elif incremental:
+                partials = incremental_csv_aggregates(
+                    cfg["data_csv"],
+                    state_path=cfg.get("ingest_state_path", "reports/ingest_state.json"),
+                    chunksize=cfg.get("chunksize") or 100_000,
+                    **distinct_opts,
+                )
+                # running totals cover the whole export, so the date window is not pushed down here
+                df = partials.to_frame()
+            elif streaming:
+                partials = stream_csv_aggregates(cfg["data_csv"], chunksize=cfg["chunksize"], date_range=date_range,
+                                                 **distinct_opts)
+                df = partials.to_frame()
+            else:
+                df = load_data(
+                    cfg["data_csv"],
+                    sample_mode=sample_mode,
+                    sample_size=cfg.get("sample_size", 5000),
+                    strata=cfg.get("sample_strata"),
+                    seed=cfg.get("sample_seed"),
+                    chunksize=cfg.get("chunksize", None),
+                    cache_dir=cfg.get("cache_dir"),
+                    cache_max_bytes=int(cfg.get("cache_max_mb", 512)) * 1024 * 1024,
+                    prune=bool(cfg.get("prune_columns", False)),
+                    include_creative=creatives_enabled,
+                    date_range=date_range,
+                )
+        except Exception as e:
+            log_event(
+                "orchestrator",
+                "data_load_failed",
+                {"error": str(e), "correlation_id": correlation_id},
+                base_dir=obs_dir,
+            )
+            write_alert({"level": "critical", "reason": "data_load_failed", "detail": str(e)},
+                        path=os.path.join(obs_dir, "alerts.json"))
+            raise
+        sp.set(rows=partials.rows if partials is not None else len(df),
+               bytes=int(df.memory_usage(index=True).sum()),
+               input_bytes=_input_bytes(cfg["data_csv"]))
+
+    sampling = df.attrs.get("sampling") if partials is None else None
+    # stages that run on less than they would with the raw frame, with the reason (metrics.json)
+    degraded: Dict[str, str] = {}
+    if partials is not None and creatives_enabled and "creative_message" not in df.columns:
+        degraded["creatives"] = "aggregate load keeps no creative_message; campaign keyword extraction skipped"
+    for stage, reason in degraded.items():
+        log_event("orchestrator", "stage_degraded", {"stage": stage, "reason": reason}, base_dir=obs_dir)
 
     # write schema fingerprint and detect drift vs stored
-    current_fp = fingerprint_and_write(df, "reports/schema_fingerprint.json")
-    stored_fp = read_schema_fingerprint("reports/schema_fingerprint.json")
-    drift = detect_schema_drift(current_fp, stored_fp)
-    if drift.get("drift"):
-        log_event("orchestrator", "schema_drift_detected", {"diff": drift.get("diff")}, base_dir=obs_dir)
-        write_alert({"level": "warning", "reason": "schema_drift", "diff": drift.get("diff")},
-                    path=os.path.join(obs_dir, "alerts.json"))
-
-    log_event("data_agent", "summarize_start", {"rows": len(df)}, base_dir=obs_dir)
-    summary = summarize(df)
-    log_event("data_agent", "summarize_complete", {"start_date": summary.get(
-        "global", {}).get("start_date"), "correlation_id": correlation_id}, base_dir=obs_dir)
-
-    # compute dynamic thresholds with safe fallback to config defaults
-    dyn: Dict[str, Any] = {}
-    try:
-        dyn = compute_dynamic_thresholds(
-            df,
-            window_days=cfg.get("window_days", 30),
-            min_days=cfg.get("min_days", 7),
-            ctr_z=cfg.get("ctr_z", 1.5),
-            roas_z=cfg.get("roas_z", 1.0),
-        )
-    except Exception:
-        dyn = {}
-
-    thresholds: Dict[str, Any] = {
-        "ctr_low_threshold": dyn.get("ctr_low_threshold", cfg.get("ctr_low_threshold", 0.01)),
-        "roas_drop_threshold": dyn.get("roas_drop_threshold", cfg.get("roas_drop_threshold", 0.2)),
-        "confidence_min": cfg.get("confidence_min", 0.5),
-        "observability_dir": obs_dir,
-    }
+    with span("fingerprint", columns=len(df.columns)):
+        current_fp = fingerprint_and_write(partials.sample if partials is not None else df,
+                                           "reports/schema_fingerprint.json")
+        stored_fp = read_schema_fingerprint("reports/schema_fingerprint.json")
+        drift = detect_schema_drift(current_fp, stored_fp)
+        if drift.get("drift"):
+            log_event("orchestrator", "schema_drift_detected", {"diff": drift.get("diff")}, base_dir=obs_dir)
+            write_alert({"level": "warning", "reason": "schema_drift", "diff": drift.get("diff")},
+                        path=os.path.join(obs_dir, "alerts.json"))
 
-    # insight agent
-    try:
-        hyps = generate_hypotheses(summary, cfg.get("confidence_min", 0.5))
-    except Exception as e:
-        log_event("insight_agent", "generate_failed", {"error": str(
-            e), "correlation_id": correlation_id}, base_dir=obs_dir)
-        hyps = []
+    with span("summarize") as sp:
+        # aggregate by day once; summary, thresholds and evaluator all read this block
+        with span("daily_aggregate") as dsp:
+            try:
+                daily = DailyAggregate.from_frame(df)
+            except Exception as e:
+                log_event("data_agent", "daily_aggregate_failed", {"error": str(e)}, base_dir=obs_dir)
+                daily = None
+            dsp.set(days=daily.n_days if daily is not None else 0)
+
+        # dimension x day rollup cube for drill-downs (platform, country, adset, ...)
+        with span("rollup_cube") as csp:
+            cube = None
+            if cfg.get("rollup_cube", True):
+                try:
+                    cube = RollupCube.from_frame(df)
+                    csp.set(cells=cube.n_cells, bytes=cube.nbytes)
+                    log_event("data_agent", "rollup_cube_built", {"dims": cube.dims, "cells": cube.n_cells,
+                                                                  "bytes": cube.nbytes}, base_dir=obs_dir)
+                except Exception as e:
+                    log_event("data_agent", "rollup_cube_failed", {"error": str(e)}, base_dir=obs_dir)
+
+        rows_in_input = partials.rows if partials is not None else len(df)
+        log_event("data_agent", "summarize_start", {"rows": rows_in_input}, base_dir=obs_dir)
+        if partials is not None:
+            summary = summarize_partials(partials, daily=daily)
+        else:
+            summary = summarize(df, daily=daily)
+        log_event("data_agent", "summarize_complete", {"start_date": summary.get(
+            "global", {}).get("start_date"), "correlation_id": correlation_id}, base_dir=obs_dir)
+        sp.set(rows=rows_in_input, bytes=int(df.memory_usage(index=True).sum()))
+
+    with span("thresholds", days=daily.n_days if daily is not None else 0):
+        # compute dynamic thresholds with safe fallback to config defaults
+        with span("dynamic_thresholds"):
+            dyn: Dict[str, Any] = {}
+            try:
+                dyn = compute_dynamic_thresholds(
+                    daily if daily is not None else df,
+                    window_days=cfg.get("window_days", 30),
+                    min_days=cfg.get("min_days", 7),
+                    ctr_z=cfg.get("ctr_z", 1.5),
+                    roas_z=cfg.get("roas_z", 1.0),
+                    cache_dir=cfg.get("threshold_cache_dir"),
+                )
+            except Exception:
+                dyn = {}
+
+        # persisted t-digests of daily CTR/ROAS (global and per campaign) for long-history percentiles
+        sketch_baselines = None
+        if cfg.get("baseline_sketch_path") and daily is not None:
+            try:
+                sketch_path = cfg["baseline_sketch_path"]
+                sketches = BaselineSketches.load(sketch_path, compression=cfg.get("tdigest_compression", 100))
+                campaign_col = "campaign" if "campaign" in df.columns else "campaign_name"
+                sketches.update(daily, segments=df, segment_col=campaign_col).save(sketch_path)
+                sketch_baselines = sketches.baselines()
+                log_event("orchestrator", "baseline_sketches_updated", {"through": str(sketches.through),
+                          "baselines": sketch_baselines}, base_dir=obs_dir)
+            except Exception as e:
+                log_event("orchestrator", "baseline_sketches_failed", {"error": str(e)}, base_dir=obs_dir)
+
+        # online EWMA baselines (global and per campaign), updated with new closed days only
+        ewma_baseline = None
+        if cfg.get("baseline_mode", "window") == "ewma" and daily is not None:
+            try:
+                ewma_path = cfg.get("ewma_state_path") or "reports/ewma_baselines.json"
+                ewma = EwmaBaselines.load(ewma_path, halflife_days=cfg.get("ewma_halflife_days", 7))
+                campaign_col = "campaign" if "campaign" in df.columns else "campaign_name"
+                ewma.update(daily, segments=df, segment_col=campaign_col).save(ewma_path)
+                ewma_baseline = ewma.baselines()
+                log_event("orchestrator", "ewma_baselines_updated", {"through": str(ewma.through),
+                          "segments": len(ewma.labels) - 1, "baselines": ewma_baseline}, base_dir=obs_dir)
+            except Exception as e:
+                log_event("orchestrator", "ewma_baselines_failed", {"error": str(e)}, base_dir=obs_dir)
+
+        # per-segment thresholds, so a failing small campaign is not masked by the global baseline
+        with span("segment_thresholds", segment_cols=len(cfg.get("segment_thresholds") or [])):
+            segment_flags: Dict[str, Any] = {}
+            for seg_col in cfg.get("segment_thresholds") or []:
+                try:
+                    source = cube if cube is not None and seg_col in cube.dims else df
+                    table = compute_segment_thresholds(
+                        source,
+                        seg_col,
+                        window_days=cfg.get("window_days", 30),
+                        min_days=cfg.get("min_days", 7),
+                        ctr_z=cfg.get("ctr_z", 1.5),
+                        roas_z=cfg.get("roas_z", 1.0),
+                    )
+                    flagged = table[table["ctr_alert"] | table["roas_alert"]].sort_values("spend", ascending=False)
+                    segment_flags[seg_col] = {
+                        "segments": len(table),
+                        "flagged": len(flagged),
+                        "top": flagged.head(cfg.get("top_k_insights", 5)).reset_index().to_dict("records"),
+                    }
+                    log_event("orchestrator", "segment_thresholds_computed", {"segment_col": seg_col,
+                              "segments": len(table), "flagged": len(flagged)}, base_dir=obs_dir)
+                except Exception as e:
+                    log_event("orchestrator", "segment_thresholds_failed", {"segment_col": seg_col, "error": str(e)},
+                              base_dir=obs_dir)
+
+        thresholds: Dict[str, Any] = {
+            "ctr_low_threshold": dyn.get("ctr_low_threshold", cfg.get("ctr_low_threshold", 0.01)),
+            "roas_drop_threshold": dyn.get("roas_drop_threshold", cfg.get("roas_drop_threshold", 0.2)),
+            "confidence_min": cfg.get("confidence_min", 0.5),
+            "observability_dir": obs_dir,
+            # threshold parameters, so an evaluator given data reuses the memoized thresholds
+            "window_days": cfg.get("window_days", 30),
+            "min_days": cfg.get("min_days", 7),
+            "ctr_z": cfg.get("ctr_z", 1.5),
+            "roas_z": cfg.get("roas_z", 1.0),
+            "threshold_cache_dir": cfg.get("threshold_cache_dir"),
+        }
+
+    with span("insights") as sp:
+        # segment-wide anomaly scan over the rollup cube (campaign x adset x platform x country)
+        with span("anomaly_scan", cells=cube.n_cells if cube is not None else 0):
+            segment_anomalies = []
+            if cfg.get("anomaly_scan", True) and cube is not None:
+                try:
+                    segment_anomalies = scan_segment_anomalies(
+                        cube,
+                        cfg.get("anomaly_dims"),
+                        window_days=cfg.get("anomaly_window_days", 14),
+                        min_days=cfg.get("anomaly_min_days", 5),
+                        top_n=cfg.get("anomaly_top_n", 20),
+                        min_z=cfg.get("anomaly_min_z", 2.0),
+                    )
+                    log_event("insight_agent", "segment_anomalies_scanned", {"found": len(segment_anomalies),
+                              "top": segment_anomalies[:3]}, base_dir=obs_dir)
+                except Exception as e:
+                    log_event("insight_agent", "segment_anomaly_scan_failed", {"error": str(e)}, base_dir=obs_dir)
+
+        # baseline shared by the insight agent and the evaluator
+        baseline = ewma_baseline
+        if baseline is None:
+            try:
+                baseline = compute_global_baselines(daily if daily is not None else df,
+                                                    window_days=cfg.get("window_days", 30))
+            except Exception:
+                baseline = None
+
+        # insight agent
+        try:
+            insight_cfg = {**cfg, "roas_baseline": baseline or {}, "segment_anomalies": segment_anomalies}
+            hyps = generate_hypotheses(summary, plan_info.get("steps", []), insight_cfg, base_dir=obs_dir)
+        except Exception as e:
+            log_event("insight_agent", "generate_failed", {"error": str(
+                e), "correlation_id": correlation_id}, base_dir=obs_dir)
+            hyps = []
+        sp.set(hypotheses=len(hyps), segment_anomalies=len(segment_anomalies))
 
     # evaluator
-    try:
-        validated, eval_metrics = validate(hyps, summary, thresholds)
-    except Exception as e:
-        log_event("evaluator", "validate_failed", {"error": str(e), "correlation_id": correlation_id}, base_dir=obs_dir)
-        write_alert({"level": "warning", "reason": "evaluator_failed", "detail": str(e)},
-                    path=os.path.join(obs_dir, "alerts.json"))
-        validated, eval_metrics = [], {"num_hypotheses": 0, "num_validated": 0, "validation_rate": 0.0}
+    with span("evaluator", hypotheses=len(hyps)) as sp:
+        try:
+            validated, eval_metrics = validate(hyps, summary, thresholds, baseline=baseline)
+        except Exception as e:
+            log_event("evaluator", "validate_failed", {"error": str(e), "correlation_id": correlation_id},
+                      base_dir=obs_dir)
+            write_alert({"level": "warning", "reason": "evaluator_failed", "detail": str(e)},
+                        path=os.path.join(obs_dir, "alerts.json"))
+            validated, eval_metrics = [], {"num_hypotheses": 0, "num_validated": 0, "validation_rate": 0.0}
 
-    # retry extras (non-fatal)
-    try:
-        extra = compute_extra_aggregates(df)
-        validated = apply_retry_logic(validated, extra)
-    except Exception:
-        log_event("observability", "extra_aggregates_failed", {"correlation_id": correlation_id}, base_dir=obs_dir)
+        # retry extras (non-fatal)
+        try:
+            extra = compute_extra_aggregates(df)
+            extra["rows"] = rows_in_input
+            validated = apply_retry_logic(validated, extra)
+        except Exception:
+            log_event("observability", "extra_aggregates_failed", {"correlation_id": correlation_id},
+                      base_dir=obs_dir)
+        sp.set(validated=len(validated))
 
     # creatives
-    creatives = generate_creatives(validated, summary, df, base_dir=obs_dir)
+    with span("creatives", insights=len(validated)) as sp:
+        creatives = generate_creatives(validated, summary, df, base_dir=obs_dir) if creatives_enabled else []
+        sp.set(creatives=len(creatives))
 
     # write outputs
-    os.makedirs("reports", exist_ok=True)
-    write_json("reports/insights.json", validated)
-    write_json("reports/creatives.json", creatives)
-
-    trace_path = os.path.join(obs_dir, f"trace_orchestrator_{start_ts.replace(':','-')}_{correlation_id[:8]}.json")
-    write_json(trace_path, {"timestamp": start_ts, "query": query,
-               "insights": validated, "trace_id": trace_id, "dyn_thresholds": dyn})
-
-    # metrics
-    metrics = {
-        "query": query,
-        "start_ts": start_ts,
-        "run_ts": _ts(),
-        "num_hypotheses": eval_metrics.get("num_hypotheses") if isinstance(eval_metrics, dict) else None,
-        "num_validated": eval_metrics.get("num_validated") if isinstance(eval_metrics, dict) else None,
-        "validation_rate": eval_metrics.get("validation_rate") if isinstance(eval_metrics, dict) else None,
-        "num_creatives": len(creatives) if creatives else 0,
-        "rows_in_input": int(summary.get("global", {}).get("rows_in_input", 0)),
-        "metrics_version": cfg.get("metrics_version", "v1"),
-        "dyn_ctr_low_threshold": dyn.get("ctr_low_threshold"),
-        "dyn_roas_drop_threshold": dyn.get("roas_drop_threshold"),
-    }
+    with span("writes") as sp:
+        os.makedirs("reports", exist_ok=True)
+        write_json("reports/insights.json", validated)
+        write_json("reports/creatives.json", creatives)
 
-    if isinstance(eval_metrics, dict) and "roas_drop" in eval_metrics:
-        metrics["roas_drop"] = eval_metrics["roas_drop"]
+        trace_path = os.path.join(obs_dir, f"trace_orchestrator_{start_ts.replace(':','-')}_{correlation_id[:8]}.json")
+        trace = {"timestamp": start_ts, "query": query, "insights": validated, "trace_id": trace_id,
+                 "dyn_thresholds": dyn, "sketch_baselines": sketch_baselines,
+                 "ewma_baselines": ewma_baseline, "segment_thresholds": segment_flags,
+                 "segment_anomalies": segment_anomalies}
+        write_json(trace_path, trace)
 
-    try:
-        fmt = "%Y-%m-%dT%H:%M:%S.%fZ"
-        start_dt = datetime.strptime(start_ts, fmt)
-        end_dt = datetime.strptime(metrics["run_ts"], fmt)
-        metrics["duration_ms"] = int((end_dt - start_dt).total_seconds() * 1000)
-    except Exception:
-        metrics["duration_ms"] = None
+        # metrics
+        metrics = {
+            "query": query,
+            "start_ts": start_ts,
+            "run_ts": _ts(),
+            "num_hypotheses": eval_metrics.get("num_hypotheses") if isinstance(eval_metrics, dict) else None,
+            "num_validated": eval_metrics.get("num_validated") if isinstance(eval_metrics, dict) else None,
+            "validation_rate": eval_metrics.get("validation_rate") if isinstance(eval_metrics, dict) else None,
+            "num_creatives": len(creatives) if creatives else 0,
+            "rows_in_input": int(summary.get("global", {}).get("rows_in_input", 0)),
+            "metrics_version": cfg.get("metrics_version", "v1"),
+            "dyn_ctr_low_threshold": dyn.get("ctr_low_threshold"),
+            "dyn_roas_drop_threshold": dyn.get("roas_drop_threshold"),
+            "sampling_fraction": sampling["fraction"] if sampling else 1.0,
+            "segments_flagged": {col: v["flagged"] for col, v in segment_flags.items()},
+            "degraded_stages": degraded,
+        }
+        if sampling:
+            metrics["sampling"] = sampling
 
-    write_metrics(metrics, path=cfg.get("metrics_output", "reports/metrics.json"))
+        if isinstance(eval_metrics, dict) and "roas_drop" in eval_metrics:
+            metrics["roas_drop"] = eval_metrics["roas_drop"]
+
+        metrics["duration_ms"] = int(tracer.elapsed_ms())
+
+        write_metrics(metrics, path=cfg.get("metrics_output", "reports/metrics.json"))
 
-    alert_result = alert_rule_roas_drop(metrics, thresholds)
-    if alert_result.get("alerted"):
-        write_alert({"level": "warning", "reason": alert_result.get("reason"),
-                    "metrics": metrics}, path=os.path.join(obs_dir, "alerts.json"))
-        log_event("orchestrator", "alert_raised", {"reason": alert_result.get("reason")}, base_dir=obs_dir)
+        alert_result = alert_rule_roas_drop(metrics, thresholds)
+        if alert_result.get("alerted"):
+            write_alert({"level": "warning", "reason": alert_result.get("reason"),
+                         "metrics": metrics}, path=os.path.join(obs_dir, "alerts.json"))
+            log_event("orchestrator", "alert_raised", {"reason": alert_result.get("reason")}, base_dir=obs_dir)
 
-    with open("reports/report.md", "w", encoding="utf-8") as f:
-        f.write("# Agentic FB Analyst Report\n")
-        f.write(f"Query: {query}\n")
-        f.write(f"Run time: {_ts()}\n\n")
-        f.write("Insights and creatives saved to reports/.\n")
+        with open("reports/report.md", "w", encoding="utf-8") as f:
+            f.write("# Agentic FB Analyst Report\n")
+            f.write(f"Query: {query}\n")
+            f.write(f"Run time: {_ts()}\n\n")
+            f.write("Insights and creatives saved to reports/.\n")
+        written = ["reports/insights.json", "reports/creatives.json", trace_path, "reports/report.md",
+                   cfg.get("metrics_output", "reports/metrics.json")]
+        sp.set(files=len(written), bytes=sum(_input_bytes(p) for p in written))
 
-    log_event("orchestrator", "run_completed", {"metrics": metrics,
+    # per-stage timings from the span trace; Chrome trace-event JSON for a trace viewer
+    tracer.finish()
+    metrics["duration_ms"] = int(tracer.elapsed_ms())
+    metrics["stage_ms"] = tracer.stage_ms()
+    if profiler is not None:
+        profiler.stop()
+        memory = profiler.report()
+        memory["budget_exceeded"] = check_memory_budget(memory["stages"], cfg.get("memory_budget_mb"))
+        for over in memory["budget_exceeded"]:
+            write_alert({"level": "warning", "reason": "memory_budget_exceeded", **over},
+                        path=os.path.join(obs_dir, "alerts.json"))
+            log_event("orchestrator", "memory_budget_exceeded", over, base_dir=obs_dir)
+        metrics["memory_peak_mb"] = memory["peak_mb"]
+        memory_gauge = REGISTRY.gauge("stage_memory_peak_bytes", "Traced memory peak of run stages", ("stage",))
+        for stage, mb in memory["peak_mb"].items():
+            memory_gauge.labels(stage).set(mb * 1024 * 1024)
+        # the run trace was written inside the writes stage; rewrite it with the memory profile
+        trace["memory"] = memory
+        write_json(trace_path, trace)
+    try:
+        run_stages = REGISTRY.histogram("run_stage_seconds", "Wall time of orchestrator run stages", ("stage",))
+        for stage, ms in metrics["stage_ms"].items():
+            run_stages.labels(stage).observe(ms / 1e3)
+        REGISTRY.histogram("run_duration_seconds", "Wall time of orchestrator runs").observe(tracer.elapsed_ms() / 1e3)
+        REGISTRY.gauge("run_rows_in_input", "Rows read by the last run").set(rows_in_input)
+        REGISTRY.gauge("run_hypotheses", "Hypotheses generated by the last run").set(len(hyps))
+        REGISTRY.gauge("run_validated", "Validated insights of the last run").set(len(validated))
+        REGISTRY.gauge("run_creatives", "Creative bundles of the last run").set(len(creatives))
+        metrics["registry"] = REGISTRY.snapshot()
+        REGISTRY.write_prometheus(cfg.get("prometheus_output") or "reports/metrics.prom")
+        if cfg.get("metrics_state_path"):
+            REGISTRY.save(cfg["metrics_state_path"])
+    except Exception as e:
+        log_event("orchestrator", "metrics_registry_failed", {"error": str(e)}, base_dir=obs_dir)
+    chrome_trace = None
+    if cfg.get("chrome_trace", True):
+        try:
+            chrome_trace = tracer.write_chrome_trace(
+                os.path.join(obs_dir, f"chrome_trace_{trace_id}_{correlation_id[:8]}.json"))
+        except Exception as e:
+            log_event("orchestrator", "chrome_trace_failed", {"error": str(e)}, base_dir=obs_dir)
+
+    log_event("orchestrator", "run_completed", {"metrics": metrics, "chrome_trace": chrome_trace,
               "trace_id": trace_id, "correlation_id": correlation_id}, base_dir=obs_dir)
+    flush_events()
+    queue_stats = event_stats()
+    if queue_stats:
+        # final event-queue counters (all run events are written by now)
+        metrics["event_log"] = queue_stats
+    write_metrics(metrics, path=cfg.get("metrics_output", "reports/metrics.json"))
 
     return {
         "validated": validated,
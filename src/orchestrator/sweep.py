@@ -0,0 +1,309 @@
+# File: src/orchestrator/sweep.py
+# Parameter sweep over the threshold / evaluator settings on a shared process pool.
+
+"""
+Sweep mode for tuning window_days, min_days, ctr_z, roas_z and the severity thresholds
+without editing config.yaml and re-running run.py.
+
+The data is loaded, aggregated by day and summarized once, and the insight hypotheses are
+generated once per distinct window_days (against that window's baseline). The pool workers
+receive that shared state once (pool initializer), and each combination then only runs
+compute_dynamic_thresholds (memoized per worker, so combinations differing only in
+severity reuse the thresholds) and validate(). The results table has one row per
+combination with its thresholds, validation outcome and timings.
+
+Spec (YAML / JSON, or --grid / --random on the command line):
+
+    grid:                       # cartesian product
+      ctr_z: [1.0, 1.5, 2.0]
+      window_days: [14, 30]
+    random:                     # n random draws; combined with every grid point
+      roas_z: {low: 0.5, high: 2.0}       # uniform (integers if both bounds are ints)
+      severity_high_threshold: [-0.3, -0.2, -0.1]   # choice
+    n: 20
+    seed: 0
+
+Usage:
+    python -m src.orchestrator.sweep --spec sweep.yaml --out reports/sweep.csv
+    python -m src.orchestrator.sweep --grid ctr_z=1,1.5,2 --random roas_z=0.5:2 --n 10
+"""
+from __future__ import annotations
+
+import argparse
+import importlib.util
+import itertools
+import json
+import os
+import shutil
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Dict, List, Optional, Sequence
+import numpy as np
+import pandas as pd
+import yaml
+
+from src.agents.data_agent import load_data, summarize
+from src.agents.evaluator import validate
+from src.agents.insight_agent import generate_insights
+from src.utils.aggregates import DailyAggregate
+from src.utils.baseline import compute_global_baselines
+from src.utils.observability import log_event
+from src.utils.thresholds import compute_dynamic_thresholds
+
+SWEEP_PARAMS = (
+    "window_days",
+    "min_days",
+    "ctr_z",
+    "roas_z",
+    "severity_critical_threshold",
+    "severity_high_threshold",
+    "severity_medium_threshold",
+)
+_INT_PARAMS = {"window_days", "min_days"}
+IMPACT_LEVELS = ["none", "low", "medium", "high", "critical"]
+
+# defaults mirror config/config.yaml
+DEFAULT_PARAMS: Dict[str, Any] = {
+    "window_days": 30,
+    "min_days": 7,
+    "ctr_z": 1.5,
+    "roas_z": 1.0,
+    "severity_critical_threshold": -0.40,
+    "severity_high_threshold": -0.20,
+    "severity_medium_threshold": -0.05,
+}
+
+# shared sweep state, set once per pool worker by the initializer
+_WORKER_STATE: Dict[str, Any] = {}
+
+
+def _draw(rng: np.random.Generator, dist: Any) -> Any:
+    if isinstance(dist, dict):
+        low, high = dist["low"], dist["high"]
+        if isinstance(low, int) and isinstance(high, int):
+            return int(rng.integers(low, high + 1))
+        return float(rng.uniform(low, high))
+    if isinstance(dist, (list, tuple)):
+        return dist[int(rng.integers(len(dist)))]
+    return dist
+
+
+def expand_spec(spec: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """
+    Combinations from a sweep spec: the `grid` product, or `n` draws from `random`,
+    or (with both) every random draw combined with every grid point.
+    """
+    grid = spec.get("grid") or {}
+    random_spec = spec.get("random") or {}
+    unknown = (set(grid) | set(random_spec)) - set(SWEEP_PARAMS)
+    if unknown:
+        raise ValueError(f"Unknown sweep parameters: {sorted(unknown)}")
+
+    keys = list(grid)
+    points = [dict(zip(keys, values)) for values in itertools.product(*(grid[k] for k in keys))]
+    if not random_spec:
+        return points
+    rng = np.random.default_rng(spec.get("seed"))
+    draws = [{k: _draw(rng, d) for k, d in random_spec.items()} for _ in range(int(spec.get("n", 10)))]
+    return [{**p, **d} for d in draws for p in points]
+
+
+def _init_worker(state: Dict[str, Any]) -> None:
+    _WORKER_STATE.clear()
+    _WORKER_STATE.update(state)
+
+
+def _resolve(params: Dict[str, Any], cfg: Dict[str, Any]) -> Dict[str, Any]:
+    """Full parameter set of a combination: params over cfg over DEFAULT_PARAMS."""
+    p = dict(DEFAULT_PARAMS)
+    p.update({k: v for k, v in cfg.items() if k in SWEEP_PARAMS})
+    p.update(params)
+    for k in _INT_PARAMS:
+        p[k] = int(p[k])
+    return p
+
+
+def _evaluate(params: Dict[str, Any], state: Dict[str, Any]) -> Dict[str, Any]:
+    """Thresholds + validate() for one combination, with timings in milliseconds."""
+    p = _resolve(params, state["cfg"])
+
+    t0 = time.perf_counter()
+    dyn = compute_dynamic_thresholds(state["daily"], window_days=p["window_days"], min_days=p["min_days"],
+                                     ctr_z=p["ctr_z"], roas_z=p["roas_z"])
+    t1 = time.perf_counter()
+    eval_cfg = {
+        "confidence_min": state["cfg"].get("confidence_min", 0.5),
+        "ctr_low_threshold": dyn["ctr_low_threshold"],
+        "roas_drop_threshold": dyn["roas_drop_threshold"],
+        "severity_critical_threshold": p["severity_critical_threshold"],
+        "severity_high_threshold": p["severity_high_threshold"],
+        "severity_medium_threshold": p["severity_medium_threshold"],
+    }
+    baseline = compute_global_baselines(state["daily"], window_days=p["window_days"])
+    # hypotheses were generated against the baseline of this combination's window_days
+    validated, metrics = validate(state["hypotheses"][p["window_days"]], state["summary"], eval_cfg,
+                                  baseline=baseline, base_dir=state["log_dir"])
+    t2 = time.perf_counter()
+
+    row: Dict[str, Any] = {k: p[k] for k in SWEEP_PARAMS}
+    row.update({
+        "ctr_low_threshold": dyn["ctr_low_threshold"],
+        "roas_drop_threshold": dyn["roas_drop_threshold"],
+        "ctr_baseline": baseline["ctr_baseline"],
+        "roas_baseline": baseline["roas_baseline"],
+        "num_hypotheses": metrics["num_hypotheses"],
+        "num_passed": metrics["num_passed"],
+        "validation_rate": metrics["validation_rate"],
+    })
+    impacts = [v.get("impact", "none") for v in validated]
+    for level in IMPACT_LEVELS:
+        row[f"impact_{level}"] = impacts.count(level)
+    row.update({
+        "thresholds_ms": round((t1 - t0) * 1000, 3),
+        "validate_ms": round((t2 - t1) * 1000, 3),
+        "total_ms": round((t2 - t0) * 1000, 3),
+        "worker": os.getpid(),
+    })
+    return row
+
+
+def _evaluate_worker(params: Dict[str, Any]) -> Dict[str, Any]:
+    """Process-pool entry point: evaluate one combination against the worker's shared state."""
+    return _evaluate(params, _WORKER_STATE)
+
+
+def sweep(
+    df: pd.DataFrame,
+    combos: Sequence[Dict[str, Any]],
+    *,
+    cfg: Optional[Dict[str, Any]] = None,
+    max_workers: Optional[int] = None,
+    base_dir: str = "logs/observability",
+) -> pd.DataFrame:
+    """
+    Evaluate each parameter combination on the same data.
+
+    Args:
+        df: Loaded data (aggregated by day and summarized once, then shared)
+        combos: Parameter dicts (keys from SWEEP_PARAMS; see expand_spec); unset
+            parameters come from cfg, then DEFAULT_PARAMS
+        cfg: Pipeline config (confidence_min, top_k_insights, defaults for SWEEP_PARAMS)
+        max_workers: Process pool size (None = CPU count, 1 = serial)
+
+    Returns:
+        One row per combination: the parameters, thresholds, baselines, validation
+        counts, impact counts and timings (thresholds_ms / validate_ms / total_ms).
+    """
+    cfg = cfg or {}
+    combos = list(combos)
+    for c in combos:
+        unknown = set(c) - set(SWEEP_PARAMS)
+        if unknown:
+            raise ValueError(f"Unknown sweep parameters: {sorted(unknown)}")
+
+    started = time.perf_counter()
+    # per-combination agent logs would be thousands of files; keep them in a scratch dir
+    log_dir = tempfile.mkdtemp(prefix="sweep_logs_")
+    try:
+        daily = DailyAggregate.from_frame(df)
+        summary = summarize(df, daily=daily)
+        # the insight agent and the evaluator share a baseline, so hypotheses are generated
+        # once per distinct window_days
+        hypotheses: Dict[int, List[Dict[str, Any]]] = {}
+        for window_days in sorted({_resolve(c, cfg)["window_days"] for c in combos}):
+            hypotheses[window_days] = generate_insights(
+                summary, compute_global_baselines(daily, window_days=window_days),
+                top_k=cfg.get("top_k_insights", 5), base_dir=log_dir)
+        state = {"daily": daily, "summary": summary, "hypotheses": hypotheses, "cfg": cfg, "log_dir": log_dir}
+        log_event("sweep", "sweep_start", {"combinations": len(combos),
+                  "hypotheses": {w: len(h) for w, h in hypotheses.items()}}, base_dir=base_dir)
+
+        rows: List[Dict[str, Any]] = []
+        if len(combos) > 1 and (max_workers is None or max_workers > 1):
+            try:
+                with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker,
+                                         initargs=(state,)) as pool:
+                    chunk = max(1, len(combos) // (4 * (max_workers or os.cpu_count() or 1)))
+                    rows = list(pool.map(_evaluate_worker, combos, chunksize=chunk))
+            except (BrokenProcessPool, OSError, NotImplementedError) as e:
+                # no usable process pool (e.g. restricted sandbox); fall back to serial
+                log_event("sweep", "sweep_pool_unavailable", {"error": str(e)}, base_dir=base_dir)
+                rows = []
+        if not rows:
+            rows = [_evaluate(c, state) for c in combos]
+    finally:
+        shutil.rmtree(log_dir, ignore_errors=True)
+
+    log_event("sweep", "sweep_complete", {"combinations": len(rows),
+              "elapsed_ms": round((time.perf_counter() - started) * 1000, 3)}, base_dir=base_dir)
+    return pd.DataFrame(rows)
+
+
+def write_results(results: pd.DataFrame, path: str) -> str:
+    """CSV (compact float format) or Parquet (needs pyarrow or fastparquet), by extension."""
+    parquet = path.endswith(".parquet")
+    if parquet and not any(importlib.util.find_spec(m) for m in ("pyarrow", "fastparquet")):
+        raise ValueError(f"Writing {path} needs pyarrow or fastparquet (not installed); use a .csv path")
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    if parquet:
+        results.to_parquet(path, index=False)
+    else:
+        results.to_csv(path, index=False, float_format="%.6g")
+    return path
+
+
+def _parse_value(key: str, raw: str) -> Any:
+    return int(float(raw)) if key in _INT_PARAMS else float(raw)
+
+
+def _spec_from_args(args: argparse.Namespace) -> Dict[str, Any]:
+    spec: Dict[str, Any] = {}
+    if args.spec:
+        with open(args.spec, "r", encoding="utf-8") as f:
+            spec = (json.load(f) if args.spec.endswith(".json") else yaml.safe_load(f)) or {}
+    for item in args.grid or []:
+        key, values = item.split("=", 1)
+        spec.setdefault("grid", {})[key] = [_parse_value(key, v) for v in values.split(",")]
+    for item in args.random or []:
+        key, rng = item.split("=", 1)
+        if ":" in rng:
+            low, high = (_parse_value(key, v) for v in rng.split(":", 1))
+            spec.setdefault("random", {})[key] = {"low": low, "high": high}
+        else:
+            spec.setdefault("random", {})[key] = [_parse_value(key, v) for v in rng.split(",")]
+    if args.n is not None:
+        spec["n"] = args.n
+    if args.seed is not None:
+        spec["seed"] = args.seed
+    return spec
+
+
+def main(argv: Optional[Sequence[str]] = None) -> pd.DataFrame:
+    ap = argparse.ArgumentParser(description="Evaluate thresholds + validation over a parameter grid/random search.")
+    ap.add_argument("--config", default="config/config.yaml")
+    ap.add_argument("--data", default=None, help="CSV to load (defaults to data_csv from the config)")
+    ap.add_argument("--spec", default=None, help="YAML/JSON sweep spec")
+    ap.add_argument("--grid", action="append", help="param=v1,v2,... (repeatable)")
+    ap.add_argument("--random", action="append", help="param=low:high or param=v1,v2,... (repeatable)")
+    ap.add_argument("--n", type=int, default=None, help="number of random draws")
+    ap.add_argument("--seed", type=int, default=None)
+    ap.add_argument("--workers", type=int, default=None)
+    ap.add_argument("--out", default="reports/sweep.csv", help=".csv or .parquet")
+    args = ap.parse_args(argv)
+
+    with open(args.config, "r", encoding="utf-8") as f:
+        cfg = yaml.safe_load(f) or {}
+    combos = expand_spec(_spec_from_args(args))
+    df = load_data(args.data or cfg.get("data_csv", "data/sample_fb_ads.csv"),
+                   prune=bool(cfg.get("prune_columns", False)), include_creative=False)
+    results = sweep(df, combos, cfg=cfg, max_workers=args.workers,
+                    base_dir=cfg.get("observability_dir", "logs/observability"))
+    write_results(results, args.out)
+    print(f"{len(results)} combinations -> {args.out}")
+    return results
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,458 @@
+# File: src/utils/aggregates.py
+# Mergeable partial aggregates so large CSVs can be summarized one chunk at a time.
+
+from __future__ import annotations
+from typing import Any, Dict, List, Optional, Sequence, Set
+import numpy as np
+import pandas as pd
+
+from src.utils.sketches import HyperLogLog
+
+MEASURE_COLS = ["spend", "revenue", "impressions", "clicks"]
+MISSING_TRACKED_COLS = ["spend", "revenue", "impressions", "clicks", "campaign"]
+
+
+def _campaign_col(columns: Any) -> Optional[str]:
+    if "campaign" in columns:
+        return "campaign"
+    if "campaign_name" in columns:
+        return "campaign_name"
+    return None
+
+
+def _distinct_columns(columns: Any) -> Dict[str, str]:
+    """Source column for each approximate distinct count (creative_id, campaign, adset)."""
+    out = {}
+    if "creative_id" in columns:
+        out["creative_id"] = "creative_id"
+    campaign_col = _campaign_col(columns)
+    if campaign_col:
+        out["campaign"] = campaign_col
+    for col in ("adset_name", "ad_set"):
+        if col in columns:
+            out["adset"] = col
+            break
+    return out
+
+
+class DailyAggregate:
+    """
+    Day-indexed NumPy block of daily sums, built once per run and shared by the
+    summary, baseline and threshold code.
+
+    - `values` is a float64 array of shape (n_days, 4) with columns MEASURE_COLS
+    - days are contiguous from `start` (gap days hold zeros, like pd.Grouper(freq="D"))
+    - `present` lists the measures that existed in the source frame; an aggregate
+      built from a frame without a date column has no measures present
+    """
+
+    def __init__(self, start: Optional[np.datetime64], values: np.ndarray, present: Sequence[str] = ()) -> None:
+        self.start = None if start is None else np.datetime64(start, "D")
+        self.values = np.asarray(values, dtype="float64").reshape(-1, len(MEASURE_COLS))
+        self.present = tuple(c for c in MEASURE_COLS if c in present)
+
+    @classmethod
+    def empty(cls, present: Sequence[str] = ()) -> "DailyAggregate":
+        return cls(None, np.zeros((0, len(MEASURE_COLS))), present)
+
+    @classmethod
+    def from_frame(
+        cls,
+        df: pd.DataFrame,
+        date_col: str = "date",
+        measure_cols: Optional[Dict[str, str]] = None,
+    ) -> "DailyAggregate":
+        """
+        Aggregate a raw (or already compacted) frame by day in one pass without copying it.
+
+        measure_cols optionally maps a measure name to the frame column holding it.
+        Rows with unparseable dates are skipped; NaN measures count as zero.
+        """
+        names = {m: (measure_cols or {}).get(m, m) for m in MEASURE_COLS}
+        if date_col not in df.columns:
+            return cls.empty()
+        present = [m for m in MEASURE_COLS if names[m] in df.columns]
+
+        dates = df[date_col]
+        if not pd.api.types.is_datetime64_any_dtype(dates):
+            dates = pd.to_datetime(dates, errors="coerce")
+        days = dates.to_numpy(dtype="datetime64[ns]").astype("datetime64[D]")
+        valid = ~np.isnat(days)
+        if not valid.any():
+            return cls.empty(present)
+
+        days = days[valid]
+        start = days.min()
+        idx = (days - start).astype(np.int64)
+        n_days = int(idx.max()) + 1
+
+        values = np.zeros((n_days, len(MEASURE_COLS)), dtype="float64")
+        if present:
+            # groupby sums are Kahan-compensated (np.bincount is not), which keeps the daily
+            # series bit-identical to the pd.Grouper(freq="D") sums it replaced; NaN counts as zero
+            block = pd.DataFrame({m: df[names[m]].to_numpy(dtype="float64", na_value=np.nan)[valid] for m in present})
+            sums = block.groupby(idx, sort=False).sum()
+            cols = [MEASURE_COLS.index(m) for m in present]
+            values[np.ix_(sums.index.to_numpy(), cols)] = sums.to_numpy()
+        return cls(start, values, present)
+
+    @property
+    def n_days(self) -> int:
+        return int(self.values.shape[0])
+
+    @property
+    def dates(self) -> np.ndarray:
+        if self.start is None:
+            return np.array([], dtype="datetime64[D]")
+        return self.start + np.arange(self.n_days)
+
+    def has(self, *measures: str) -> bool:
+        return all(m in self.present for m in measures)
+
+    def column(self, measure: str) -> np.ndarray:
+        return self.values[:, MEASURE_COLS.index(measure)]
+
+    def merge(self, other: "DailyAggregate") -> "DailyAggregate":
+        """Sum two aggregates over the union of their day ranges."""
+        present = [m for m in MEASURE_COLS if m in self.present or m in other.present]
+        if other.start is None:
+            return DailyAggregate(self.start, self.values.copy(), present)
+        if self.start is None:
+            return DailyAggregate(other.start, other.values.copy(), present)
+        start = min(self.start, other.start)
+        end = max(self.start + self.n_days, other.start + other.n_days)
+        values = np.zeros((int((end - start).astype(np.int64)), len(MEASURE_COLS)))
+        for agg in (self, other):
+            off = int((agg.start - start).astype(np.int64))
+            values[off:off + agg.n_days] += agg.values
+        return DailyAggregate(start, values, present)
+
+
+def as_daily_aggregate(
+    data: Any,
+    date_col: str = "date",
+    measure_cols: Optional[Dict[str, str]] = None,
+) -> DailyAggregate:
+    """Return `data` if it is already a DailyAggregate, otherwise aggregate the frame by day."""
+    if isinstance(data, DailyAggregate):
+        return data
+    return DailyAggregate.from_frame(data, date_col=date_col, measure_cols=measure_cols)
+
+
+def daily_roas_records(daily: DailyAggregate) -> List[Dict[str, Any]]:
+    """Sorted [{date, roas}] series from a daily aggregate (ROAS 0.0 on zero-spend days)."""
+    if not daily.has("spend", "revenue"):
+        return []
+    day_spend = daily.column("spend")
+    with np.errstate(divide="ignore", invalid="ignore"):
+        # Safe division for ROAS
+        roas = np.where(day_spend > 0, daily.column("revenue") / day_spend, 0.0)
+
+    # Filter out invalid ROAS values
+    keep = ~np.isnan(roas) & ~np.isinf(roas)
+    day_labels = np.datetime_as_string(daily.dates[keep], unit="D")
+    return [{"date": str(d), "roas": float(r)} for d, r in zip(day_labels, roas[keep])]
+
+
+def campaign_records(df: pd.DataFrame, campaign_col: str) -> List[Dict[str, Any]]:
+    """
+    Per-campaign sums, CTR and ROAS as summary records, sorted by spend (descending, stable).
+
+    Array-based: ratios use masked NumPy division and records are built column-wise,
+    with the same value semantics as the former per-row loop (counts truncated to int
+    before the CTR division, -0.0 normalized, non-finite ratios reported as 0.0).
+    """
+    missing = [c for c in ("spend", "impressions", "clicks", "revenue") if c not in df.columns]
+    if missing:
+        raise KeyError(f"Column(s) {missing} do not exist")
+    grp = (
+        df.groupby(campaign_col, observed=True)
+        .agg({"spend": "sum", "impressions": "sum", "clicks": "sum", "revenue": "sum"})
+        .reset_index()
+    )
+    if len(grp) == 0:
+        return []
+
+    impressions = grp["impressions"].to_numpy(dtype="float64")
+    clicks = grp["clicks"].to_numpy(dtype="float64")
+    if not (np.isfinite(impressions).all() and np.isfinite(clicks).all()):
+        raise ValueError("non-finite impressions/clicks in campaign sums")
+    impressions_i = np.trunc(impressions).astype(np.int64)
+    clicks_i = np.trunc(clicks).astype(np.int64)
+    spend = grp["spend"].to_numpy(dtype="float64") + 0.0
+    revenue = grp["revenue"].to_numpy(dtype="float64") + 0.0
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        ctr = np.where(impressions_i > 0, clicks_i / np.where(impressions_i > 0, impressions_i, 1), 0.0)
+        roas = np.where(spend > 0, revenue / np.where(spend > 0, spend, 1.0), 0.0)
+    ctr[~np.isfinite(ctr)] = 0.0
+    roas[~np.isfinite(roas)] = 0.0
+
+    # labels go through the row-interleaved dtype, as iterrows() did (e.g. int ids -> "1.0")
+    labels = [str(v) for v in grp.to_numpy()[:, 0]]
+    spend_l = spend.tolist()
+    cols = zip(labels, spend_l, impressions_i.tolist(), clicks_i.tolist(), ctr.tolist(),
+               revenue.tolist(), roas.tolist())
+    rows = [
+        {"campaign": c, "spend": s, "impressions": i, "clicks": k, "ctr": t, "revenue": r, "roas": ro}
+        for c, s, i, k, t, r, ro in cols
+    ]
+    order = sorted(range(len(rows)), key=spend_l.__getitem__, reverse=True)
+    return [rows[i] for i in order]
+
+
+class PartialAggregates:
+    """
+    Additive aggregate state built from one or more chunks of raw rows.
+
+    The raw rows are collapsed to one row per (day, campaign) holding the sums
+    of spend/revenue/impressions/clicks. Because every downstream statistic is a
+    sum over those keys, the compact frame gives the same totals, daily series
+    and per-campaign sums as the full frame while its size is bounded by
+    days x campaigns instead of the row count.
+
+    States built over disjoint rows (chunks, partitions, days, worker processes) are
+    combined with merge() -- or shipped as to_state() JSON and rebuilt with
+    from_state() -- and rendered once with finalize().
+
+    distinct="hll" replaces the exact creative_id set with HyperLogLog sketches
+    (src/utils/sketches.py) of creative_id, campaign and adset, so distinct counts
+    stay bounded in memory and mergeable under chunked, incremental and parallel ingest.
+
+    segment_dims keeps further dimension columns (adset, platform, country, ...) in the
+    grouping keys, so the compact frame still feeds the rollup cube and the segment
+    anomaly scan; its size is then bounded by days x segments.
+
+    Each chunk (or merged state) is compacted on its own and buffered; the buffer is
+    folded into the running frame every `compact_every` parts, or when the frame is
+    read, instead of re-grouping the whole state once per chunk.
+    """
+
+    def __init__(self, date_col: str = "date", *, distinct: str = "exact", hll_precision: int = 12,
+                 compact_every: int = 16, segment_dims: Sequence[str] = ()) -> None:
+        if distinct not in ("exact", "hll"):
+            raise ValueError(f"distinct must be 'exact' or 'hll', got {distinct!r}")
+        self.date_col = date_col
+        self.distinct = distinct
+        self.hll_precision = int(hll_precision)
+        self.compact_every = max(1, int(compact_every))
+        self.segment_dims = [d for d in segment_dims if d != date_col]
+        self.sketches: Dict[str, HyperLogLog] = {}
+        self.rows = 0
+        self.columns: List[str] = []
+        self.missing_values: Dict[str, int] = {}
+        self.creative_ids: Set[Any] = set()
+        self.has_creative_id = False
+        self.frame: Optional[pd.DataFrame] = None
+        # compacted parts not yet folded into frame (see _fold_pending)
+        self._pending: List[pd.DataFrame] = []
+        # zero-row frame carrying the column dtypes of the first chunk (used for fingerprints)
+        self.sample: Optional[pd.DataFrame] = None
+
+    def _group_keys(self, columns: Any) -> List[str]:
+        keys = []
+        if self.date_col in columns:
+            keys.append(self.date_col)
+        campaign_col = _campaign_col(columns)
+        if campaign_col:
+            keys.append(campaign_col)
+        keys.extend(d for d in self.segment_dims if d in columns and d not in keys)
+        return keys
+
+    def _compact(self, df: pd.DataFrame) -> pd.DataFrame:
+        measures = [c for c in MEASURE_COLS if c in df.columns]
+        keys = self._group_keys(df.columns)
+        if not keys:
+            return df[measures].sum().to_frame().T
+        # dropna=False keeps NaT dates / NaN campaigns so global totals still include those rows
+        return df.groupby(keys, dropna=False, sort=False, observed=True)[measures].sum().reset_index()
+
+    def _add_part(self, part: pd.DataFrame) -> None:
+        self._pending.append(part)
+        if len(self._pending) >= self.compact_every:
+            self._fold_pending()
+
+    def _fold_pending(self) -> None:
+        """Fold the buffered parts into frame with one concat + groupby."""
+        if not self._pending:
+            return
+        parts = ([self.frame] if self.frame is not None else []) + self._pending
+        self._pending = []
+        self.frame = parts[0] if len(parts) == 1 else self._compact(pd.concat(parts, ignore_index=True))
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame, date_col: str = "date", **kwargs: Any) -> "PartialAggregates":
+        """Summary state of one frame (a chunk, partition, day or worker's share of the rows)."""
+        return cls(date_col=date_col, **kwargs).update(df)
+
+    def update(self, chunk: pd.DataFrame) -> "PartialAggregates":
+        """Fold one chunk of raw rows into the aggregate state. The chunk can be discarded afterwards."""
+        if self.sample is None:
+            self.sample = chunk.head(0)
+        for c in chunk.columns:
+            if c not in self.columns:
+                self.columns.append(c)
+
+        self.rows += len(chunk)
+        for col in MISSING_TRACKED_COLS:
+            if col in chunk.columns:
+                n = int(chunk[col].isna().sum())
+                if n > 0:
+                    self.missing_values[col] = self.missing_values.get(col, 0) + n
+
+        if "creative_id" in chunk.columns:
+            self.has_creative_id = True
+            if self.distinct == "exact":
+                self.creative_ids.update(chunk["creative_id"].dropna().unique().tolist())
+        if self.distinct == "hll":
+            for name, col in _distinct_columns(chunk.columns).items():
+                if name not in self.sketches:
+                    self.sketches[name] = HyperLogLog(self.hll_precision)
+                self.sketches[name].update(chunk[col])
+
+        self._add_part(self._compact(chunk))
+        return self
+
+    def merge(self, other: "PartialAggregates") -> "PartialAggregates":
+        """Combine another partial (e.g. from a different chunk or file) into this one."""
+        # check compatibility before touching any state, so a rejected merge leaves self unchanged
+        if other.distinct != self.distinct:
+            raise ValueError(f"Cannot merge '{self.distinct}' and '{other.distinct}' distinct counting states")
+        if other.segment_dims != self.segment_dims:
+            raise ValueError(f"Cannot merge states grouped by {self.segment_dims} and {other.segment_dims}")
+        for name, sketch in other.sketches.items():
+            if name in self.sketches and self.sketches[name].precision != sketch.precision:
+                raise ValueError(f"Cannot merge HyperLogLog sketches of precision "
+                                 f"{self.sketches[name].precision} and {sketch.precision} ({name})")
+
+        if self.sample is None:
+            self.sample = other.sample
+        for c in other.columns:
+            if c not in self.columns:
+                self.columns.append(c)
+        self.rows += other.rows
+        for col, n in other.missing_values.items():
+            self.missing_values[col] = self.missing_values.get(col, 0) + n
+        self.has_creative_id = self.has_creative_id or other.has_creative_id
+        self.creative_ids.update(other.creative_ids)
+        for name, sketch in other.sketches.items():
+            if name in self.sketches:
+                self.sketches[name].merge(sketch)
+            else:
+                self.sketches[name] = HyperLogLog.from_state(sketch.to_state())
+
+        other._fold_pending()
+        if other.frame is not None:
+            self._add_part(other.frame.copy())
+        return self
+
+    @property
+    def num_creatives(self) -> Optional[int]:
+        if not self.has_creative_id:
+            return None
+        if self.distinct == "hll":
+            return len(self.sketches["creative_id"]) if "creative_id" in self.sketches else 0
+        return len(self.creative_ids)
+
+    def distinct_counts(self) -> Dict[str, int]:
+        """Approximate distinct counts per sketched column (empty in exact mode)."""
+        return {name: len(sketch) for name, sketch in self.sketches.items()}
+
+    def to_state(self) -> Dict[str, Any]:
+        """JSON-serializable snapshot (used to persist running totals between runs)."""
+        self._fold_pending()
+        frame = None
+        if self.frame is not None:
+            f = self.frame.copy()
+            if self.date_col in f.columns:
+                f[self.date_col] = pd.to_datetime(f[self.date_col], errors="coerce").dt.strftime("%Y-%m-%d")
+            f = f.astype(object).where(f.notna(), None)
+            frame = {c: f[c].tolist() for c in f.columns}
+        sample = None
+        if self.sample is not None:
+            sample = {c: str(t) for c, t in self.sample.dtypes.items()}
+        return {
+            "date_col": self.date_col,
+            "distinct": self.distinct,
+            "hll_precision": self.hll_precision,
+            "segment_dims": list(self.segment_dims),
+            "sketches": {name: sketch.to_state() for name, sketch in self.sketches.items()},
+            "rows": self.rows,
+            "columns": list(self.columns),
+            "missing_values": dict(self.missing_values),
+            "has_creative_id": self.has_creative_id,
+            "creative_ids": sorted(self.creative_ids, key=str),
+            "frame": frame,
+            "sample_dtypes": sample,
+        }
+
+    @classmethod
+    def from_state(cls, state: Dict[str, Any]) -> "PartialAggregates":
+        out = cls(date_col=state.get("date_col", "date"), distinct=state.get("distinct", "exact"),
+                  hll_precision=state.get("hll_precision", 12), segment_dims=state.get("segment_dims") or ())
+        out.sketches = {name: HyperLogLog.from_state(s) for name, s in (state.get("sketches") or {}).items()}
+        out.rows = int(state.get("rows", 0))
+        out.columns = list(state.get("columns", []))
+        out.missing_values = {k: int(v) for k, v in (state.get("missing_values") or {}).items()}
+        out.has_creative_id = bool(state.get("has_creative_id", False))
+        out.creative_ids = set(state.get("creative_ids") or [])
+        frame = state.get("frame")
+        if frame is not None:
+            f = pd.DataFrame(frame)
+            if out.date_col in f.columns:
+                f[out.date_col] = pd.to_datetime(f[out.date_col], errors="coerce")
+            for m in MEASURE_COLS:
+                if m in f.columns:
+                    f[m] = pd.to_numeric(f[m], errors="coerce").fillna(0.0)
+            out.frame = f
+        if state.get("sample_dtypes") is not None:
+            out.sample = pd.DataFrame({c: pd.Series(dtype=t) for c, t in state["sample_dtypes"].items()})
+        return out
+
+    def finalize(self, daily: Optional[DailyAggregate] = None) -> Dict[str, Any]:
+        """
+        Render the summary dict produced by data_agent.summarize_df.
+
+        Ratios (ctr, roas) are derived here from the merged sums, and num_creatives from
+        the merged distinct set, so states built over disjoint rows can be merged first
+        and finalized once.
+        """
+        frame = self.to_frame()
+        out: Dict[str, Any] = {"global": {}, "by_campaign": [], "data_quality": {
+            "total_rows": self.rows,
+            "columns_present": list(self.columns),
+            "missing_values": dict(self.missing_values),
+        }}
+
+        totals = {m: float(frame[m].sum()) if m in frame.columns else 0.0 for m in MEASURE_COLS}
+        spend, revenue = totals["spend"], totals["revenue"]
+        out["global"]["total_spend"] = spend if np.isfinite(spend) else 0.0
+        out["global"]["total_revenue"] = revenue if np.isfinite(revenue) else 0.0
+        out["global"]["total_impressions"] = int(totals["impressions"]) if np.isfinite(totals["impressions"]) else 0
+        out["global"]["total_clicks"] = int(totals["clicks"]) if np.isfinite(totals["clicks"]) else 0
+        out["global"]["num_creatives"] = self.num_creatives
+        if self.sketches:
+            out["global"]["distinct_counts"] = self.distinct_counts()
+        try:
+            out["global"]["daily_roas"] = daily_roas_records(daily if daily is not None else self.to_daily())
+        except Exception:
+            out["global"]["daily_roas"] = []
+
+        campaign_col = _campaign_col(frame.columns)
+        if campaign_col:
+            try:
+                named = frame[frame[campaign_col].notna()]
+                out["by_campaign"] = campaign_records(named, campaign_col) if len(named) else []
+            except Exception:
+                out["by_campaign"] = []
+        return out
+
+    def to_daily(self) -> DailyAggregate:
+        return DailyAggregate.from_frame(self.to_frame(), date_col=self.date_col)
+
+    def to_frame(self) -> pd.DataFrame:
+        """Compact (day, campaign, segment_dims) frame; accepted anywhere a raw ads frame is used for sums."""
+        self._fold_pending()
+        if self.frame is None:
+            return pd.DataFrame(columns=self.columns)
+        return self.frame
@@ -0,0 +1,145 @@
+# File: src/utils/anomaly.py
+# Segment-wide latest-vs-baseline anomaly scan over the rollup cube.
+
+"""
+scan_segment_anomalies() scores every segment (e.g. campaign x adset x platform x country)
+in one vectorized pass:
+
+- the cube cells are regrouped to (segment, day) sums, sorted by segment then day
+- every segment is anchored on the same day, the latest day in the data: per segment
+  and metric (CTR, ROAS) the value on that day is compared with the mean and std of
+  the segment's valid days in the `window_days` before it (bincount over the sorted
+  cells, no per-segment loop). Segments with no valid row on the anchor day are
+  stale and are not scored, so an old dip cannot rank as a current anomaly.
+- the top-N most anomalous (segment, metric) pairs by z-score are picked with
+  heapq.nlargest, which is O(n log N) instead of sorting every segment
+"""
+from __future__ import annotations
+
+import heapq
+from typing import Any, Dict, List, Optional, Sequence
+import numpy as np
+import pandas as pd
+
+from src.utils.aggregates import MEASURE_COLS
+from src.utils.cube import RollupCube
+
+DEFAULT_ANOMALY_DIMS = ["campaign_name", "adset_name", "platform", "country"]
+_METRICS = {"ctr": ("clicks", "impressions"), "roas": ("revenue", "spend")}
+
+
+def _latest_vs_baseline(seg: np.ndarray, day: np.ndarray, value: np.ndarray, n_segments: int,
+                        window_days: int, anchor: int):
+    """
+    Value on the anchor day (NaN when the segment has none), baseline mean / std / day count per segment.
+
+    seg/day/value hold the valid cells of one metric, one per (segment, day).
+    """
+    latest = np.full(n_segments, np.nan)
+    on_anchor = day == anchor
+    latest[seg[on_anchor]] = value[on_anchor]
+
+    base = (day < anchor) & (day >= anchor - window_days)
+    b_seg, b_val = seg[base], value[base]
+    cnt = np.bincount(b_seg, minlength=n_segments).astype(np.float64)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        mean = np.bincount(b_seg, weights=b_val, minlength=n_segments) / cnt
+        dev = b_val - mean[b_seg]
+        std = np.sqrt(np.bincount(b_seg, weights=dev * dev, minlength=n_segments) / cnt)
+    return latest, mean, std, cnt.astype(np.int64)
+
+
+def scan_segment_anomalies(
+    data: Any,
+    dims: Optional[Sequence[str]] = None,
+    *,
+    date_col: str = "date",
+    window_days: int = 14,
+    min_days: int = 5,
+    top_n: int = 20,
+    direction: str = "drop",
+    min_z: float = 0.0,
+    min_impressions: float = 0.0,
+) -> List[Dict[str, Any]]:
+    """
+    Top-N segments whose latest CTR or ROAS deviates most from their own baseline.
+
+    Args:
+        data: RollupCube (preferred; no raw-frame pass) or raw frame
+        dims: Segment dimensions; those missing from the data are skipped
+            (default DEFAULT_ANOMALY_DIMS)
+        window_days: Baseline = valid days in the window_days before the latest day in the data
+        min_days: Minimum baseline days for a segment to be scored
+        direction: "drop" ranks by most negative z-score, "both" by |z|
+        min_z: Only report segments whose score (-z or |z|) is above this
+        min_impressions: Minimum impressions on the latest day (filters tiny segments)
+
+    Segments without a valid row on the latest day in the data are skipped.
+
+    Returns:
+        Records sorted by anomaly score, each with segment ({dim: value}), metric,
+        latest, baseline, std, delta_pct, z_score, baseline_days, latest_date, spend
+    """
+    if direction not in ("drop", "both"):
+        raise ValueError(f"direction must be 'drop' or 'both', got {direction!r}")
+    dims = list(dims) if dims is not None else list(DEFAULT_ANOMALY_DIMS)
+    cube = data if isinstance(data, RollupCube) else RollupCube.from_frame(data, dims=dims, date_col=date_col)
+    dims = [d for d in dims if d in cube.dims]
+    if not dims or cube.n_cells == 0:
+        return []
+
+    # regroup the cube cells to (segment, day), sorted by segment then day
+    block = pd.DataFrame({d: cube.codes[:, cube.dims.index(d)] for d in dims})
+    block["__day"] = cube.day
+    for j, m in enumerate(MEASURE_COLS):
+        block[m] = cube.values[:, j]
+    cells = block.groupby(dims + ["__day"], sort=True)[MEASURE_COLS].sum()
+    seg_codes = cells.index.droplevel("__day")
+    seg, segments = pd.factorize(seg_codes)
+    day = cells.index.get_level_values("__day").to_numpy(dtype=np.int64)
+    anchor = int(day.max())
+    n_segments = len(segments)
+    spend_total = np.bincount(seg, weights=cells["spend"].to_numpy(), minlength=n_segments)
+
+    candidates = []
+    per_metric: Dict[str, Any] = {}
+    for metric, (num_col, den_col) in _METRICS.items():
+        if num_col not in cube.present or den_col not in cube.present:
+            continue
+        num, den = cells[num_col].to_numpy(), cells[den_col].to_numpy()
+        valid = den > 0
+        if metric == "ctr" and min_impressions > 0:
+            valid &= den >= min_impressions
+        latest, mean, std, n_base = _latest_vs_baseline(
+            seg[valid], day[valid], num[valid] / den[valid], n_segments, window_days, anchor)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            z = (latest - mean) / std
+            delta = np.where(mean > 0, latest / mean - 1.0, np.nan)
+        scored = (n_base >= min_days) & (std > 0) & np.isfinite(z)
+        score = -z if direction == "drop" else np.abs(z)
+        scored &= score > max(min_z, 0.0)
+        per_metric[metric] = (latest, mean, std, n_base, z, delta)
+        idx = np.flatnonzero(scored)
+        candidates.append(zip(score[idx].tolist(), [metric] * len(idx), idx.tolist()))
+
+    top = heapq.nlargest(top_n, (c for group in candidates for c in group), key=lambda c: c[0])
+
+    labels = {d: np.append(np.asarray(cube.levels[d], dtype=object), None) for d in dims}
+    latest_date = str(cube.start + np.timedelta64(anchor, "D"))
+    out: List[Dict[str, Any]] = []
+    for score, metric, i in top:
+        latest, mean, std, n_base, z, delta = per_metric[metric]
+        codes = segments[i] if len(dims) > 1 else (segments[i],)
+        out.append({
+            "segment": {d: labels[d][int(c)] for d, c in zip(dims, codes)},
+            "metric": metric,
+            "latest": float(latest[i]),
+            "baseline": float(mean[i]),
+            "std": float(std[i]),
+            "delta_pct": float(delta[i]) if np.isfinite(delta[i]) else None,
+            "z_score": float(z[i]),
+            "baseline_days": int(n_base[i]),
+            "latest_date": latest_date,
+            "spend": float(spend_total[i]),
+        })
+    return out
@@ -0,0 +1,172 @@
+# File: src/utils/backfill.py
+# As-of-day baselines and thresholds over the full history (alert backfill / threshold audit).
+
+"""
+`backfill_thresholds` gives, for every day in the data, the CTR baseline / std / low-CTR
+threshold and the ROAS drop threshold that `compute_global_ctr_baseline` and
+`compute_roas_drop_threshold` would have returned if run with the data up to and including
+that day.
+
+Trailing windows come from prefix sums over the day axis, so each day's window mean and
+std cost O(1) (O(n) overall instead of O(n * window)). Values are shifted by their mean
+before squaring so the E[x^2] - E[x]^2 variance does not lose precision. Results match
+the single-day functions to floating-point rounding.
+"""
+from __future__ import annotations
+
+import heapq
+from typing import Any, Union
+import numpy as np
+import pandas as pd
+
+from src.utils.aggregates import DailyAggregate, as_daily_aggregate
+
+BACKFILL_COLUMNS = [
+    "baseline_ctr", "ctr_std", "ctr_low_threshold", "ctr_rows_used",
+    "baseline_roas", "median_drop", "drop_std", "roas_drop_threshold", "roas_rows_used",
+]
+
+
+def _prefix(x: np.ndarray) -> np.ndarray:
+    """Prefix sums with a leading zero: sum of x[a:b] is p[b] - p[a]."""
+    return np.concatenate([[0.0], np.cumsum(x, dtype=np.float64)])
+
+
+def _range_moments(x: np.ndarray, valid: np.ndarray, lo: np.ndarray, hi: np.ndarray):
+    """Count, mean and population std of x[valid] inside each half-open index range [lo, hi)."""
+    shift = float(x[valid].mean()) if valid.any() else 0.0
+    centred = np.where(valid, x - shift, 0.0)
+    c, s1, s2 = _prefix(valid), _prefix(centred), _prefix(centred * centred)
+    cnt = c[hi] - c[lo]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        m1 = (s1[hi] - s1[lo]) / cnt
+        var = np.maximum((s2[hi] - s2[lo]) / cnt - m1 * m1, 0.0)
+    std = np.where(cnt > 1, np.sqrt(var), 0.0)
+    return cnt, m1 + shift, std
+
+
+def _expanding_median(values: np.ndarray) -> np.ndarray:
+    """Median of values[:k + 1] for every k (two-heap running median, O(n log n))."""
+    low: list = []   # max-heap (negated) of the lower half
+    high: list = []  # min-heap of the upper half
+    out = np.empty(len(values), dtype=np.float64)
+    for i, v in enumerate(values.tolist()):
+        if low and v > -low[0]:
+            heapq.heappush(high, v)
+        else:
+            heapq.heappush(low, -v)
+        if len(low) > len(high) + 1:
+            heapq.heappush(high, -heapq.heappop(low))
+        elif len(high) > len(low):
+            heapq.heappush(low, -heapq.heappop(high))
+        out[i] = -low[0] if len(low) > len(high) else (-low[0] + high[0]) / 2.0
+    return out
+
+
+def _ctr_backfill(daily: DailyAggregate, window_days: int, min_days: int, z_score: float) -> dict:
+    n = daily.n_days
+    if not daily.has("impressions", "clicks"):
+        return {
+            "baseline_ctr": np.zeros(n), "ctr_std": np.zeros(n),
+            "ctr_low_threshold": np.full(n, 0.01), "ctr_rows_used": np.zeros(n, dtype=np.int64),
+        }
+
+    impressions = daily.column("impressions")
+    clicks = daily.column("clicks")
+    with np.errstate(divide="ignore", invalid="ignore"):
+        ctr = clicks / np.where(impressions == 0, np.nan, impressions)
+    valid = ~np.isnan(ctr)
+    idx = np.arange(n)
+    rows_used = np.cumsum(valid)
+    # the single-day window ends at the last valid day, not at the as-of day itself
+    last = np.maximum.accumulate(np.where(valid, idx, -1))
+    hi = last + 1
+    lo = np.where(rows_used > window_days, np.maximum(last - window_days + 1, 0), 0)
+    _, mean, std = _range_moments(np.where(valid, ctr, 0.0), valid, lo, hi)
+    threshold = np.maximum(mean - z_score * std, np.maximum(1e-6, mean * 0.3))
+
+    # fewer than min_days valid days: aggregate CTR so far, half of it as the threshold
+    cum_impr = np.cumsum(impressions)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        agg = np.where(cum_impr > 0, np.cumsum(clicks) / np.where(cum_impr > 0, cum_impr, 1.0), 0.0)
+    short = rows_used < min_days
+    return {
+        "baseline_ctr": np.where(short, agg, mean),
+        "ctr_std": np.where(short, 0.0, std),
+        "ctr_low_threshold": np.where(short, np.maximum(1e-6, agg * 0.5), threshold),
+        "ctr_rows_used": rows_used.astype(np.int64),
+    }
+
+
+def _roas_backfill(daily: DailyAggregate, window_days: int, min_days: int, z_score: float,
+                   min_threshold: float) -> dict:
+    n = daily.n_days
+    zeros = np.zeros(n)
+    if not daily.has("revenue", "spend"):
+        return {
+            "baseline_roas": zeros.copy(), "median_drop": zeros, "drop_std": zeros.copy(),
+            "roas_drop_threshold": np.full(n, min_threshold), "roas_rows_used": np.zeros(n, dtype=np.int64),
+        }
+
+    spend = daily.column("spend")
+    with np.errstate(divide="ignore", invalid="ignore"):
+        roas = daily.column("revenue") / np.where(spend == 0, np.nan, spend)
+    valid = ~np.isnan(roas)
+    rows_used = np.cumsum(valid)
+
+    # trailing-window mean ROAS, same window rule as the CTR baseline
+    idx = np.arange(n)
+    last = np.maximum.accumulate(np.where(valid, idx, -1))
+    lo = np.where(rows_used > window_days, np.maximum(last - window_days + 1, 0), 0)
+    _, baseline, _ = _range_moments(np.where(valid, roas, 0.0), valid, lo, last + 1)
+
+    # day-over-day drops between consecutive valid days, dated by the later day
+    series, days = roas[valid], np.flatnonzero(valid)
+    prev = series[:-1]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        drops = (prev - series[1:]) / np.where(prev == 0, np.nan, prev)
+    keep = ~np.isnan(drops) & (drops > 0)
+    drops, drop_days = drops[keep], days[1:][keep]
+
+    # drops known as of each day: the first k of them
+    k = np.searchsorted(drop_days, np.arange(n), side="right")
+    ones = np.ones(len(drops), dtype=bool)
+    _, _, std = _range_moments(drops, ones, np.zeros(n, dtype=np.int64), k)
+    median = np.concatenate([[0.0], _expanding_median(drops)])[k]
+
+    active = (rows_used >= min_days) & (k > 0)
+    median = np.where(active, median, 0.0)
+    std = np.where(active, std, 0.0)
+    return {
+        "baseline_roas": np.where(rows_used > 0, baseline, 0.0),
+        "median_drop": median,
+        "drop_std": std,
+        "roas_drop_threshold": np.where(active, np.maximum(median + z_score * std, min_threshold), min_threshold),
+        "roas_rows_used": rows_used.astype(np.int64),
+    }
+
+
+def backfill_thresholds(
+    df: Union[pd.DataFrame, DailyAggregate],
+    *,
+    window_days: int = 30,
+    min_days: int = 7,
+    ctr_z: float = 1.5,
+    roas_z: float = 1.0,
+    min_threshold: float = 0.08,
+) -> pd.DataFrame:
+    """
+    Day-indexed table of as-of-day baselines and thresholds (columns BACKFILL_COLUMNS).
+
+    Row d is what compute_dynamic_thresholds would report on the data through day d;
+    baseline_roas is the trailing-window mean daily ROAS (window rule of the CTR baseline).
+    Accepts a raw frame or a prebuilt DailyAggregate; gap days carry the previous values.
+    """
+    daily = as_daily_aggregate(df)
+    index = pd.DatetimeIndex(daily.dates.astype("datetime64[ns]"), name="date")
+    if daily.n_days == 0:
+        return pd.DataFrame(columns=BACKFILL_COLUMNS, index=index)
+    cols: dict[str, Any] = {}
+    cols.update(_ctr_backfill(daily, window_days, min_days, ctr_z))
+    cols.update(_roas_backfill(daily, window_days, min_days, roas_z, min_threshold))
+    return pd.DataFrame(cols, index=index)[BACKFILL_COLUMNS]
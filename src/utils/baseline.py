@@ -2,22 +2,18 @@
 # Compute baseline statistics (CTR, ROAS) and produce evidence merges.
 
 from __future__ import annotations
-from typing import Any, Dict
+import json
+import os
+from typing import Any, Dict, List, Optional, Union
 import pandas as pd
 import numpy as np
 
-
-def _safe_date_index(df: pd.DataFrame, date_col: str = "date") -> pd.DataFrame:
-    if date_col in df.columns:
-        df = df.copy()
-        df[date_col] = pd.to_datetime(df[date_col], errors="coerce")
-        df = df.dropna(subset=[date_col])
-        df = df.sort_values(date_col)
-    return df
+from src.utils.aggregates import DailyAggregate, as_daily_aggregate
+from src.utils.sketches import TDigest
 
 
 def compute_global_baselines(
-    df: pd.DataFrame,
+    df: Union[pd.DataFrame, DailyAggregate],
     date_col: str = "date",
     impressions_col: str = "impressions",
     clicks_col: str = "clicks",
@@ -28,61 +24,51 @@ def compute_global_baselines(
     """
     Compute baseline statistics for CTR and ROAS over a historical window.
 
+    Accepts a raw frame or a prebuilt DailyAggregate.
     Returns a dict with baselines and percentiles and rows_used.
     """
-    df = _safe_date_index(df)
-    if date_col not in df.columns:
-        return {
-            "ctr_baseline": 0.0,
-            "ctr_pctile_10": 0.0,
-            "ctr_pctile_90": 0.0,
-            "roas_baseline": 0.0,
-            "roas_pctile_10": 0.0,
-            "roas_pctile_90": 0.0,
-            "rows_used": 0,
-        }
-
-    daily = (
-        df.groupby(pd.Grouper(key=date_col, freq="D"))
-        .agg({impressions_col: "sum", clicks_col: "sum", revenue_col: "sum", spend_col: "sum"})
-        .reset_index()
-    )
+    empty = {
+        "ctr_baseline": 0.0,
+        "ctr_pctile_10": 0.0,
+        "ctr_pctile_90": 0.0,
+        "roas_baseline": 0.0,
+        "roas_pctile_10": 0.0,
+        "roas_pctile_90": 0.0,
+        "rows_used": 0,
+    }
+    daily = as_daily_aggregate(df, date_col, {
+        "impressions": impressions_col, "clicks": clicks_col, "revenue": revenue_col, "spend": spend_col,
+    })
+    if not daily.has("impressions", "clicks", "revenue", "spend"):
+        return empty
 
-    daily["ctr"] = daily[clicks_col] / daily[impressions_col].replace(0, np.nan)
-    daily["roas"] = daily[revenue_col] / daily[spend_col].replace(0, np.nan)
-    daily = daily.dropna(subset=["ctr", "roas"])
-    rows_used = len(daily)
+    impressions = daily.column("impressions")
+    spend = daily.column("spend")
+    with np.errstate(divide="ignore", invalid="ignore"):
+        ctr = daily.column("clicks") / np.where(impressions == 0, np.nan, impressions)
+        roas = daily.column("revenue") / np.where(spend == 0, np.nan, spend)
+    valid = ~np.isnan(ctr) & ~np.isnan(roas)
+    ctr, roas = ctr[valid], roas[valid]
+    days = np.arange(daily.n_days)[valid]
+    rows_used = len(days)
 
     if rows_used == 0:
-        return {
-            "ctr_baseline": 0.0,
-            "ctr_pctile_10": 0.0,
-            "ctr_pctile_90": 0.0,
-            "roas_baseline": 0.0,
-            "roas_pctile_10": 0.0,
-            "roas_pctile_90": 0.0,
-            "rows_used": 0,
-        }
-
-    if rows_used > window_days and "date" in daily.columns:
-        last_cut = daily["date"].max() - pd.Timedelta(days=window_days)
-        window = daily[daily["date"] > last_cut]
-    else:
-        window = daily
+        return empty
 
-    ctr_vals = window["ctr"].astype(float).dropna()
-    roas_vals = window["roas"].astype(float).dropna()
+    if rows_used > window_days:
+        in_window = days > days.max() - window_days
+        ctr, roas = ctr[in_window], roas[in_window]
 
-    def _safe_stats(arr: pd.Series):
-        if arr.empty:
+    def _safe_stats(arr: np.ndarray):
+        if len(arr) == 0:
             return 0.0, 0.0, 0.0
         baseline = float(arr.mean())
         p10 = float(np.percentile(arr, 10))
         p90 = float(np.percentile(arr, 90))
         return baseline, p10, p90
 
-    ctr_baseline, ctr_p10, ctr_p90 = _safe_stats(ctr_vals)
-    roas_baseline, roas_p10, roas_p90 = _safe_stats(roas_vals)
+    ctr_baseline, ctr_p10, ctr_p90 = _safe_stats(ctr)
+    roas_baseline, roas_p10, roas_p90 = _safe_stats(roas)
 
     return {
         "ctr_baseline": ctr_baseline,
@@ -95,6 +81,314 @@ def compute_global_baselines(
     }
 
 
+class BaselineSketches:
+    """
+    Persistent t-digests of daily CTR and ROAS, globally and per segment (e.g. campaign).
+
+    update() adds each closed day once: days up to the day before the latest one seen
+    (the latest may still be partially ingested) and after `through`, the last day
+    already added. The state round-trips through JSON, so percentile baselines cover
+    the full history without keeping every daily value.
+    """
+
+    def __init__(self, compression: int = 100) -> None:
+        self.compression = int(compression)
+        self.through: Optional[np.datetime64] = None
+        self.digests: Dict[str, TDigest] = {}
+
+    @staticmethod
+    def _key(metric: str, segment: Optional[str] = None) -> str:
+        return metric if segment is None else f"{metric}|{segment}"
+
+    def _add(self, key: str, values: np.ndarray) -> None:
+        if key not in self.digests:
+            self.digests[key] = TDigest(self.compression)
+        self.digests[key].update(values)
+
+    def update(
+        self,
+        daily: DailyAggregate,
+        segments: Optional[pd.DataFrame] = None,
+        segment_col: Optional[str] = None,
+        date_col: str = "date",
+        include_last_day: bool = False,
+    ) -> "BaselineSketches":
+        """Add the closed days of `daily` (and of `segments` grouped by segment_col) not yet added."""
+        if daily.n_days == 0 or not daily.has("impressions", "clicks", "revenue", "spend"):
+            return self
+        dates = daily.dates
+        cutoff = dates[-1] if include_last_day else dates[-1] - np.timedelta64(1, "D")
+        new = dates <= cutoff
+        if self.through is not None:
+            new &= dates > self.through
+        if not new.any():
+            return self
+
+        ctr, roas = _daily_ratios(daily.column("clicks")[new], daily.column("impressions")[new],
+                                  daily.column("revenue")[new], daily.column("spend")[new])
+        self._add(self._key("ctr"), ctr)
+        self._add(self._key("roas"), roas)
+
+        sums = _segment_day_sums(segments, segment_col, date_col, cutoff, self.through)
+        if sums is not None:
+            ctr, roas = _daily_ratios(sums["clicks"].to_numpy(), sums["impressions"].to_numpy(),
+                                      sums["revenue"].to_numpy(), sums["spend"].to_numpy())
+            valid = _valid_days(sums["impressions"].to_numpy(), sums["spend"].to_numpy())
+            labels = sums.index.get_level_values(0).astype(str).to_numpy()[valid]
+            # one stable sort, then each segment's days are a contiguous slice
+            names, inverse = np.unique(labels, return_inverse=True)
+            order = np.argsort(inverse, kind="stable")
+            bounds = np.cumsum(np.bincount(inverse, minlength=len(names)))[:-1]
+            for name, ctr_seg, roas_seg in zip(names, np.split(ctr[order], bounds), np.split(roas[order], bounds)):
+                self._add(self._key("ctr", name), ctr_seg)
+                self._add(self._key("roas", name), roas_seg)
+
+        self.through = cutoff
+        return self
+
+    def quantile(self, metric: str, q: Any, segment: Optional[str] = None) -> Any:
+        digest = self.digests.get(self._key(metric, segment))
+        return float("nan") if digest is None else digest.quantile(q)
+
+    def baselines(self, segment: Optional[str] = None) -> Dict[str, Any]:
+        """Same keys as compute_global_baselines, over every day added so far."""
+        out: Dict[str, Any] = {"rows_used": 0}
+        for metric in ("ctr", "roas"):
+            digest = self.digests.get(self._key(metric, segment))
+            if digest is None or digest.count == 0:
+                out.update({f"{metric}_baseline": 0.0, f"{metric}_pctile_10": 0.0, f"{metric}_pctile_90": 0.0})
+                continue
+            p10, p90 = digest.quantile([0.10, 0.90])
+            out.update({f"{metric}_baseline": digest.mean(), f"{metric}_pctile_10": float(p10),
+                        f"{metric}_pctile_90": float(p90)})
+            out["rows_used"] = int(digest.count)
+        return out
+
+    def to_state(self) -> Dict[str, Any]:
+        return {
+            "compression": self.compression,
+            "through": None if self.through is None else str(self.through),
+            "digests": {k: d.to_state() for k, d in self.digests.items()},
+        }
+
+    @classmethod
+    def from_state(cls, state: Dict[str, Any]) -> "BaselineSketches":
+        out = cls(compression=state.get("compression", 100))
+        if state.get("through"):
+            out.through = np.datetime64(state["through"], "D")
+        out.digests = {k: TDigest.from_state(d) for k, d in (state.get("digests") or {}).items()}
+        return out
+
+    @classmethod
+    def load(cls, path: str, compression: int = 100) -> "BaselineSketches":
+        """Read persisted sketches; a missing or unreadable file starts a fresh state."""
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return cls.from_state(json.load(f))
+        except Exception:
+            return cls(compression=compression)
+
+    def save(self, path: str) -> str:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.to_state(), f)
+        return path
+
+
+class EwmaBaselines:
+    """
+    Online (exponentially weighted) mean and variance of daily CTR and ROAS, globally
+    and per segment, persisted between runs.
+
+    Like BaselineSketches, update() folds in each closed day once, so a run costs
+    O(new days x segments) instead of re-reading the baseline window. The loop runs
+    over new days in date order and is vectorized over segments. The weight of a day
+    halves every `halflife_days` observed days; the variance uses the incremental
+    exponentially weighted form (West, 1979).
+    """
+
+    METRICS = ("ctr", "roas")
+
+    def __init__(self, halflife_days: float = 7.0) -> None:
+        self.halflife_days = float(halflife_days)
+        self.through: Optional[np.datetime64] = None
+        self.labels: List[Optional[str]] = [None]  # row 0 is the global series
+        self._index: Dict[Optional[str], int] = {None: 0}
+        self.mean = np.zeros((1, 2))
+        self.var = np.zeros((1, 2))
+        self.count = np.zeros((1, 2), dtype=np.int64)
+
+    @property
+    def alpha(self) -> float:
+        return 1.0 - 0.5 ** (1.0 / max(self.halflife_days, 1e-9))
+
+    def _rows(self, names: np.ndarray) -> np.ndarray:
+        """Row index per segment label, adding new segments with empty state."""
+        new = [n for n in dict.fromkeys(names.tolist()) if n not in self._index]
+        if new:
+            for n in new:
+                self._index[n] = len(self.labels)
+                self.labels.append(n)
+            pad = np.zeros((len(new), 2))
+            self.mean = np.vstack([self.mean, pad])
+            self.var = np.vstack([self.var, pad])
+            self.count = np.vstack([self.count, pad.astype(np.int64)])
+        return np.fromiter((self._index[n] for n in names.tolist()), dtype=np.int64, count=len(names))
+
+    def _observe(self, rows: np.ndarray, values: np.ndarray) -> None:
+        """One EWMA step for each (row, [ctr, roas]); rows must be distinct."""
+        first = self.count[rows] == 0
+        mean, var = self.mean[rows], self.var[rows]
+        diff = values - mean
+        incr = self.alpha * diff
+        self.mean[rows] = np.where(first, values, mean + incr)
+        self.var[rows] = np.where(first, 0.0, (1.0 - self.alpha) * (var + diff * incr))
+        self.count[rows] += 1
+
+    def update(
+        self,
+        daily: DailyAggregate,
+        segments: Optional[pd.DataFrame] = None,
+        segment_col: Optional[str] = None,
+        date_col: str = "date",
+        include_last_day: bool = False,
+    ) -> "EwmaBaselines":
+        """Fold in the closed days of `daily` (and of `segments` by segment_col) not yet seen."""
+        if daily.n_days == 0 or not daily.has("impressions", "clicks", "revenue", "spend"):
+            return self
+        dates = daily.dates
+        cutoff = dates[-1] if include_last_day else dates[-1] - np.timedelta64(1, "D")
+        new = dates <= cutoff
+        if self.through is not None:
+            new &= dates > self.through
+        if not new.any():
+            return self
+
+        valid = new & _valid_days(daily.column("impressions"), daily.column("spend"))
+        ctr, roas = _daily_ratios(daily.column("clicks")[valid], daily.column("impressions")[valid],
+                                  daily.column("revenue")[valid], daily.column("spend")[valid])
+        days = [dates[valid]]
+        rows = [np.zeros(len(ctr), dtype=np.int64)]
+        values = [np.column_stack([ctr, roas])]
+
+        sums = _segment_day_sums(segments, segment_col, date_col, cutoff, self.through)
+        if sums is not None:
+            ok = _valid_days(sums["impressions"].to_numpy(), sums["spend"].to_numpy())
+            s_ctr, s_roas = _daily_ratios(sums["clicks"].to_numpy(), sums["impressions"].to_numpy(),
+                                          sums["revenue"].to_numpy(), sums["spend"].to_numpy())
+            days.append(sums.index.get_level_values(1).to_numpy(dtype="datetime64[D]")[ok])
+            rows.append(self._rows(sums.index.get_level_values(0).astype(str).to_numpy()[ok]))
+            values.append(np.column_stack([s_ctr, s_roas]))
+
+        day, row, value = np.concatenate(days), np.concatenate(rows), np.concatenate(values)
+        order = np.argsort(day, kind="stable")
+        day, row, value = day[order], row[order], value[order]
+        bounds = np.flatnonzero(np.append(np.append(True, day[1:] != day[:-1]), True))
+        for lo, hi in zip(bounds[:-1], bounds[1:]):
+            self._observe(row[lo:hi], value[lo:hi])
+
+        self.through = cutoff
+        return self
+
+    def baselines(self, segment: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Same keys as compute_global_baselines (percentiles from a normal approximation
+        around the EWMA mean), plus ctr_std / roas_std.
+        """
+        i = self._index.get(segment)
+        out: Dict[str, Any] = {"rows_used": 0 if i is None else int(self.count[i].max())}
+        for j, metric in enumerate(self.METRICS):
+            if i is None or self.count[i, j] == 0:
+                out.update({f"{metric}_baseline": 0.0, f"{metric}_std": 0.0,
+                            f"{metric}_pctile_10": 0.0, f"{metric}_pctile_90": 0.0})
+                continue
+            mean, std = float(self.mean[i, j]), float(np.sqrt(max(self.var[i, j], 0.0)))
+            out.update({f"{metric}_baseline": mean, f"{metric}_std": std,
+                        f"{metric}_pctile_10": mean - 1.2816 * std, f"{metric}_pctile_90": mean + 1.2816 * std})
+        return out
+
+    def to_state(self) -> Dict[str, Any]:
+        return {
+            "kind": "ewma",
+            "halflife_days": self.halflife_days,
+            "through": None if self.through is None else str(self.through),
+            "labels": self.labels,
+            "mean": self.mean.tolist(),
+            "var": self.var.tolist(),
+            "count": self.count.tolist(),
+        }
+
+    @classmethod
+    def from_state(cls, state: Dict[str, Any]) -> "EwmaBaselines":
+        out = cls(halflife_days=state.get("halflife_days", 7.0))
+        if state.get("through"):
+            out.through = np.datetime64(state["through"], "D")
+        out.labels = list(state.get("labels") or [None])
+        out._index = {n: i for i, n in enumerate(out.labels)}
+        out.mean = np.asarray(state.get("mean") or [[0.0, 0.0]], dtype=np.float64).reshape(-1, 2)
+        out.var = np.asarray(state.get("var") or [[0.0, 0.0]], dtype=np.float64).reshape(-1, 2)
+        out.count = np.asarray(state.get("count") or [[0, 0]], dtype=np.int64).reshape(-1, 2)
+        if not (len(out.labels) == len(out.mean) == len(out.var) == len(out.count)):
+            raise ValueError("EWMA baseline state is inconsistent")
+        return out
+
+    @classmethod
+    def load(cls, path: str, halflife_days: float = 7.0) -> "EwmaBaselines":
+        """Read persisted state; a missing, unreadable or differently configured file starts fresh."""
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                out = cls.from_state(json.load(f))
+            if out.halflife_days == float(halflife_days):
+                return out
+        except Exception:
+            pass
+        return cls(halflife_days=halflife_days)
+
+    def save(self, path: str) -> str:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp = f"{path}.tmp-{os.getpid()}"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.to_state(), f)
+        os.replace(tmp, path)
+        return path
+
+
+def _segment_day_sums(
+    segments: Optional[pd.DataFrame],
+    segment_col: Optional[str],
+    date_col: str,
+    cutoff: np.datetime64,
+    through: Optional[np.datetime64],
+) -> Optional[pd.DataFrame]:
+    """(segment, day) sums of the measures for days in (through, cutoff]; None if nothing to add."""
+    needed = [segment_col, date_col, "clicks", "impressions", "revenue", "spend"]
+    if segments is None or not all(c in segments.columns for c in needed):
+        return None
+    day = pd.to_datetime(segments[date_col], errors="coerce").to_numpy(dtype="datetime64[ns]")
+    day = day.astype("datetime64[D]")
+    rows = ~np.isnat(day) & (day <= cutoff) & segments[segment_col].notna().to_numpy()
+    if through is not None:
+        rows &= day > through
+    if not rows.any():
+        return None
+    seg = segments.loc[rows, [segment_col, "clicks", "impressions", "revenue", "spend"]]
+    seg = seg.assign(__day=day[rows])
+    return seg.groupby([segment_col, "__day"], observed=True, sort=False).sum()
+
+
+def _valid_days(impressions: np.ndarray, spend: np.ndarray) -> np.ndarray:
+    return (impressions != 0) & (spend != 0)
+
+
+def _daily_ratios(clicks: np.ndarray, impressions: np.ndarray, revenue: np.ndarray, spend: np.ndarray):
+    """CTR and ROAS for days with both defined (same rule as compute_global_baselines)."""
+    valid = _valid_days(impressions, spend)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        ctr = clicks[valid] / impressions[valid]
+        roas = revenue[valid] / spend[valid]
+    return ctr, roas
+
+
 def evidence_from_summary_and_baseline(summary: Dict[str, Any], baseline: Dict[str, Any]) -> Dict[str, Any]:
     """
     Merge summary + baseline into a compact evidence object.
@@ -0,0 +1,187 @@
+# File: src/utils/cube.py
+# Precomputed rollup cube over the ad dimensions x day, with a drill-down API.
+
+"""
+RollupCube.from_frame() runs one grouped pass over the raw frame and keeps only the
+non-empty (dimension values..., day) cells:
+
+    codes   int32  (n_cells, n_dims)   category code per dimension (-1 = missing)
+    day     int32  (n_cells,)          days since `start`
+    values  float64 (n_cells, 4)       sums of MEASURE_COLS
+    levels  {dim: labels}              code -> label per dimension
+
+drill() answers any slice (group by a subset of dimensions, optional filters, date
+range, optional per-day breakdown) from those arrays without touching the raw frame.
+"""
+from __future__ import annotations
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+import numpy as np
+import pandas as pd
+
+from src.utils.aggregates import MEASURE_COLS
+from src.utils.schema import EXPECTED_SCHEMA
+
+
+class RollupCube:
+    def __init__(
+        self,
+        dims: Sequence[str],
+        levels: Dict[str, np.ndarray],
+        codes: np.ndarray,
+        day: np.ndarray,
+        values: np.ndarray,
+        start: Optional[np.datetime64],
+        present: Sequence[str] = (),
+    ) -> None:
+        self.dims = list(dims)
+        self.levels = levels
+        self.day = np.asarray(day, dtype=np.int32)
+        self.codes = np.asarray(codes, dtype=np.int32).reshape(len(self.day), len(self.dims))
+        self.values = np.asarray(values, dtype="float64").reshape(-1, len(MEASURE_COLS))
+        self.start = None if start is None else np.datetime64(start, "D")
+        self.present = tuple(m for m in MEASURE_COLS if m in present)
+
+    @classmethod
+    def from_frame(
+        cls,
+        df: pd.DataFrame,
+        dims: Optional[Sequence[str]] = None,
+        date_col: str = "date",
+    ) -> "RollupCube":
+        """
+        Build the cube in one grouped pass. `dims` defaults to every schema dimension
+        column present in the frame; rows with an unparseable date are dropped.
+        """
+        if dims is None:
+            dims = EXPECTED_SCHEMA["dimension_columns"]
+        dims = [d for d in dims if d in df.columns]
+        present = [m for m in MEASURE_COLS if m in df.columns]
+
+        if date_col not in df.columns or len(df) == 0:
+            return cls(dims, {d: np.array([], dtype=object) for d in dims},
+                       np.zeros((0, len(dims))), np.zeros(0), np.zeros((0, len(MEASURE_COLS))), None, present)
+
+        dates = df[date_col]
+        if not pd.api.types.is_datetime64_any_dtype(dates):
+            dates = pd.to_datetime(dates, errors="coerce")
+        days = dates.to_numpy(dtype="datetime64[ns]").astype("datetime64[D]")
+        valid = ~np.isnat(days)
+        if not valid.any():
+            return cls(dims, {d: np.array([], dtype=object) for d in dims},
+                       np.zeros((0, len(dims))), np.zeros(0), np.zeros((0, len(MEASURE_COLS))), None, present)
+        start = days[valid].min()
+
+        keys: Dict[str, np.ndarray] = {}
+        levels: Dict[str, np.ndarray] = {}
+        for d in dims:
+            codes, uniques = pd.factorize(df[d].to_numpy()[valid], sort=True)
+            keys[d] = codes.astype(np.int32)
+            levels[d] = np.asarray(uniques, dtype=object)
+        keys["__day"] = (days[valid] - start).astype(np.int64).astype(np.int32)
+
+        block = pd.DataFrame(keys)
+        for m in present:
+            block[m] = df[m].to_numpy(dtype="float64", na_value=np.nan)[valid]
+        cells = block.groupby(dims + ["__day"], sort=True)[present].sum().reset_index()
+
+        values = np.zeros((len(cells), len(MEASURE_COLS)))
+        for m in present:
+            values[:, MEASURE_COLS.index(m)] = cells[m].to_numpy()
+        codes = cells[dims].to_numpy(dtype=np.int32) if dims else np.zeros((len(cells), 0), dtype=np.int32)
+        return cls(dims, levels, codes, cells["__day"].to_numpy(), values, start, present)
+
+    @property
+    def n_cells(self) -> int:
+        return int(self.values.shape[0])
+
+    @property
+    def nbytes(self) -> int:
+        return int(self.codes.nbytes + self.day.nbytes + self.values.nbytes)
+
+    def _day_bounds(self, date_range: Optional[Tuple[Any, Any]]) -> Tuple[Optional[int], Optional[int]]:
+        if not date_range or self.start is None:
+            return None, None
+
+        def to_day(v: Any) -> Optional[int]:
+            if v is None:
+                return None
+            return int((np.datetime64(pd.Timestamp(v).date(), "D") - self.start).astype(np.int64))
+
+        lo, hi = date_range
+        return to_day(lo), to_day(hi)
+
+    def _mask(self, filters: Optional[Dict[str, Any]], date_range: Optional[Tuple[Any, Any]]) -> np.ndarray:
+        mask = np.ones(self.n_cells, dtype=bool)
+        for dim, wanted in (filters or {}).items():
+            if dim not in self.dims:
+                raise KeyError(f"Unknown cube dimension: {dim}")
+            if isinstance(wanted, (str, bytes)) or not isinstance(wanted, (list, tuple, set, np.ndarray)):
+                wanted = [wanted]
+            labels = self.levels[dim]
+            wanted_codes = np.flatnonzero(pd.Index(labels).isin(list(wanted)))
+            mask &= np.isin(self.codes[:, self.dims.index(dim)], wanted_codes)
+        lo, hi = self._day_bounds(date_range)
+        if lo is not None:
+            mask &= self.day >= lo
+        if hi is not None:
+            mask &= self.day <= hi
+        return mask
+
+    def drill(
+        self,
+        dims: Sequence[str] = (),
+        filters: Optional[Dict[str, Any]] = None,
+        date_range: Optional[Tuple[Any, Any]] = None,
+        *,
+        by_date: bool = False,
+    ) -> pd.DataFrame:
+        """
+        Sums, CTR and ROAS grouped by `dims` (and by day if by_date) over the cells
+        matching `filters` ({dim: value or list of values}) and the inclusive date_range.
+
+        Returns one row per group, sorted by spend descending (by date when by_date).
+        """
+        dims = list(dims)
+        for d in dims:
+            if d not in self.dims:
+                raise KeyError(f"Unknown cube dimension: {d}")
+        mask = self._mask(filters, date_range)
+
+        data: Dict[str, Any] = {}
+        for d in dims:
+            data[d] = self.codes[mask, self.dims.index(d)]
+        if by_date:
+            data["date"] = self.day[mask]
+        for j, m in enumerate(MEASURE_COLS):
+            data[m] = self.values[mask, j]
+        cells = pd.DataFrame(data)
+        group_cols = dims + (["date"] if by_date else [])
+        if group_cols:
+            out = cells.groupby(group_cols, sort=True)[MEASURE_COLS].sum().reset_index()
+        else:
+            out = cells[MEASURE_COLS].sum().to_frame().T
+
+        for d in dims:
+            labels = np.append(self.levels[d], None)
+            out[d] = labels[out[d].to_numpy()]  # code -1 (missing) maps to the trailing None
+        if by_date and self.start is not None:
+            out["date"] = pd.to_datetime(self.start + out["date"].to_numpy().astype("timedelta64[D]"))
+
+        spend = out["spend"].to_numpy()
+        impressions = out["impressions"].to_numpy()
+        with np.errstate(divide="ignore", invalid="ignore"):
+            out["ctr"] = np.where(impressions > 0, out["clicks"].to_numpy() / impressions, 0.0)
+            out["roas"] = np.where(spend > 0, out["revenue"].to_numpy() / spend, 0.0)
+
+        if by_date:
+            out = out.sort_values(["date"] + dims, kind="stable")
+        else:
+            out = out.sort_values("spend", ascending=False, kind="stable")
+        return out.reset_index(drop=True)
+
+    def to_records(self, *args: Any, **kwargs: Any) -> List[Dict[str, Any]]:
+        """drill() rendered as JSON-friendly records (dates as YYYY-MM-DD)."""
+        out = self.drill(*args, **kwargs)
+        if "date" in out.columns:
+            out["date"] = out["date"].dt.strftime("%Y-%m-%d")
+        return out.astype(object).where(out.notna(), None).to_dict("records")
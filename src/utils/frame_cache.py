@@ -0,0 +1,293 @@
+# File: src/utils/frame_cache.py
+# Persistent columnar cache of parsed CSV frames keyed by source file fingerprint.
+
+"""
+Each cached frame lives in its own directory under `cache_dir`:
+
+    <cache_dir>/<key>/manifest.json   column names, dtypes, source fingerprint, last access
+    <cache_dir>/<key>/<i>.npy         one NumPy array per column
+    <cache_dir>/<key>/<i>.cat.npy     categories for string / categorical columns
+
+The key hashes the source path, size and content hash plus the reader options, so
+any change to the file (or to how it is parsed) produces a miss and stale entries
+age out through LRU eviction once the cache exceeds `max_bytes`. The per-partition
+aggregate states under `<cache_dir>/partitions/` (src/utils/partitions.py) count
+against the same cap. Everything is loaded with allow_pickle=False.
+
+Hashing a large file on every lookup would cost a full read, so `<cache_dir>/fingerprints.json`
+records each file's (size, mtime_ns, inode, head/tail sample hash) next to its content
+hash; while those match, the recorded content hash is reused and the file is only
+hashed in full when they change.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import shutil
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+_MANIFEST = "manifest.json"
+_FINGERPRINTS = "fingerprints.json"
+PARTITION_SUBDIR = "partitions"  # per-partition aggregate states (src/utils/partitions.py)
+_HASH_BLOCK = 1 << 20
+_SAMPLE_BYTES = 64 * 1024
+# fingerprint fields that make up the cache key (stat fields only decide whether to re-hash)
+_KEY_FIELDS = ("path", "size", "content_hash")
+
+
+def _content_hash(path: str) -> str:
+    h = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as fh:
+        for block in iter(lambda: fh.read(_HASH_BLOCK), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def _quick_identity(path: str) -> Dict[str, Any]:
+    """(size, mtime_ns, inode) plus a hash of the first and last _SAMPLE_BYTES; no full read."""
+    st = os.stat(path)
+    h = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as fh:
+        h.update(fh.read(_SAMPLE_BYTES))
+        if st.st_size > _SAMPLE_BYTES:
+            fh.seek(max(_SAMPLE_BYTES, st.st_size - _SAMPLE_BYTES))
+            h.update(fh.read(_SAMPLE_BYTES))
+    return {
+        "size": int(st.st_size),
+        "mtime_ns": int(st.st_mtime_ns),
+        "inode": int(st.st_ino),
+        "sample_hash": h.hexdigest(),
+    }
+
+
+def _load_fingerprints(cache_dir: str) -> Dict[str, Any]:
+    try:
+        with open(os.path.join(cache_dir, _FINGERPRINTS), "r", encoding="utf-8") as fh:
+            index = json.load(fh)
+        return index if isinstance(index, dict) else {}
+    except Exception:
+        return {}
+
+
+def _store_fingerprints(cache_dir: str, index: Dict[str, Any]) -> None:
+    path = os.path.join(cache_dir, _FINGERPRINTS)
+    tmp = f"{path}.tmp-{os.getpid()}"
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        with open(tmp, "w", encoding="utf-8") as fh:
+            json.dump(index, fh)
+        os.replace(tmp, path)
+    except OSError:
+        # best-effort: the next lookup just hashes the file again
+        pass
+
+
+def file_fingerprint(path: str, cache_dir: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Identity of a source file: absolute path, size, mtime, inode, head/tail sample hash and
+    content hash. With cache_dir, the content hash recorded for an unchanged quick identity
+    is reused; the whole file is only hashed when the identity differs (or is unknown).
+    """
+    abspath = os.path.abspath(path)
+    quick = _quick_identity(path)
+    index = _load_fingerprints(cache_dir) if cache_dir else {}
+    known = index.get(abspath) or {}
+    if known.get("content_hash") and all(known.get(k) == v for k, v in quick.items()):
+        content_hash = known["content_hash"]
+    else:
+        content_hash = _content_hash(path)
+        if cache_dir:
+            index[abspath] = {**quick, "content_hash": content_hash}
+            _store_fingerprints(cache_dir, index)
+    return {"path": abspath, **quick, "content_hash": content_hash}
+
+
+def cache_key(fingerprint: Dict[str, Any], read_opts: Optional[Dict[str, Any]] = None) -> str:
+    source = {k: fingerprint.get(k) for k in _KEY_FIELDS}
+    s = json.dumps({"source": source, "read_opts": read_opts or {}}, sort_keys=True, default=str)
+    return hashlib.sha256(s.encode("utf-8")).hexdigest()[:32]
+
+
+def _dir_bytes(path: str) -> int:
+    total = 0
+    for name in os.listdir(path):
+        total += os.path.getsize(os.path.join(path, name))
+    return total
+
+
+def _cache_entries(cache_dir: str) -> List[Tuple[float, str, int]]:
+    """(last access, path, bytes) of every frame entry and per-partition aggregate state."""
+    entries = []
+    for key in os.listdir(cache_dir):
+        entry = os.path.join(cache_dir, key)
+        manifest_path = os.path.join(entry, _MANIFEST)
+        if not os.path.isfile(manifest_path):
+            continue
+        try:
+            with open(manifest_path, "r", encoding="utf-8") as fh:
+                last_access = float(json.load(fh).get("last_access", 0.0))
+        except Exception:
+            last_access = 0.0
+        entries.append((last_access, entry, _dir_bytes(entry)))
+
+    # partition states are single JSON files; their mtime is bumped on every cache hit
+    partitions = os.path.join(cache_dir, PARTITION_SUBDIR)
+    if os.path.isdir(partitions):
+        for name in os.listdir(partitions):
+            path = os.path.join(partitions, name)
+            if name.endswith(".json") and os.path.isfile(path):
+                st = os.stat(path)
+                entries.append((st.st_mtime, path, st.st_size))
+    return entries
+
+
+def _encode_column(s: pd.Series) -> Optional[Dict[str, Any]]:
+    """Return {"kind", "values", "categories"?} for a column, or None if it cannot be stored without pickle."""
+    if isinstance(s.dtype, pd.CategoricalDtype):
+        cats = s.cat.categories
+        if cats.dtype == object and not all(isinstance(c, str) for c in cats):
+            return None
+        return {"kind": "category", "values": s.cat.codes.to_numpy(), "categories": np.asarray(cats.tolist())}
+    if s.dtype == object:
+        non_null = s.dropna()
+        if not all(isinstance(v, str) for v in non_null):
+            return None
+        cat = pd.Categorical(s)
+        categories = np.asarray(cat.categories.tolist(), dtype=str)
+        return {"kind": "str", "values": np.asarray(cat.codes), "categories": categories}
+    if pd.api.types.is_datetime64_dtype(s.dtype) or pd.api.types.is_numeric_dtype(s.dtype):
+        if pd.api.types.is_extension_array_dtype(s.dtype):
+            return None
+        return {"kind": "array", "values": s.to_numpy()}
+    return None
+
+
+def _decode_column(kind: str, values: np.ndarray, categories: Optional[np.ndarray]) -> Any:
+    if kind == "array":
+        return values
+    cat = pd.Categorical.from_codes(values, categories=pd.Index(categories))
+    if kind == "category":
+        return cat
+    return np.asarray(cat.astype(object))
+
+
+def load_cached_frame(
+    path: str,
+    cache_dir: str,
+    *,
+    read_opts: Optional[Dict[str, Any]] = None,
+    fingerprint: Optional[Dict[str, Any]] = None,
+) -> Optional[pd.DataFrame]:
+    """
+    Return the cached frame for `path` if an entry matching its current fingerprint exists.
+    Returns None on miss or on any read error (the entry is then discarded).
+    """
+    fp = fingerprint or file_fingerprint(path, cache_dir)
+    entry = os.path.join(cache_dir, cache_key(fp, read_opts))
+    manifest_path = os.path.join(entry, _MANIFEST)
+    if not os.path.exists(manifest_path):
+        return None
+    try:
+        with open(manifest_path, "r", encoding="utf-8") as fh:
+            manifest = json.load(fh)
+        data = {}
+        for i, col in enumerate(manifest["columns"]):
+            values = np.load(os.path.join(entry, f"{i}.npy"), allow_pickle=False)
+            categories = None
+            if col["kind"] != "array":
+                categories = np.load(os.path.join(entry, f"{i}.cat.npy"), allow_pickle=False)
+            data[col["name"]] = _decode_column(col["kind"], values, categories)
+        df = pd.DataFrame(data, columns=[c["name"] for c in manifest["columns"]])
+        if len(df.columns) == 0:
+            df = pd.DataFrame(index=pd.RangeIndex(manifest.get("rows", 0)))
+
+        manifest["last_access"] = time.time()
+        with open(manifest_path, "w", encoding="utf-8") as fh:
+            json.dump(manifest, fh)
+        return df
+    except Exception:
+        shutil.rmtree(entry, ignore_errors=True)
+        return None
+
+
+def store_cached_frame(
+    path: str,
+    df: pd.DataFrame,
+    cache_dir: str,
+    *,
+    read_opts: Optional[Dict[str, Any]] = None,
+    fingerprint: Optional[Dict[str, Any]] = None,
+    max_bytes: Optional[int] = None,
+) -> Optional[str]:
+    """
+    Store `df` as one .npy file per column. Returns the entry directory, or None if the
+    frame holds columns that cannot be stored without pickling (mixed-type objects).
+    """
+    encoded: List[Dict[str, Any]] = []
+    for name in df.columns:
+        enc = _encode_column(df[name])
+        if enc is None:
+            return None
+        enc["name"] = str(name)
+        encoded.append(enc)
+
+    fp = fingerprint or file_fingerprint(path, cache_dir)
+    key = cache_key(fp, read_opts)
+    entry = os.path.join(cache_dir, key)
+    tmp = f"{entry}.tmp-{os.getpid()}"
+    os.makedirs(tmp, exist_ok=True)
+    try:
+        for i, enc in enumerate(encoded):
+            np.save(os.path.join(tmp, f"{i}.npy"), enc["values"], allow_pickle=False)
+            if "categories" in enc:
+                np.save(os.path.join(tmp, f"{i}.cat.npy"), enc["categories"], allow_pickle=False)
+        manifest = {
+            "source": fp,
+            "read_opts": read_opts or {},
+            "rows": int(len(df)),
+            "columns": [{"name": e["name"], "kind": e["kind"]} for e in encoded],
+            "created": time.time(),
+            "last_access": time.time(),
+        }
+        with open(os.path.join(tmp, _MANIFEST), "w", encoding="utf-8") as fh:
+            json.dump(manifest, fh)
+        if os.path.exists(entry):
+            shutil.rmtree(entry, ignore_errors=True)
+        os.replace(tmp, entry)
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+    if max_bytes is not None:
+        evict_lru(cache_dir, max_bytes)
+    return entry if os.path.exists(entry) else None
+
+
+def evict_lru(cache_dir: str, max_bytes: int) -> List[str]:
+    """
+    Delete least-recently-used entries (frames and partition states) until the cache fits
+    in max_bytes. Returns the removed entries, relative to cache_dir.
+    """
+    if not os.path.isdir(cache_dir):
+        return []
+    entries = _cache_entries(cache_dir)
+    entries.sort()
+    total = sum(size for _, _, size in entries)
+    removed = []
+    for _, path, size in entries:
+        if total <= max_bytes:
+            break
+        if os.path.isdir(path):
+            shutil.rmtree(path, ignore_errors=True)
+        else:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        total -= size
+        removed.append(os.path.relpath(path, cache_dir))
+    return removed
@@ -0,0 +1,144 @@
+# File: src/utils/incremental.py
+# Byte-offset watermarks for incremental ingest of append-only CSV exports.
+
+"""
+The watermark records how far into the file the last run got:
+
+    {
+      "version": 1,
+      "path": "/abs/path.csv",
+      "byte_offset": 123456,      # end of the last complete line already aggregated
+      "rows": 5000,               # data rows aggregated so far
+      "header_hash": "...",       # hash of the header line
+      "anchor_hash": "...",       # hash of the bytes just before byte_offset
+      "partials": {...}           # PartialAggregates.to_state()
+    }
+
+A run re-hashes the header and the anchor bytes; if either differs (file rewritten,
+truncated or rotated) the watermark is discarded and the file is ingested from scratch.
+"""
+from __future__ import annotations
+
+import hashlib
+import io
+import json
+import os
+from typing import Any, Dict, Optional
+
+STATE_VERSION = 1
+_ANCHOR_BYTES = 4096
+_SCAN_BLOCK = 1 << 16
+
+
+def _hash(data: bytes) -> str:
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+def read_header_line(path: str) -> bytes:
+    with open(path, "rb") as fh:
+        return fh.readline()
+
+
+def complete_lines_end(path: str) -> int:
+    """Offset just past the last newline, so a half-written trailing line is left for the next run."""
+    size = os.path.getsize(path)
+    with open(path, "rb") as fh:
+        pos = size
+        while pos > 0:
+            start = max(0, pos - _SCAN_BLOCK)
+            fh.seek(start)
+            block = fh.read(pos - start)
+            idx = block.rfind(b"\n")
+            if idx >= 0:
+                return start + idx + 1
+            pos = start
+    return 0
+
+
+def anchor_hash(path: str, offset: int) -> str:
+    """Hash of the bytes immediately preceding `offset`."""
+    start = max(0, offset - _ANCHOR_BYTES)
+    with open(path, "rb") as fh:
+        fh.seek(start)
+        return _hash(fh.read(offset - start))
+
+
+def read_watermark(state_path: str) -> Optional[Dict[str, Any]]:
+    try:
+        with open(state_path, "r", encoding="utf-8") as fh:
+            state = json.load(fh)
+        return state if state.get("version") == STATE_VERSION else None
+    except Exception:
+        return None
+
+
+def write_watermark(state_path: str, state: Dict[str, Any]) -> str:
+    os.makedirs(os.path.dirname(state_path) or ".", exist_ok=True)
+    tmp = f"{state_path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as fh:
+        json.dump(state, fh, default=str)
+    os.replace(tmp, state_path)
+    return state_path
+
+
+def watermark_is_valid(path: str, state: Optional[Dict[str, Any]], end: int) -> bool:
+    """True if `state` was produced from a prefix of the current file contents."""
+    if not state or state.get("path") != os.path.abspath(path):
+        return False
+    offset = int(state.get("byte_offset", 0))
+    if offset <= 0 or offset > end:
+        return False
+    return (state.get("header_hash") == _hash(read_header_line(path))
+            and state.get("anchor_hash") == anchor_hash(path, offset))
+
+
+def make_watermark(path: str, end: int, rows: int, partials_state: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "version": STATE_VERSION,
+        "path": os.path.abspath(path),
+        "byte_offset": int(end),
+        "rows": int(rows),
+        "header_hash": _hash(read_header_line(path)),
+        "anchor_hash": anchor_hash(path, end),
+        "partials": partials_state,
+    }
+
+
+class ByteRangeReader(io.RawIOBase):
+    """
+    Readable stream over `prefix` followed by bytes [start, end) of a file.
+
+    Used to hand pandas the header line plus only the new tail of the file
+    without copying the tail into memory.
+    """
+
+    def __init__(self, path: str, start: int, end: int, prefix: bytes = b"") -> None:
+        super().__init__()
+        self._fh = open(path, "rb")
+        self._fh.seek(start)
+        self._remaining = max(0, end - start)
+        self._prefix = prefix
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, b: Any) -> int:
+        n = 0
+        if self._prefix:
+            n = min(len(b), len(self._prefix))
+            b[:n] = self._prefix[:n]
+            self._prefix = self._prefix[n:]
+            return n
+        if self._remaining <= 0:
+            return 0
+        data = self._fh.read(min(len(b), self._remaining))
+        n = len(data)
+        b[:n] = data
+        self._remaining -= n
+        return n
+
+    def close(self) -> None:
+        try:
+            self._fh.close()
+        finally:
+            super().close()
@@ -0,0 +1,200 @@
+# File: src/utils/memprof.py
+# Opt-in per-stage memory profiling (tracemalloc + RSS sampling) as a tracing hook.
+
+"""
+MemoryProfiler is a hook for src/utils/tracing.Tracer. For every span it records:
+
+- traced (Python + numpy/pandas buffers) memory at start and end, plus the peak
+  reached inside the span, via tracemalloc. Nested spans fold their peak into the
+  parent, so reset_peak() for a child does not hide the parent's high-water mark.
+- process RSS at start and end, plus the peak seen by a background sampler thread
+  (/proc/self/statm; peak-only ru_maxrss where /proc is unavailable).
+- for top-level stages only, the call sites with the largest net allocation growth,
+  taken from a tracemalloc snapshot diff (snapshots are expensive, so nested spans skip them).
+
+check_memory_budget() compares stage peaks with a budget in MB. The budget is a single
+number for every stage, or a {stage: mb, "default": mb} mapping.
+"""
+from __future__ import annotations
+
+import os
+import threading
+import tracemalloc
+from typing import Any, Dict, List, Optional
+
+_MB = 1024 * 1024
+
+
+def rss_bytes() -> Optional[int]:
+    """Current resident set size, or the peak RSS (ru_maxrss) where /proc is unavailable."""
+    try:
+        with open("/proc/self/statm", "rb") as fh:
+            return int(fh.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError, AttributeError):
+        pass
+    try:
+        import resource
+        import sys
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return int(peak) if sys.platform == "darwin" else int(peak) * 1024
+    except Exception:
+        return None
+
+
+class _Frame:
+    __slots__ = ("traced_start", "traced_peak", "rss_start", "rss_peak", "snapshot")
+
+    def __init__(self, traced_start: int, rss_start: Optional[int]):
+        self.traced_start = traced_start
+        self.traced_peak = traced_start
+        self.rss_start = rss_start
+        self.rss_peak = rss_start or 0
+        self.snapshot: Optional[tracemalloc.Snapshot] = None
+
+
+class MemoryProfiler:
+    """Tracer hook recording per-span memory; start() before the run, stop() after it."""
+
+    def __init__(self, *, top_n: int = 5, rss_interval_s: float = 0.05, frames: int = 1):
+        self.top_n = int(top_n)
+        self.rss_interval_s = float(rss_interval_s)
+        self.frames = max(1, int(frames))
+        self.stages: List[Dict[str, Any]] = []
+        self._open: Dict[int, _Frame] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._sampler: Optional[threading.Thread] = None
+        self._started_tracemalloc = False
+
+    def start(self) -> "MemoryProfiler":
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(self.frames)
+            self._started_tracemalloc = True
+        if self.rss_interval_s > 0 and rss_bytes() is not None:
+            self._stop.clear()
+            self._sampler = threading.Thread(target=self._sample_rss, name="rss-sampler", daemon=True)
+            self._sampler.start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._sampler is not None:
+            self._sampler.join(timeout=1)
+            self._sampler = None
+        if self._started_tracemalloc:
+            tracemalloc.stop()
+            self._started_tracemalloc = False
+
+    def _sample_rss(self) -> None:
+        while not self._stop.wait(self.rss_interval_s):
+            self._fold_rss(rss_bytes())
+
+    def _fold_rss(self, rss: Optional[int]) -> None:
+        if rss is None:
+            return
+        with self._lock:
+            for frame in self._open.values():
+                if rss > frame.rss_peak:
+                    frame.rss_peak = rss
+
+    def _fold_traced_peak(self) -> int:
+        """Fold tracemalloc's peak since the last reset into every open span, then reset it."""
+        current, peak = tracemalloc.get_traced_memory()
+        for frame in self._open.values():
+            if peak > frame.traced_peak:
+                frame.traced_peak = peak
+        tracemalloc.reset_peak()
+        return current
+
+    def on_start(self, sp: Any) -> None:
+        if not tracemalloc.is_tracing():
+            return
+        # snapshot first, so its own allocations are part of the start level, not the stage peak
+        snapshot = self._snapshot() if sp.depth == 0 and self.top_n > 0 else None
+        rss = rss_bytes()
+        self._fold_rss(rss)
+        with self._lock:
+            current = self._fold_traced_peak()
+            frame = self._open[id(sp)] = _Frame(current, rss)
+        frame.snapshot = snapshot
+
+    def on_end(self, sp: Any) -> None:
+        if not tracemalloc.is_tracing() or id(sp) not in self._open:
+            return
+        rss = rss_bytes()
+        self._fold_rss(rss)
+        with self._lock:
+            current = self._fold_traced_peak()
+            frame = self._open.pop(id(sp))
+        record: Dict[str, Any] = {
+            "stage": sp.name,
+            "depth": sp.depth,
+            "traced_start_mb": round(frame.traced_start / _MB, 3),
+            "traced_end_mb": round(current / _MB, 3),
+            "delta_mb": round((current - frame.traced_start) / _MB, 3),
+            "peak_mb": round((frame.traced_peak - frame.traced_start) / _MB, 3),
+            "traced_peak_mb": round(frame.traced_peak / _MB, 3),
+        }
+        if frame.rss_start is not None and rss is not None:
+            record.update({
+                "rss_start_mb": round(frame.rss_start / _MB, 3),
+                "rss_end_mb": round(rss / _MB, 3),
+                "rss_peak_mb": round(max(frame.rss_peak, rss) / _MB, 3),
+            })
+        if frame.snapshot is not None:
+            record["top_allocations"] = self._top_allocations(frame.snapshot)
+        sp.set(memory={k: v for k, v in record.items() if k not in ("stage", "depth", "top_allocations")})
+        with self._lock:
+            self.stages.append(record)
+
+    def _snapshot(self) -> tracemalloc.Snapshot:
+        return tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, __file__),
+        ))
+
+    def _top_allocations(self, before: tracemalloc.Snapshot) -> List[Dict[str, Any]]:
+        diff = self._snapshot().compare_to(before, "lineno")
+        top = sorted((d for d in diff if d.size_diff > 0), key=lambda d: d.size_diff, reverse=True)[:self.top_n]
+        return [
+            {
+                "site": f"{d.traceback[0].filename}:{d.traceback[0].lineno}",
+                "size_mb": round(d.size_diff / _MB, 3),
+                "count": d.count_diff,
+            }
+            for d in top
+        ]
+
+    def report(self) -> Dict[str, Any]:
+        """Per-span records (in the order spans ended), top-level peaks and the largest RSS seen."""
+        return {
+            "stages": list(self.stages),
+            "peak_mb": {r["stage"]: r["peak_mb"] for r in self.stages if r["depth"] == 0},
+            "rss_peak_mb": max((r.get("rss_peak_mb", 0.0) for r in self.stages), default=None),
+        }
+
+
+def check_memory_budget(stages: List[Dict[str, Any]], budget: Any) -> List[Dict[str, Any]]:
+    """
+    Stages whose memory exceeded the budget (MB).
+
+    budget: number (every top-level stage) or {stage: mb, "default": mb} (nested stages
+    are only checked when named). A stage's usage is its traced peak above the start
+    level (peak_mb), or its RSS growth when that is larger.
+    """
+    if not budget:
+        return []
+    over: List[Dict[str, Any]] = []
+    for rec in stages:
+        if isinstance(budget, dict):
+            limit = budget.get(rec["stage"], budget.get("default") if rec["depth"] == 0 else None)
+        else:
+            limit = budget if rec["depth"] == 0 else None
+        if limit is None:
+            continue
+        rss_growth = rec.get("rss_peak_mb", 0.0) - rec.get("rss_start_mb", 0.0)
+        used = max(rec["peak_mb"], rss_growth)
+        if used > float(limit):
+            over.append({"stage": rec["stage"], "used_mb": round(used, 3), "budget_mb": float(limit),
+                         "top_allocations": rec.get("top_allocations", [])})
+    return over
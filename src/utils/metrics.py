@@ -0,0 +1,317 @@
+# File: src/utils/metrics.py
+# In-process metrics registry: counters, gauges and fixed-bucket latency histograms.
+
+"""
+REGISTRY holds metric families. A family is a name plus label names, and it has one
+child per label-value tuple:
+
+    calls = REGISTRY.counter("stage_calls_total", "Calls per stage", ("stage",))
+    calls.labels("load_csv_safe").inc()
+
+    @timed("summarize_df")        # stage_latency_seconds{stage="summarize_df"} histogram
+    def summarize_df(...): ...
+
+Observing costs no allocation beyond Python's own float arithmetic. Children are
+created and cached on first use (decorators bind theirs at import time). Histogram
+bucket counts live in a preallocated array('q'), and an observation is one bisect plus
+in-place increments.
+
+render_prometheus() writes the Prometheus text exposition format. snapshot() gives a
+JSON-friendly view with p50/p99 estimated from the buckets (histogram_quantile-style
+linear interpolation), for metrics.json. to_state()/load_state() persist the raw
+values, so counters and histograms can accumulate across runs.
+"""
+from __future__ import annotations
+
+import functools
+import json
+import math
+import os
+import time
+from array import array
+from bisect import bisect_left
+from typing import Any, Callable, Dict, Optional, Sequence, Tuple
+
+DEFAULT_LATENCY_BUCKETS = (
+    0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0,
+)
+
+
+class CounterChild:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def inc(self, amount: float = 1.0) -> None:
+        self.value += amount
+
+    def reset(self) -> None:
+        self.value = 0.0
+
+
+class GaugeChild:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def set(self, value: float) -> None:
+        self.value = float(value)
+
+    def inc(self, amount: float = 1.0) -> None:
+        self.value += amount
+
+    def reset(self) -> None:
+        self.value = 0.0
+
+
+class HistogramChild:
+    __slots__ = ("bounds", "counts", "sum")
+
+    def __init__(self, bounds: Tuple[float, ...]):
+        self.bounds = bounds
+        # counts[i]: observations in (bounds[i-1], bounds[i]]; the last slot is +Inf
+        self.counts = array("q", bytes(8 * (len(bounds) + 1)))
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+
+    @property
+    def count(self) -> int:
+        return sum(self.counts)
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Bucket-interpolated quantile (None without observations; +Inf bucket -> largest bound)."""
+        total = self.count
+        if total == 0:
+            return None
+        rank = q * total
+        seen = 0
+        for i, c in enumerate(self.counts):
+            if c and seen + c >= rank:
+                if i == len(self.bounds):
+                    return self.bounds[-1]
+                lo = self.bounds[i - 1] if i > 0 else 0.0
+                return lo + (self.bounds[i] - lo) * (rank - seen) / c
+            seen += c
+        return self.bounds[-1]
+
+    def reset(self) -> None:
+        for i in range(len(self.counts)):
+            self.counts[i] = 0
+        self.sum = 0.0
+
+
+class MetricFamily:
+    def __init__(self, kind: str, name: str, help: str, labelnames: Sequence[str] = (),
+                 buckets: Optional[Sequence[float]] = None):
+        self.kind = kind
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(float(b) for b in buckets)) if buckets else DEFAULT_LATENCY_BUCKETS
+        self.children: Dict[Tuple[str, ...], Any] = {}
+
+    def labels(self, *values: Any) -> Any:
+        key = tuple(str(v) for v in values)
+        child = self.children.get(key)
+        if child is None:
+            if len(key) != len(self.labelnames):
+                raise ValueError(f"{self.name} expects labels {self.labelnames}, got {key}")
+            if self.kind == "counter":
+                child = CounterChild()
+            elif self.kind == "gauge":
+                child = GaugeChild()
+            else:
+                child = HistogramChild(self.buckets)
+            self.children[key] = child
+        return child
+
+    # label-less shortcuts
+    def inc(self, amount: float = 1.0) -> None:
+        self.labels().inc(amount)
+
+    def set(self, value: float) -> None:
+        self.labels().set(value)
+
+    def observe(self, value: float) -> None:
+        self.labels().observe(value)
+
+
+def _fmt(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+class Registry:
+    def __init__(self):
+        self.families: Dict[str, MetricFamily] = {}
+
+    def _family(self, kind: str, name: str, help: str, labelnames: Sequence[str],
+                buckets: Optional[Sequence[float]] = None) -> MetricFamily:
+        fam = self.families.get(name)
+        if fam is None:
+            fam = self.families[name] = MetricFamily(kind, name, help, labelnames, buckets)
+        elif fam.kind != kind or fam.labelnames != tuple(labelnames):
+            raise ValueError(f"metric {name} already registered as {fam.kind}{fam.labelnames}")
+        elif help and not fam.help:
+            fam.help = help
+        return fam
+
+    def counter(self, name: str, help: str = "", labelnames: Sequence[str] = ()) -> MetricFamily:
+        return self._family("counter", name, help, labelnames)
+
+    def gauge(self, name: str, help: str = "", labelnames: Sequence[str] = ()) -> MetricFamily:
+        return self._family("gauge", name, help, labelnames)
+
+    def histogram(self, name: str, help: str = "", labelnames: Sequence[str] = (),
+                  buckets: Optional[Sequence[float]] = None) -> MetricFamily:
+        return self._family("histogram", name, help, labelnames, buckets)
+
+    def reset(self) -> None:
+        """Zero every value in place (children bound by decorators stay valid)."""
+        for fam in self.families.values():
+            for child in fam.children.values():
+                child.reset()
+
+    def render_prometheus(self) -> str:
+        lines = []
+        for name in sorted(self.families):
+            fam = self.families[name]
+            lines.append(f"# HELP {name} {fam.help}")
+            lines.append(f"# TYPE {name} {fam.kind}")
+            for key in sorted(fam.children):
+                child = fam.children[key]
+                pairs = [f'{n}="{_escape(v)}"' for n, v in zip(fam.labelnames, key)]
+                if fam.kind != "histogram":
+                    labels = "{" + ",".join(pairs) + "}" if pairs else ""
+                    lines.append(f"{name}{labels} {_fmt(child.value)}")
+                    continue
+                cumulative = 0
+                for bound, c in zip(fam.buckets + (math.inf,), child.counts):
+                    cumulative += c
+                    le = ",".join(pairs + [f'le="{_fmt(bound)}"'])
+                    lines.append(f"{name}_bucket{{{le}}} {cumulative}")
+                labels = "{" + ",".join(pairs) + "}" if pairs else ""
+                lines.append(f"{name}_sum{labels} {_fmt(child.sum)}")
+                lines.append(f"{name}_count{labels} {cumulative}")
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path: str) -> str:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp = f"{path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as fh:
+            fh.write(self.render_prometheus())
+        os.replace(tmp, path)
+        return path
+
+    def snapshot(self) -> Dict[str, Any]:
+        """{name: {label string: value}}; histograms give count, sum, mean, p50, p99."""
+        out: Dict[str, Any] = {}
+        for name, fam in sorted(self.families.items()):
+            series: Dict[str, Any] = {}
+            for key, child in sorted(fam.children.items()):
+                label = ",".join(f"{n}={v}" for n, v in zip(fam.labelnames, key))
+                if fam.kind == "histogram":
+                    count = child.count
+                    series[label] = {
+                        "count": count,
+                        "sum": child.sum,
+                        "mean": child.sum / count if count else None,
+                        "p50": child.quantile(0.5),
+                        "p99": child.quantile(0.99),
+                    }
+                else:
+                    series[label] = child.value
+            out[name] = series
+        return out
+
+    def to_state(self) -> Dict[str, Any]:
+        state: Dict[str, Any] = {}
+        for name, fam in self.families.items():
+            state[name] = {
+                "kind": fam.kind,
+                "help": fam.help,
+                "labelnames": list(fam.labelnames),
+                "buckets": list(fam.buckets) if fam.kind == "histogram" else None,
+                "series": [
+                    {"labels": list(key),
+                     **({"counts": list(c.counts), "sum": c.sum} if fam.kind == "histogram" else {"value": c.value})}
+                    for key, c in fam.children.items()
+                ],
+            }
+        return state
+
+    def load_state(self, state: Dict[str, Any]) -> None:
+        """Replace values with a persisted state (families with changed buckets/labels are skipped)."""
+        for name, rec in (state or {}).items():
+            try:
+                fam = self._family(rec["kind"], name, rec.get("help", ""), rec.get("labelnames") or (),
+                                   rec.get("buckets"))
+            except ValueError:
+                continue
+            if fam.kind == "histogram" and list(fam.buckets) != list(rec.get("buckets") or []):
+                continue
+            for series in rec.get("series", []):
+                child = fam.labels(*series["labels"])
+                if fam.kind == "histogram":
+                    child.counts = array("q", series["counts"])
+                    child.sum = float(series["sum"])
+                else:
+                    child.value = float(series["value"])
+
+    def load(self, path: Optional[str]) -> "Registry":
+        if path and os.path.exists(path):
+            try:
+                with open(path, "r", encoding="utf-8") as fh:
+                    self.load_state(json.load(fh))
+            except (OSError, ValueError, KeyError, TypeError):
+                pass
+        return self
+
+    def save(self, path: str) -> str:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp = f"{path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as fh:
+            json.dump(self.to_state(), fh)
+        os.replace(tmp, path)
+        return path
+
+
+REGISTRY = Registry()
+
+STAGE_LATENCY = REGISTRY.histogram("stage_latency_seconds", "Wall time of instrumented pipeline stages", ("stage",))
+STAGE_CALLS = REGISTRY.counter("stage_calls_total", "Calls of instrumented pipeline stages", ("stage",))
+STAGE_ERRORS = REGISTRY.counter("stage_errors_total", "Instrumented stage calls that raised", ("stage",))
+
+
+def timed(stage: str) -> Callable[[Callable[..., Any]], Callable[..., Any]]:
+    """Decorator: record the call's latency, call count and errors under `stage`."""
+    def decorate(fn: Callable[..., Any]) -> Callable[..., Any]:
+        latency = STAGE_LATENCY.labels(stage)
+        calls = STAGE_CALLS.labels(stage)
+        errors = STAGE_ERRORS.labels(stage)
+
+        @functools.wraps(fn)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            except BaseException:
+                errors.inc()
+                raise
+            finally:
+                latency.observe(time.perf_counter() - start)
+                calls.inc()
+
+        return wrapper
+
+    return decorate
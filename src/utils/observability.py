@@ -5,16 +5,31 @@ Observability helpers: per-agent event logs and metrics writer.
 Functions:
 - log_event(agent, event, payload, base_dir=None, filename=None) -> path
 - write_metrics(metrics, path='reports/metrics.json') -> path
+- configure_sink(mode, ...) / get_sink() / set_sink(sink) / flush_events()
+
+Events go through a pluggable sink:
+- JsonlSink (default): one append-only `events_<run>.jsonl` per run and base_dir, buffered
+  in memory and flushed when the buffer passes `flush_bytes`, when `flush_interval_s` has
+  passed since the last flush, and at interpreter / pool-worker exit
+- FileSink: the original one `{agent}_{event}_{ts}.json` file per event
+- QueueSink: wraps either of them; log_event only enqueues onto a bounded queue and a
+  daemon writer thread does the disk I/O. A full queue blocks, drops the oldest queued
+  event, or keeps only every Nth overflowing event (`overflow`); stats() counts queued,
+  written and dropped events, flush() waits for the queue to drain
 
 These functions are defensive: if base_dir is None, they default to 'logs/observability'.
 They always create parent directories when writing.
 """
 from __future__ import annotations
 
+import atexit
 import json
 import os
+import queue
+import threading
+import time
 from datetime import datetime
-from typing import Any, Dict, Optional
+from typing import Any, Dict, List, Optional, Tuple
 
 
 def _ensure_dir(path: Optional[str]) -> None:
@@ -30,6 +45,343 @@ def _safe_iso_ts() -> str:
     return datetime.utcnow().isoformat() + "Z"
 
 
+def _event_filename(rec: Dict[str, Any]) -> str:
+    safe_agent = rec["agent"].replace(" ", "_")
+    return f"{safe_agent}_{rec['event']}_{rec['timestamp']}.json"
+
+
+def _write_text_file(path: str, text: str) -> str:
+    try:
+        _ensure_dir(os.path.dirname(path))
+    except Exception:
+        pass
+    try:
+        with open(path, "w", encoding="utf-8") as fh:
+            fh.write(text)
+    except Exception:
+        # best-effort: ignore write errors (caller may still continue)
+        pass
+    return path
+
+
+def _write_event_file(rec: Dict[str, Any], base_dir: str, filename: Optional[str]) -> str:
+    """Write one event record as its own indented JSON file (the per-file layout)."""
+    return _write_text_file(os.path.join(base_dir, filename or _event_filename(rec)),
+                            json.dumps(rec, indent=2, default=str))
+
+
+class FileSink:
+    """One `{agent}_{event}_{ts}.json` file per event (the original layout)."""
+
+    def path_for(self, base_dir: str, rec: Dict[str, Any]) -> str:
+        return os.path.join(base_dir, _event_filename(rec))
+
+    def encode(self, rec: Dict[str, Any]) -> str:
+        return json.dumps(rec, indent=2, default=str)
+
+    def write_encoded(self, path: str, text: str) -> str:
+        return _write_text_file(path, text)
+
+    def write(self, rec: Dict[str, Any], base_dir: str) -> str:
+        return self.write_encoded(self.path_for(base_dir, rec), self.encode(rec))
+
+    def flush(self) -> None:
+        pass
+
+    def close(self) -> None:
+        pass
+
+
+class JsonlSink:
+    """
+    Buffered append-only JSONL writer: one `events_<run_id>.jsonl` per run and base_dir.
+
+    Records are serialized on write and buffered per file; a file is appended to (one
+    open + write per flush) once its buffer passes flush_bytes or flush_interval_s has
+    passed since the last flush. Pending records are flushed by flush()/close(), at
+    interpreter exit, and at multiprocessing worker exit (forked workers drop the
+    parent's inherited buffer, so nothing is written twice).
+    """
+
+    def __init__(self, *, flush_bytes: int = 64 * 1024, flush_interval_s: float = 1.0,
+                 run_id: Optional[str] = None):
+        self.flush_bytes = int(flush_bytes)
+        self.flush_interval_s = float(flush_interval_s)
+        self.run_id = run_id or datetime.utcnow().strftime("%Y%m%dT%H%M%S") + f"_{os.getpid()}"
+        self._buffers: Dict[str, List[str]] = {}
+        self._sizes: Dict[str, int] = {}
+        self._last_flush = time.monotonic()
+        self._lock = threading.Lock()
+        try:
+            from multiprocessing import util
+            util.register_after_fork(self, JsonlSink._after_fork)
+        except Exception:
+            pass
+
+    def path_for(self, base_dir: str, rec: Optional[Dict[str, Any]] = None) -> str:
+        return os.path.join(base_dir, f"events_{self.run_id}.jsonl")
+
+    def encode(self, rec: Dict[str, Any]) -> str:
+        return json.dumps(rec, default=str, separators=(",", ":")) + "\n"
+
+    def write(self, rec: Dict[str, Any], base_dir: str) -> str:
+        return self.write_encoded(self.path_for(base_dir), self.encode(rec))
+
+    def write_encoded(self, path: str, line: str) -> str:
+        """Buffer an already-serialized line for path."""
+        with self._lock:
+            self._buffers.setdefault(path, []).append(line)
+            self._sizes[path] = self._sizes.get(path, 0) + len(line)
+            due = (self._sizes[path] >= self.flush_bytes
+                   or time.monotonic() - self._last_flush >= self.flush_interval_s)
+        if due:
+            self.flush()
+        return path
+
+    def flush(self) -> None:
+        with self._lock:
+            pending, self._buffers, self._sizes = self._buffers, {}, {}
+            self._last_flush = time.monotonic()
+        for path, lines in pending.items():
+            try:
+                _ensure_dir(os.path.dirname(path))
+                with open(path, "a", encoding="utf-8") as fh:
+                    fh.write("".join(lines))
+            except Exception:
+                # best-effort, like the per-file writer
+                pass
+
+    def close(self) -> None:
+        self.flush()
+
+    def _reset_after_fork(self) -> None:
+        """In a forked child: forget the parent's pending records (the parent writes those)."""
+        self._lock = threading.Lock()
+        self._buffers, self._sizes = {}, {}
+
+    def _after_fork(self) -> None:
+        """In a multiprocessing child: also flush at worker exit (workers skip atexit)."""
+        self._reset_after_fork()
+        from multiprocessing import util
+        util.Finalize(self, self.flush, exitpriority=10)
+
+
+class QueueSink:
+    """
+    Non-blocking front for another sink: write() enqueues, a daemon thread writes.
+
+    overflow decides what a write does when maxsize events are already queued:
+    - "block": wait for room (no event is lost)
+    - "drop_oldest": evict the oldest queued event to make room
+    - "sample": keep every sample_every-th overflowing event (evicting the oldest
+      queued one for it) and drop the rest
+    """
+
+    def __init__(self, inner: Any, *, maxsize: int = 10000, overflow: str = "block", sample_every: int = 10):
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(f"overflow must be one of {OVERFLOW_POLICIES}, got {overflow!r}")
+        self.inner = inner
+        self.maxsize = max(1, int(maxsize))
+        self.overflow = overflow
+        self.sample_every = max(1, int(sample_every))
+        self._reset_after_fork()
+        try:
+            from multiprocessing import util
+            util.register_after_fork(self, QueueSink._after_fork)
+        except Exception:
+            pass
+
+    def _reset_after_fork(self) -> None:
+        """Fresh queue, counters and (lazily started) thread; also the state of a forked child."""
+        self._queue: queue.Queue = queue.Queue(maxsize=self.maxsize)
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._pid = os.getpid()
+        self._overflowed = 0
+        self._counts = {"queued": 0, "written": 0, "dropped": 0, "write_errors": 0, "max_depth": 0}
+        hook = getattr(self.inner, "_reset_after_fork", None)
+        if hook is not None:
+            hook()
+
+    def _after_fork(self) -> None:
+        # drain before the inner sink's own worker-exit flush (higher exitpriority runs first)
+        from multiprocessing import util
+        util.Finalize(self, self.flush, exitpriority=20)
+
+    def _ensure_thread(self) -> None:
+        if self._thread is None or not self._thread.is_alive() or self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name="event-writer", daemon=True)
+            self._thread.start()
+
+    def _run(self) -> None:
+        q = self._queue
+        while True:
+            item = q.get()
+            try:
+                if item is None:
+                    return
+                try:
+                    self._write_item(*item)
+                    self._count("written")
+                except Exception:
+                    self._count("write_errors")
+            finally:
+                q.task_done()
+
+    def _count(self, key: str, n: int = 1) -> None:
+        with self._lock:
+            self._counts[key] += n
+
+    def _evict_oldest(self) -> None:
+        try:
+            self._queue.get_nowait()
+        except queue.Empty:
+            return
+        self._queue.task_done()
+        self._count("dropped")
+
+    def path_for(self, base_dir: str, rec: Optional[Dict[str, Any]] = None) -> str:
+        path_for = getattr(self.inner, "path_for", None)
+        return path_for(base_dir, rec) if path_for is not None else base_dir
+
+    def _encode(self, rec: Dict[str, Any], base_dir: str) -> Tuple[str, str, bool]:
+        """
+        Serialize on the calling thread, so later changes to rec (or its live payload
+        objects) cannot leak into the queued event. Returns (text, target, encoded).
+        """
+        encode = getattr(self.inner, "encode", None)
+        if encode is not None and hasattr(self.inner, "write_encoded"):
+            return encode(rec), self.path_for(base_dir, rec), True
+        return json.dumps(rec, default=str), base_dir, False
+
+    def _write_item(self, text: str, target: str, encoded: bool) -> None:
+        if encoded:
+            self.inner.write_encoded(target, text)
+        else:
+            self.inner.write(json.loads(text), target)
+
+    def write(self, rec: Dict[str, Any], base_dir: str) -> str:
+        self._ensure_thread()
+        item = self._encode(rec, base_dir)
+        if self.overflow == "block":
+            self._queue.put(item)
+        else:
+            while True:
+                try:
+                    self._queue.put_nowait(item)
+                    break
+                except queue.Full:
+                    if self.overflow == "sample":
+                        with self._lock:
+                            self._overflowed += 1
+                            keep = (self._overflowed - 1) % self.sample_every == 0
+                        if not keep:
+                            self._count("dropped")
+                            return self.path_for(base_dir, rec)
+                    self._evict_oldest()
+        with self._lock:
+            self._counts["queued"] += 1
+            self._counts["max_depth"] = max(self._counts["max_depth"], self._queue.qsize())
+        return self.path_for(base_dir, rec)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            out = dict(self._counts)
+        out.update({"pending": self._queue.qsize(), "maxsize": self.maxsize, "overflow": self.overflow})
+        return out
+
+    def flush(self) -> None:
+        """Wait until every queued event is written, then flush the inner sink."""
+        if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+            self._queue.join()
+        self.inner.flush()
+
+    def close(self) -> None:
+        self.flush()
+        if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+            self._queue.put(None)
+            self._thread.join(timeout=5)
+        self._thread = None
+        self.inner.close()
+
+
+SINK_MODES = ("jsonl", "file")
+OVERFLOW_POLICIES = ("block", "drop_oldest", "sample")
+_SINK: Any = JsonlSink()
+
+
+def get_sink() -> Any:
+    return _SINK
+
+
+def set_sink(sink: Any) -> Any:
+    """Install an event sink (any object with write(rec, base_dir), flush(), close()); returns the old one."""
+    global _SINK
+    old, _SINK = _SINK, sink
+    if old is not sink:
+        try:
+            old.close()
+        except Exception:
+            pass
+    return old
+
+
+def configure_sink(
+    mode: str = "jsonl",
+    *,
+    flush_bytes: int = 64 * 1024,
+    flush_interval_s: float = 1.0,
+    queue_size: Optional[int] = None,
+    overflow: str = "block",
+    sample_every: int = 10,
+) -> Any:
+    """
+    Install a fresh sink by name ("jsonl" or "file"); a new jsonl sink starts a new run file.
+
+    With queue_size the sink is wrapped in a QueueSink (background writer thread, bounded
+    queue with the given overflow policy).
+    """
+    if mode == "file":
+        sink: Any = FileSink()
+    elif mode == "jsonl":
+        sink = JsonlSink(flush_bytes=flush_bytes, flush_interval_s=flush_interval_s)
+    else:
+        raise ValueError(f"event sink must be one of {SINK_MODES}, got {mode!r}")
+    if queue_size:
+        sink = QueueSink(sink, maxsize=queue_size, overflow=overflow, sample_every=sample_every)
+    set_sink(sink)
+    return sink
+
+
+def flush_events() -> None:
+    """Write out every buffered / queued event (the orchestrator calls this at the end of a run)."""
+    try:
+        _SINK.flush()
+    except Exception:
+        pass
+
+
+def event_stats() -> Dict[str, Any]:
+    """Queue counters (queued / written / dropped / pending) of the current sink, {} if it has none."""
+    stats = getattr(_SINK, "stats", None)
+    try:
+        return stats() if stats is not None else {}
+    except Exception:
+        return {}
+
+
+def _after_fork_in_child() -> None:
+    hook = getattr(_SINK, "_reset_after_fork", None)
+    if hook is not None:
+        hook()
+
+
+atexit.register(flush_events)
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_after_fork_in_child)
+
+
 def log_event(
     agent: str,
     event: str,
@@ -39,39 +391,29 @@ def log_event(
     filename: Optional[str] = None,
 ) -> str:
     """
-    Write a single-agent event JSON into base_dir. Returns the path written.
+    Record a single-agent event under base_dir via the current sink. Returns the path written.
 
     - base_dir: directory to place logs. If None, defaults to "logs/observability".
-    - filename: optional filename; if not provided a timestamped one will be used.
-    The function is defensive: it will not raise on directory creation failures.
+    - filename: optional filename; when given the event is always written to that file
+      on its own, bypassing the sink.
+    The function is defensive: it will not raise on directory creation or write failures.
     """
     if base_dir is None:
         base_dir = "logs/observability"
 
-    _ensure_dir(base_dir)
-
-    ts = _safe_iso_ts()
-    if not filename:
-        safe_agent = agent.replace(" ", "_")
-        filename = f"{safe_agent}_{event}_{ts}.json"
-
-    path = os.path.join(base_dir, filename)
-
     rec = {
         "agent": agent,
         "event": event,
-        "timestamp": ts,
+        "timestamp": _safe_iso_ts(),
         "payload": payload,
     }
 
+    if filename:
+        return _write_event_file(rec, base_dir, filename)
     try:
-        with open(path, "w", encoding="utf-8") as fh:
-            json.dump(rec, fh, indent=2, default=str)
+        return _SINK.write(rec, base_dir)
     except Exception:
-        # best-effort: ignore write errors (caller may still continue)
-        pass
-
-    return path
+        return _write_event_file(rec, base_dir, None)
 
 
 def write_metrics(metrics: Dict[str, Any], path: str = "reports/metrics.json") -> str:
@@ -0,0 +1,84 @@
+# File: src/utils/partitions.py
+# Multi-file (partitioned) inputs: path resolution and per-partition aggregate cache.
+
+"""
+`data_csv` may name a single CSV, a directory (every *.csv below it, e.g. one file per
+day or `date=2025-01-03/account_1.csv`) or a glob pattern. Each file is a partition.
+
+Per-partition aggregates are cached as JSON under `<cache_dir>/partitions/<key>.json`,
+where the key hashes the file fingerprint plus the reader options, so an unchanged
+file is never parsed twice and a new daily file is the only one processed. The states
+share the frame cache's size cap and LRU eviction.
+"""
+from __future__ import annotations
+
+import glob
+import json
+import os
+from typing import Any, Dict, List, Optional
+
+from src.utils.frame_cache import PARTITION_SUBDIR, cache_key
+
+_GLOB_CHARS = ("*", "?", "[")
+
+
+def is_glob(path: str) -> bool:
+    return any(c in path for c in _GLOB_CHARS)
+
+
+def is_partitioned(path: str) -> bool:
+    """True if `path` names a directory or glob rather than a single file."""
+    return os.path.isdir(path) or (is_glob(path) and not os.path.exists(path))
+
+
+def resolve_partitions(path: str) -> List[str]:
+    """Sorted list of CSV files behind `path` (a file, directory or glob)."""
+    if os.path.isdir(path):
+        files = glob.glob(os.path.join(path, "**", "*.csv"), recursive=True)
+    elif is_glob(path) and not os.path.exists(path):
+        files = glob.glob(path, recursive=True)
+    else:
+        return [path]
+    return sorted(f for f in files if os.path.isfile(f))
+
+
+def _state_path(cache_dir: str, fingerprint: Dict[str, Any], read_opts: Optional[Dict[str, Any]]) -> str:
+    return os.path.join(cache_dir, PARTITION_SUBDIR, f"{cache_key(fingerprint, read_opts)}.json")
+
+
+def load_partition_state(
+    cache_dir: str,
+    fingerprint: Dict[str, Any],
+    read_opts: Optional[Dict[str, Any]] = None,
+) -> Optional[Dict[str, Any]]:
+    """Cached PartialAggregates state for a partition, or None on miss / unreadable entry."""
+    path = _state_path(cache_dir, fingerprint, read_opts)
+    try:
+        with open(path, "r", encoding="utf-8") as fh:
+            state = json.load(fh)
+        # the mtime is the entry's last access for LRU eviction (frame_cache.evict_lru)
+        os.utime(path)
+        return state
+    except FileNotFoundError:
+        return None
+    except Exception:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+        return None
+
+
+def store_partition_state(
+    cache_dir: str,
+    fingerprint: Dict[str, Any],
+    state: Dict[str, Any],
+    read_opts: Optional[Dict[str, Any]] = None,
+) -> str:
+    path = _state_path(cache_dir, fingerprint, read_opts)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.tmp-{os.getpid()}"
+    with open(tmp, "w", encoding="utf-8") as fh:
+        json.dump(state, fh, default=str)
+    os.replace(tmp, path)
+    return path
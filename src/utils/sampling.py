@@ -0,0 +1,85 @@
+# File: src/utils/sampling.py
+# One-pass reservoir sampling (optionally stratified) over chunked CSV reads.
+
+from __future__ import annotations
+from typing import Any, Dict, List, Optional, Sequence
+import numpy as np
+import pandas as pd
+
+_KEY = "__sample_key"
+_POS = "__sample_pos"
+_STRATUM = "__sample_stratum"
+
+
+class ReservoirSampler:
+    """
+    Bottom-k reservoir sample: every row gets a uniform random key and the rows with the
+    `size` smallest keys are kept, which is a uniform sample without replacement. Chunks
+    are folded in one at a time, so memory is bounded by the reservoir plus one chunk.
+
+    With `strata` (e.g. ["campaign_name"] or ["campaign_name", "date"]) the same single
+    bottom-k reservoir (proportional to stratum sizes in expectation) is kept, plus each
+    stratum's smallest-key row, so small campaigns / days are never dropped. Retained rows
+    stay at most `size` + one per stratum (the sample itself can exceed `size` by up to
+    one row per stratum), however many rows each stratum has.
+    """
+
+    def __init__(self, size: int, *, strata: Optional[Sequence[str]] = None, seed: Optional[int] = None) -> None:
+        self.size = max(1, int(size))
+        self.strata: List[str] = list(strata or [])
+        self.rng = np.random.default_rng(seed)
+        self.rows_seen = 0
+        self._reservoir: Optional[pd.DataFrame] = None
+        self._counts = pd.Series(dtype="float64")
+
+    def _stratum_ids(self, chunk: pd.DataFrame) -> np.ndarray:
+        cols = [c for c in self.strata if c in chunk.columns]
+        if not cols:
+            return np.zeros(len(chunk), dtype="uint64")
+        # value hashes are stable across chunks (and across differing category sets)
+        return pd.util.hash_pandas_object(chunk[cols], index=False).to_numpy()
+
+    def update(self, chunk: pd.DataFrame) -> "ReservoirSampler":
+        n = len(chunk)
+        if n == 0:
+            if self._reservoir is None:
+                self._reservoir = chunk.head(0).assign(**{_KEY: [], _POS: [], _STRATUM: []})
+            return self
+        stratum = self._stratum_ids(chunk)
+        cand = chunk.assign(**{
+            _KEY: self.rng.random(n),
+            _POS: np.arange(self.rows_seen, self.rows_seen + n),
+            _STRATUM: stratum,
+        })
+        self.rows_seen += n
+        self._counts = self._counts.add(pd.Series(stratum).value_counts(), fill_value=0)
+
+        if not self.strata and self._reservoir is not None and len(self._reservoir) >= self.size:
+            # only rows that beat the current k-th smallest key can enter the reservoir
+            cand = cand[cand[_KEY].to_numpy() < self._reservoir[_KEY].max()]
+        pool = cand if self._reservoir is None else pd.concat([self._reservoir, cand], ignore_index=True)
+        pool = pool.sort_values(_KEY, kind="stable")
+        keep = pool.head(self.size)
+        if self.strata:
+            # plus the smallest-key row of every stratum (already in `keep` for most of them)
+            keep = pd.concat([keep, pool.drop_duplicates(_STRATUM)]).drop_duplicates(_POS)
+        self._reservoir = keep.reset_index(drop=True)
+        return self
+
+    def result(self) -> pd.DataFrame:
+        """The sample in original row order, with helper columns removed."""
+        if self._reservoir is None:
+            return pd.DataFrame()
+        res = self._reservoir.sort_values(_POS)
+        return res.drop(columns=[_KEY, _POS, _STRATUM]).reset_index(drop=True)
+
+    def info(self, sample_rows: int) -> Dict[str, Any]:
+        return {
+            "mode": "stratified" if self.strata else "reservoir",
+            "strata": list(self.strata),
+            "num_strata": int(len(self._counts)),
+            "sample_size": int(self.size),
+            "sample_rows": int(sample_rows),
+            "rows_seen": int(self.rows_seen),
+            "fraction": float(sample_rows / self.rows_seen) if self.rows_seen else 1.0,
+        }
@@ -38,10 +38,69 @@ EXPECTED_SCHEMA = {
         "impressions": ["int64", "int32", "float64"],
         "clicks": ["int64", "int32", "float64"],
         "revenue": ["float64", "float32", "int64", "int32"],
-    }
+    },
+    # dtypes declared to the CSV reader up front (float so NaN-bearing counts still parse)
+    "read_dtypes": {
+        "spend": "float64",
+        "revenue": "float64",
+        "impressions": "float64",
+        "clicks": "float64",
+        "purchases": "float64",
+        "conversions": "float64",
+        "ctr": "float64",
+        "roas": "float64",
+    },
+    # integer counts: read as float64, cast back to int64 when whole and NaN-free
+    "count_columns": ["impressions", "clicks", "purchases", "conversions"],
+    # low-cardinality text columns loaded as pandas 'category'
+    "dimension_columns": [
+        "campaign",
+        "campaign_name",
+        "ad_set",
+        "adset_name",
+        "platform",
+        "country",
+        "creative_type",
+        "audience_type",
+    ],
+    # columns read by a downstream stage; anything else can be skipped at parse time
+    "used_columns": [
+        "date",
+        "spend",
+        "revenue",
+        "impressions",
+        "clicks",
+        "creative_id",
+    ],
+    # columns only the creative generator reads
+    "creative_columns": ["creative_message"],
 }
 
 
+def typed_read_options(*, prune: bool = False, include_creative: bool = True) -> Dict[str, Any]:
+    """
+    Build pd.read_csv keyword arguments from EXPECTED_SCHEMA.
+
+    - numeric columns get their dtype declared instead of inferred
+    - dimension columns are parsed straight into 'category'
+    - with prune=True, columns no downstream stage reads are skipped (usecols);
+      creative text is kept only when include_creative is True
+
+    Columns named here but absent from a file are ignored by pandas.
+    """
+    dtype: Dict[str, str] = dict(EXPECTED_SCHEMA["read_dtypes"])
+    for col in EXPECTED_SCHEMA["dimension_columns"]:
+        dtype[col] = "category"
+    opts: Dict[str, Any] = {"dtype": dtype}
+
+    if prune:
+        keep = set(EXPECTED_SCHEMA["used_columns"]) | set(EXPECTED_SCHEMA["dimension_columns"])
+        if include_creative:
+            keep |= set(EXPECTED_SCHEMA["creative_columns"])
+        opts["usecols"] = sorted(keep)
+    return opts
+
+
 class SchemaValidationError(Exception):
     """Raised when schema validation fails."""
     pass
@@ -59,6 +118,17 @@ def _hash_schema(schema_dict: Dict[str, Any]) -> str:
     return hashlib.sha256(s.encode("utf-8")).hexdigest()
 
 
+def _stable_dtype(dtype: Any) -> str:
+    """
+    Dtype name as a plain (untyped) read would report it: the typed reader's 'category'
+    columns are fingerprinted by their values' dtype, so the fingerprint doesn't depend on the read mode.
+    """
+    if str(dtype) == "category":
+        categories = getattr(dtype, "categories", None)
+        return str(categories.dtype) if categories is not None else "object"
+    return str(dtype)
+
+
 def schema_from_frame_like(df_like: Any) -> Dict[str, Any]:
     """
     Create a minimal schema dict from a pandas-like object that has columns and dtypes.
@@ -67,7 +137,7 @@ def schema_from_frame_like(df_like: Any) -> Dict[str, Any]:
     # avoid importing pandas at module import time in case tests stub frames
     try:
         cols = list(df_like.columns)
-        dtypes = {c: str(df_like[c].dtype) for c in cols}
+        dtypes = {c: _stable_dtype(df_like[c].dtype) for c in cols}
     except Exception:
         # fallback: if it's already a dict-like (tests may pass simple dict)
         try:
@@ -0,0 +1,206 @@
+# File: src/utils/sketches.py
+# Mergeable, serializable sketches for streaming / partitioned aggregation.
+
+"""
+HyperLogLog distinct counter.
+
+Values are hashed with pandas' 64-bit hash (fixed key, so hashes are stable across
+processes and runs). The top `precision` bits pick a register and the register keeps
+the maximum leading-zero rank of the remaining bits. Memory is 2**precision bytes
+(4 KiB at the default precision 12) and the relative standard error is about
+1.04 / sqrt(2**precision) (~1.6% at 12). Two sketches with the same precision merge by
+element-wise max, so chunk / partition / worker sketches combine exactly.
+
+TDigest quantile sketch.
+
+Values are kept exactly until the digest holds more than `buffer_factor * compression`
+points (so short series answer percentiles exactly like np.percentile). Past that,
+points are clustered along the arcsine scale function, which keeps clusters small
+near the tails where percentiles such as p10/p90 are read, leaving about
+`compression` centroids. Digests merge by pooling centroids and re-clustering.
+"""
+from __future__ import annotations
+
+import base64
+from typing import Any, Dict, Sequence, Union
+import numpy as np
+import pandas as pd
+
+_HASH_BITS = 64
+
+
+def _normalize(values: Any) -> pd.Series:
+    """Drop nulls and give equal ids one representation (5 and 5.0 hash alike)."""
+    s = pd.Series(values)
+    if isinstance(s.dtype, pd.CategoricalDtype):
+        s = s.astype(object)
+    s = s.dropna()
+    if pd.api.types.is_float_dtype(s.dtype) and len(s) and bool((s % 1 == 0).all()):
+        s = s.astype("int64")
+    return s
+
+
+def _clz64(x: np.ndarray) -> np.ndarray:
+    """Leading-zero count of each uint64 (64 for zero)."""
+    x = x.astype(np.uint64, copy=True)
+    n = np.zeros(x.shape, dtype=np.int64)
+    for shift in (32, 16, 8, 4, 2, 1):
+        top_clear = x < (np.uint64(1) << np.uint64(_HASH_BITS - shift))
+        n += top_clear * shift
+        x = np.where(top_clear, x << np.uint64(shift), x)
+    return n + (x == 0)
+
+
+class HyperLogLog:
+    def __init__(self, precision: int = 12) -> None:
+        if not 4 <= int(precision) <= 18:
+            raise ValueError(f"HyperLogLog precision must be in [4, 18], got {precision}")
+        self.precision = int(precision)
+        self.registers = np.zeros(1 << self.precision, dtype=np.uint8)
+
+    @property
+    def m(self) -> int:
+        return int(self.registers.size)
+
+    def update(self, values: Any) -> "HyperLogLog":
+        """Add a batch of values (array / Series); nulls are ignored."""
+        s = _normalize(values)
+        if len(s) == 0:
+            return self
+        h = pd.util.hash_pandas_object(s, index=False).to_numpy(dtype=np.uint64)
+        p = np.uint64(self.precision)
+        idx = (h >> np.uint64(_HASH_BITS - self.precision)).astype(np.int64)
+        rest = h << p
+        rank = np.minimum(_clz64(rest) + 1, _HASH_BITS - self.precision + 1).astype(np.uint8)
+        np.maximum.at(self.registers, idx, rank)
+        return self
+
+    def merge(self, other: "HyperLogLog") -> "HyperLogLog":
+        if other.precision != self.precision:
+            raise ValueError(f"Cannot merge HyperLogLog sketches of precision {self.precision} and {other.precision}")
+        np.maximum(self.registers, other.registers, out=self.registers)
+        return self
+
+    def count(self) -> float:
+        """Estimated number of distinct values."""
+        m = self.m
+        alpha = {16: 0.673, 32: 0.697, 64: 0.709}.get(m, 0.7213 / (1 + 1.079 / m))
+        estimate = alpha * m * m / float(np.sum(np.exp2(-self.registers.astype(np.float64))))
+        zeros = int(np.count_nonzero(self.registers == 0))
+        if estimate <= 2.5 * m and zeros > 0:
+            # small-range correction (linear counting)
+            estimate = m * np.log(m / zeros)
+        return float(estimate)
+
+    def __len__(self) -> int:
+        return int(round(self.count()))
+
+    def to_state(self) -> Dict[str, Any]:
+        return {
+            "kind": "hll",
+            "precision": self.precision,
+            "registers": base64.b64encode(self.registers.tobytes()).decode("ascii"),
+        }
+
+    @classmethod
+    def from_state(cls, state: Dict[str, Any]) -> "HyperLogLog":
+        out = cls(precision=int(state["precision"]))
+        registers = np.frombuffer(base64.b64decode(state["registers"]), dtype=np.uint8)
+        if registers.size != out.m:
+            raise ValueError("HyperLogLog state does not match its precision")
+        out.registers = registers.copy()
+        return out
+
+
+class TDigest:
+    def __init__(self, compression: int = 100, buffer_factor: int = 5) -> None:
+        self.compression = max(10, int(compression))
+        self.buffer_factor = max(1, int(buffer_factor))
+        self.means = np.zeros(0, dtype=np.float64)
+        self.weights = np.zeros(0, dtype=np.float64)
+        self.min = np.inf
+        self.max = -np.inf
+
+    @property
+    def count(self) -> float:
+        return float(self.weights.sum())
+
+    @property
+    def exact(self) -> bool:
+        """True while every point is its own unit-weight centroid."""
+        return bool(np.all(self.weights == 1.0))
+
+    def _add(self, means: np.ndarray, weights: np.ndarray) -> "TDigest":
+        keep = np.isfinite(means) & (weights > 0)
+        means, weights = means[keep], weights[keep]
+        if means.size == 0:
+            return self
+        self.min = min(self.min, float(means.min()))
+        self.max = max(self.max, float(means.max()))
+        self.means = np.concatenate([self.means, means])
+        self.weights = np.concatenate([self.weights, weights])
+        if self.means.size > self.buffer_factor * self.compression:
+            self._compress()
+        return self
+
+    def update(self, values: Any) -> "TDigest":
+        """Add a batch of values; NaN / inf are ignored."""
+        v = np.asarray(values, dtype=np.float64).ravel()
+        return self._add(v, np.ones_like(v))
+
+    def merge(self, other: "TDigest") -> "TDigest":
+        return self._add(other.means.copy(), other.weights.copy())
+
+    def _compress(self) -> None:
+        order = np.argsort(self.means, kind="stable")
+        means, weights = self.means[order], self.weights[order]
+        total = weights.sum()
+        q = (np.cumsum(weights) - weights / 2.0) / total
+        # arcsine scale: unit steps in k are narrow in q near 0 and 1
+        k = self.compression / np.pi * np.arcsin(np.clip(2.0 * q - 1.0, -1.0, 1.0))
+        cluster = np.floor(k).astype(np.int64)
+        cluster -= cluster.min()
+        w = np.bincount(cluster, weights=weights)
+        m = np.bincount(cluster, weights=weights * means)
+        nonzero = w > 0
+        self.weights = w[nonzero]
+        self.means = m[nonzero] / self.weights
+
+    def quantile(self, q: Union[float, Sequence[float]]) -> Union[float, np.ndarray]:
+        """Value at quantile q in [0, 1] (scalar or array); NaN for an empty digest."""
+        qs = np.clip(np.asarray(q, dtype=np.float64), 0.0, 1.0)
+        if self.means.size == 0:
+            out = np.full(qs.shape, np.nan)
+        elif self.exact:
+            out = np.percentile(self.means, qs * 100.0)
+        else:
+            order = np.argsort(self.means, kind="stable")
+            means, weights = self.means[order], self.weights[order]
+            centers = np.cumsum(weights) - weights / 2.0
+            xs = np.concatenate([[0.0], centers, [weights.sum()]])
+            ys = np.concatenate([[self.min], means, [self.max]])
+            out = np.interp(qs * weights.sum(), xs, ys)
+        return float(out) if np.ndim(out) == 0 else out
+
+    def mean(self) -> float:
+        return float(np.dot(self.means, self.weights) / self.weights.sum()) if self.weights.size else float("nan")
+
+    def to_state(self) -> Dict[str, Any]:
+        return {
+            "kind": "tdigest",
+            "compression": self.compression,
+            "buffer_factor": self.buffer_factor,
+            "means": self.means.tolist(),
+            "weights": self.weights.tolist(),
+            "min": None if not np.isfinite(self.min) else self.min,
+            "max": None if not np.isfinite(self.max) else self.max,
+        }
+
+    @classmethod
+    def from_state(cls, state: Dict[str, Any]) -> "TDigest":
+        out = cls(compression=state.get("compression", 100), buffer_factor=state.get("buffer_factor", 5))
+        out.means = np.asarray(state.get("means") or [], dtype=np.float64)
+        out.weights = np.asarray(state.get("weights") or [], dtype=np.float64)
+        out.min = np.inf if state.get("min") is None else float(state["min"])
+        out.max = -np.inf if state.get("max") is None else float(state["max"])
+        return out
@@ -2,22 +2,32 @@
 # Dynamic thresholds wrapper and legacy helpers (kept for compatibility).
 
 from __future__ import annotations
-from typing import Any, Dict
+import copy
+import hashlib
+import json
+import os
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Union
 import pandas as pd
 import numpy as np
 
+from src.utils.aggregates import MEASURE_COLS, DailyAggregate, as_daily_aggregate
+from src.utils.metrics import timed
 
-def _safe_date_index(df: pd.DataFrame, date_col: str = "date") -> pd.DataFrame:
-    if date_col in df.columns:
-        df = df.copy()
-        df[date_col] = pd.to_datetime(df[date_col], errors="coerce")
-        df = df.dropna(subset=[date_col])
-        df = df.sort_values(date_col)
-    return df
+# in-process memo of compute_dynamic_thresholds results, keyed by data fingerprint + params
+_THRESHOLD_CACHE: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+_THRESHOLD_CACHE_SIZE = 128
+
+
+def _window_mask(days: np.ndarray, window_days: int) -> np.ndarray:
+    """Mask selecting the trailing `window_days` calendar days ending at the last valid day."""
+    if len(days) <= window_days:
+        return np.ones(len(days), dtype=bool)
+    return days > days.max() - window_days
 
 
 def compute_global_ctr_baseline(
-    df: pd.DataFrame,
+    df: Union[pd.DataFrame, DailyAggregate],
     date_col: str = "date",
     impressions_col: str = "impressions",
     clicks_col: str = "clicks",
@@ -27,23 +37,25 @@ def compute_global_ctr_baseline(
 ) -> Dict[str, Any]:
     """
     Compute CTR baseline and a conservative low-CTR threshold.
+
+    Accepts a raw frame or a prebuilt DailyAggregate.
     """
-    df = _safe_date_index(df)
-    if date_col not in df.columns or impressions_col not in df.columns or clicks_col not in df.columns:
+    daily = as_daily_aggregate(df, date_col, {"impressions": impressions_col, "clicks": clicks_col})
+    if not daily.has("impressions", "clicks"):
         return {"baseline_ctr": 0.0, "ctr_std": 0.0, "ctr_low_threshold": 0.01, "rows_used": 0}
 
-    daily = (
-        df.groupby(pd.Grouper(key=date_col, freq="D"))
-        .agg({impressions_col: "sum", clicks_col: "sum"})
-        .reset_index()
-    )
-    daily["ctr"] = daily[clicks_col] / daily[impressions_col].replace(0, np.nan)
-    daily = daily.dropna(subset=["ctr"])
-    rows_used = len(daily)
+    impressions = daily.column("impressions")
+    clicks = daily.column("clicks")
+    with np.errstate(divide="ignore", invalid="ignore"):
+        ctr = clicks / np.where(impressions == 0, np.nan, impressions)
+    valid = ~np.isnan(ctr)
+    ctr = ctr[valid]
+    days = np.arange(daily.n_days)[valid]
+    rows_used = len(ctr)
 
     if rows_used < min_days:
-        agg_impr = int(df[impressions_col].sum()) if impressions_col in df.columns else 0
-        agg_clicks = int(df[clicks_col].sum()) if clicks_col in df.columns else 0
+        agg_impr = int(impressions.sum())
+        agg_clicks = int(clicks.sum())
         baseline = float(agg_clicks / agg_impr) if agg_impr > 0 else 0.0
         return {
             "baseline_ctr": baseline,
@@ -52,10 +64,9 @@ def compute_global_ctr_baseline(
             "rows_used": rows_used,
         }
 
-    last_cut = daily[date_col].max() - pd.Timedelta(days=window_days)
-    window = daily[daily[date_col] > last_cut] if rows_used > window_days else daily
-    baseline = float(window["ctr"].mean())
-    std = float(window["ctr"].std(ddof=0) if len(window) > 1 else 0.0)
+    window = ctr[_window_mask(days, window_days)]
+    baseline = float(window.mean())
+    std = float(window.std() if len(window) > 1 else 0.0)
     threshold = baseline - z_score * std
     threshold = max(threshold, max(1e-6, baseline * 0.3))
     return {
@@ -67,7 +78,7 @@ def compute_global_ctr_baseline(
 
 
 def compute_roas_drop_threshold(
-    df: pd.DataFrame,
+    df: Union[pd.DataFrame, DailyAggregate],
     date_col: str = "date",
     revenue_col: str = "revenue",
     spend_col: str = "spend",
@@ -78,32 +89,32 @@ def compute_roas_drop_threshold(
 ) -> Dict[str, Any]:
     """
     Compute a dynamic ROAS drop threshold from historical day-over-day drops.
+
+    Accepts a raw frame or a prebuilt DailyAggregate.
     """
-    df = _safe_date_index(df)
-    if date_col not in df.columns or revenue_col not in df.columns or spend_col not in df.columns:
+    daily = as_daily_aggregate(df, date_col, {"revenue": revenue_col, "spend": spend_col})
+    if not daily.has("revenue", "spend"):
         return {"median_drop": 0.0, "drop_std": 0.0, "roas_drop_threshold": min_threshold, "rows_used": 0}
 
-    daily = (
-        df.groupby(pd.Grouper(key=date_col, freq="D"))
-        .agg({revenue_col: "sum", spend_col: "sum"})
-        .reset_index()
-    )
-    daily["roas"] = daily[revenue_col] / daily[spend_col].replace(0, np.nan)
-    daily = daily.dropna(subset=["roas"])
-    rows_used = len(daily)
+    spend = daily.column("spend")
+    with np.errstate(divide="ignore", invalid="ignore"):
+        roas = daily.column("revenue") / np.where(spend == 0, np.nan, spend)
+    roas = roas[~np.isnan(roas)]
+    rows_used = len(roas)
 
     if rows_used < min_days:
         return {"median_drop": 0.0, "drop_std": 0.0, "roas_drop_threshold": min_threshold, "rows_used": rows_used}
 
-    roas = daily["roas"].astype(float).reset_index(drop=True)
-    prev = roas.shift(1)
-    drops = ((prev - roas) / prev.replace(0, np.nan)).dropna()
+    prev = roas[:-1]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        drops = (prev - roas[1:]) / np.where(prev == 0, np.nan, prev)
+    drops = drops[~np.isnan(drops)]
     drops = drops[drops > 0]
-    if drops.empty:
+    if len(drops) == 0:
         return {"median_drop": 0.0, "drop_std": 0.0, "roas_drop_threshold": min_threshold, "rows_used": rows_used}
 
-    median_drop = float(drops.median())
-    drop_std = float(drops.std(ddof=0) if len(drops) > 1 else 0.0)
+    median_drop = float(np.median(drops))
+    drop_std = float(drops.std() if len(drops) > 1 else 0.0)
     threshold = median_drop + z_score * drop_std
     threshold = max(threshold, min_threshold)
     return {
@@ -114,17 +125,81 @@ def compute_roas_drop_threshold(
     }
 
 
+def data_fingerprint(df: Union[pd.DataFrame, DailyAggregate], date_col: str = "date") -> str:
+    """
+    Content hash of the inputs the thresholds read.
+
+    A DailyAggregate is hashed from its (small) value block. A raw frame is hashed from
+    the date and measure columns with pandas' vectorized row hash, which is much cheaper
+    than parsing dates and grouping by day.
+    """
+    h = hashlib.blake2b(digest_size=16)
+    if isinstance(df, DailyAggregate):
+        h.update(b"daily")
+        h.update(str(df.start).encode())
+        h.update(",".join(df.present).encode())
+        h.update(np.ascontiguousarray(df.values).tobytes())
+        return h.hexdigest()
+    cols = [c for c in [date_col] + MEASURE_COLS if c in df.columns]
+    h.update(b"frame")
+    h.update(",".join(cols).encode())
+    h.update(str(len(df)).encode())
+    if cols and len(df):
+        h.update(pd.util.hash_pandas_object(df[cols], index=False).to_numpy().tobytes())
+    return h.hexdigest()
+
+
+def clear_threshold_cache() -> None:
+    _THRESHOLD_CACHE.clear()
+
+
+def _threshold_key(fingerprint: str, params: Dict[str, Any]) -> str:
+    s = json.dumps({"data": fingerprint, "params": params}, sort_keys=True)
+    return hashlib.sha256(s.encode("utf-8")).hexdigest()[:32]
+
+
+def _cache_put(key: str, value: Dict[str, Any]) -> None:
+    _THRESHOLD_CACHE[key] = copy.deepcopy(value)
+    _THRESHOLD_CACHE.move_to_end(key)
+    while len(_THRESHOLD_CACHE) > _THRESHOLD_CACHE_SIZE:
+        _THRESHOLD_CACHE.popitem(last=False)
+
+
+@timed("compute_dynamic_thresholds")
 def compute_dynamic_thresholds(
-    df: pd.DataFrame,
+    df: Union[pd.DataFrame, DailyAggregate],
     *,
     window_days: int = 30,
     min_days: int = 7,
     ctr_z: float = 1.5,
     roas_z: float = 1.0,
+    cache: bool = True,
+    cache_dir: Optional[str] = None,
 ) -> Dict[str, Any]:
     """
     Convenience wrapper returning both CTR and ROAS dynamic thresholds.
+
+    The frame is aggregated by day once and shared by both computations. Results are
+    memoized in-process (and under cache_dir as JSON, if given) keyed by the data
+    fingerprint and (window_days, min_days, ctr_z, roas_z); callers get a copy.
     """
+    params = {"window_days": window_days, "min_days": min_days, "ctr_z": ctr_z, "roas_z": roas_z}
+    key = None
+    if cache:
+        key = _threshold_key(data_fingerprint(df), params)
+        if key in _THRESHOLD_CACHE:
+            _THRESHOLD_CACHE.move_to_end(key)
+            return copy.deepcopy(_THRESHOLD_CACHE[key])
+        if cache_dir:
+            try:
+                with open(os.path.join(cache_dir, f"{key}.json"), "r", encoding="utf-8") as f:
+                    out = json.load(f)
+                _cache_put(key, out)
+                return out
+            except (OSError, ValueError):
+                pass
+
+    df = as_daily_aggregate(df)
     ctr = compute_global_ctr_baseline(df, window_days=window_days, min_days=min_days, z_score=ctr_z)
     roas = compute_roas_drop_threshold(df, window_days=window_days, min_days=min_days, z_score=roas_z)
     out = {
@@ -134,4 +209,181 @@ def compute_dynamic_thresholds(
         "roas_drop_threshold": roas["roas_drop_threshold"],
         "rows_used": max(ctr["rows_used"], roas["rows_used"]),
     }
+
+    if key is not None:
+        _cache_put(key, out)
+        if cache_dir:
+            try:
+                os.makedirs(cache_dir, exist_ok=True)
+                tmp = os.path.join(cache_dir, f"{key}.json.tmp-{os.getpid()}")
+                with open(tmp, "w", encoding="utf-8") as f:
+                    json.dump(out, f)
+                os.replace(tmp, os.path.join(cache_dir, f"{key}.json"))
+            except OSError:
+                pass
     return out
+
+
+SEGMENT_THRESHOLD_COLUMNS = [
+    "baseline_ctr", "ctr_std", "ctr_low_threshold", "ctr_rows_used", "last_ctr", "ctr_alert",
+    "median_drop", "drop_std", "roas_drop_threshold", "roas_rows_used", "last_roas_drop", "roas_alert",
+    "spend",
+]
+
+
+def _segment_cells(data: Any, segment_col: str, date_col: str = "date"):
+    """
+    Sparse (segment x day) sums sorted by segment, then day.
+
+    Accepts a raw frame or a RollupCube with segment_col as a dimension. Days with no
+    rows for a segment are simply absent (they would have zero impressions/spend and
+    be skipped as invalid days anyway). Returns (labels, seg, day, values, present).
+    """
+    if hasattr(data, "codes") and hasattr(data, "dims"):
+        if segment_col not in data.dims:
+            raise KeyError(f"Unknown cube dimension: {segment_col}")
+        labels = np.asarray(data.levels[segment_col], dtype=object)
+        block = pd.DataFrame(data.values, columns=MEASURE_COLS)
+        block["__seg"] = data.codes[:, data.dims.index(segment_col)]
+        block["__day"] = data.day.astype(np.int64)
+        present = data.present
+    else:
+        if segment_col not in data.columns or date_col not in data.columns:
+            raise KeyError(f"Segment thresholds need '{segment_col}' and '{date_col}' columns")
+        dates = data[date_col]
+        if not pd.api.types.is_datetime64_any_dtype(dates):
+            dates = pd.to_datetime(dates, errors="coerce")
+        days = dates.to_numpy(dtype="datetime64[ns]").astype("datetime64[D]")
+        codes, labels = pd.factorize(data[segment_col], sort=True)
+        labels = np.asarray(labels, dtype=object)
+        present = tuple(m for m in MEASURE_COLS if m in data.columns)
+        block = pd.DataFrame({m: data[m].to_numpy(dtype="float64", na_value=np.nan) if m in present
+                              else np.zeros(len(data)) for m in MEASURE_COLS})
+        block["__seg"] = codes
+        block["__day"] = days.astype(np.int64)  # days since epoch; NaT becomes int64 min
+        block = block[~np.isnat(days)]
+    block = block[block["__seg"].to_numpy() >= 0]
+    cells = block.groupby(["__seg", "__day"], sort=True)[MEASURE_COLS].sum()
+    seg = cells.index.get_level_values(0).to_numpy(dtype=np.int64)
+    day = cells.index.get_level_values(1).to_numpy(dtype=np.int64)
+    return labels, seg, day, cells.to_numpy(dtype="float64"), present
+
+
+def _grouped_moments(seg: np.ndarray, x: np.ndarray, n: int):
+    """Per-segment count, mean and population std of x (two-pass, so no cancellation)."""
+    cnt = np.bincount(seg, minlength=n).astype(np.float64)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        mean = np.bincount(seg, weights=x, minlength=n) / cnt
+        dev = x - mean[seg]
+        var = np.bincount(seg, weights=dev * dev, minlength=n) / cnt
+    std = np.where(cnt > 1, np.sqrt(var), 0.0)
+    return cnt, mean, std
+
+
+def _last_per_segment(seg: np.ndarray, n: int) -> np.ndarray:
+    """Index of the last element of each segment in a segment-sorted array (-1 if absent)."""
+    last = np.full(n, -1, dtype=np.int64)
+    if len(seg):
+        ends = np.flatnonzero(np.append(seg[1:] != seg[:-1], True))
+        last[seg[ends]] = ends
+    return last
+
+
+def compute_segment_thresholds(
+    data: Any,
+    segment_col: str = "campaign_name",
+    *,
+    date_col: str = "date",
+    window_days: int = 30,
+    min_days: int = 7,
+    ctr_z: float = 1.5,
+    roas_z: float = 1.0,
+    min_threshold: float = 0.08,
+) -> pd.DataFrame:
+    """
+    Per-segment CTR baselines and ROAS drop thresholds for every segment at once.
+
+    Same rules as compute_global_ctr_baseline / compute_roas_drop_threshold, applied to
+    each segment's own daily series. Everything works on the segment-sorted sparse
+    (segment x day) cells with bincount / lexsort, so there is no per-segment Python
+    loop. Also reports each segment's latest CTR and day-over-day ROAS drop and flags
+    (ctr_alert / roas_alert) segments past their own threshold once they have
+    min_days of history. `data` is a raw frame or a RollupCube; returns one row per
+    segment (index named segment_col, columns SEGMENT_THRESHOLD_COLUMNS).
+    """
+    labels, seg, day, values, present = _segment_cells(data, segment_col, date_col)
+    n = len(labels)
+    impressions, clicks, revenue, spend = (values[:, MEASURE_COLS.index(m)] for m in
+                                           ("impressions", "clicks", "revenue", "spend"))
+    out = pd.DataFrame(index=pd.Index(labels, name=segment_col))
+    out["spend"] = np.bincount(seg, weights=spend, minlength=n)
+
+    # --- CTR baseline per segment ---
+    if "impressions" in present and "clicks" in present:
+        valid = impressions > 0
+        v_seg, v_day = seg[valid], day[valid]
+        ctr = clicks[valid] / impressions[valid]
+        rows_used = np.bincount(v_seg, minlength=n)
+        last = _last_per_segment(v_seg, n)
+        last_day = np.where(last >= 0, v_day[last] if len(v_day) else 0, 0)
+        last_ctr = np.where(last >= 0, ctr[last] if len(ctr) else 0.0, 0.0)
+        in_window = (rows_used[v_seg] <= window_days) | (v_day > last_day[v_seg] - window_days)
+        _, mean, std = _grouped_moments(v_seg[in_window], ctr[in_window], n)
+        threshold = np.maximum(mean - ctr_z * std, np.maximum(1e-6, mean * 0.3))
+
+        tot_impr = np.bincount(seg, weights=impressions, minlength=n)
+        tot_clicks = np.bincount(seg, weights=clicks, minlength=n)
+        agg = np.where(tot_impr > 0, tot_clicks / np.where(tot_impr > 0, tot_impr, 1.0), 0.0)
+        short = rows_used < min_days
+        out["baseline_ctr"] = np.where(short, agg, mean)
+        out["ctr_std"] = np.where(short, 0.0, std)
+        out["ctr_low_threshold"] = np.where(short, np.maximum(1e-6, agg * 0.5), threshold)
+        out["ctr_rows_used"] = rows_used
+        out["last_ctr"] = last_ctr
+        out["ctr_alert"] = ~short & (last_ctr < out["ctr_low_threshold"].to_numpy())
+    else:
+        out["baseline_ctr"], out["ctr_std"], out["ctr_low_threshold"] = 0.0, 0.0, 0.01
+        out["ctr_rows_used"], out["last_ctr"], out["ctr_alert"] = 0, 0.0, False
+
+    # --- ROAS drop threshold per segment ---
+    if "revenue" in present and "spend" in present:
+        valid = spend > 0
+        r_seg = seg[valid]
+        roas = revenue[valid] / spend[valid]
+        rows_used = np.bincount(r_seg, minlength=n)
+        same = r_seg[1:] == r_seg[:-1]
+        prev = roas[:-1]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            drops = (prev - roas[1:]) / np.where(prev == 0, np.nan, prev)
+        d_seg = r_seg[1:]
+        # latest day-over-day change per segment (negative = ROAS went up)
+        pairs = same & ~np.isnan(drops)
+        last = _last_per_segment(d_seg[pairs], n)
+        last_drop = np.where(last >= 0, drops[pairs][last] if pairs.any() else 0.0, 0.0)
+
+        keep = pairs & (drops > 0)
+        d_seg, drops = d_seg[keep], drops[keep]
+        order = np.lexsort((drops, d_seg))
+        d_seg, drops = d_seg[order], drops[order]
+        cnt, _, std = _grouped_moments(d_seg, drops, n)
+        cnt = cnt.astype(np.int64)
+        first = np.cumsum(cnt) - cnt
+        has = cnt > 0
+        median = np.zeros(n)
+        lo = first[has] + (cnt[has] - 1) // 2
+        hi = first[has] + cnt[has] // 2
+        median[has] = (drops[lo] + drops[hi]) / 2.0
+
+        active = (rows_used >= min_days) & has
+        out["median_drop"] = np.where(active, median, 0.0)
+        out["drop_std"] = np.where(active, std, 0.0)
+        out["roas_drop_threshold"] = np.where(active, np.maximum(median + roas_z * std, min_threshold),
+                                              min_threshold)
+        out["roas_rows_used"] = rows_used
+        out["last_roas_drop"] = last_drop
+        out["roas_alert"] = (rows_used >= min_days) & (last_drop > out["roas_drop_threshold"].to_numpy())
+    else:
+        out["median_drop"], out["drop_std"], out["roas_drop_threshold"] = 0.0, 0.0, min_threshold
+        out["roas_rows_used"], out["last_roas_drop"], out["roas_alert"] = 0, 0.0, False
+
+    return out[SEGMENT_THRESHOLD_COLUMNS]
@@ -0,0 +1,171 @@
+# File: src/utils/tracing.py
+# Span-based stage tracing with Chrome trace-event export.
+
+"""
+Usage:
+
+    tracer = start_trace("run")
+    with span("summarize", rows=len(df)) as sp:
+        ...
+        sp.set(bytes=nbytes)
+    tracer.finish()
+    tracer.write_chrome_trace("logs/observability/chrome_trace.json")
+
+Spans are timed with time.perf_counter_ns and nest per thread (a span opened inside
+another is its child). The export is the Chrome trace-event format: one complete ("X")
+event per span, which chrome://tracing, Perfetto and speedscope open directly.
+
+Hooks added with Tracer.add_hook (e.g. the memory profiler in src/utils/memprof.py) run
+at every span start and end and may add span attributes.
+"""
+from __future__ import annotations
+
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional
+
+
+class Span:
+    __slots__ = ("name", "args", "depth", "tid", "start_ns", "end_ns")
+
+    def __init__(self, name: str, args: Dict[str, Any], depth: int, tid: int):
+        self.name = name
+        self.args = args
+        self.depth = depth
+        self.tid = tid
+        self.start_ns = time.perf_counter_ns()
+        self.end_ns: Optional[int] = None
+
+    def set(self, **args: Any) -> "Span":
+        """Attach attributes (rows, bytes, ...) to the span."""
+        self.args.update(args)
+        return self
+
+    @property
+    def duration_ms(self) -> float:
+        end = self.end_ns if self.end_ns is not None else time.perf_counter_ns()
+        return (end - self.start_ns) / 1e6
+
+
+class Tracer:
+    """Collects finished spans of one run."""
+
+    def __init__(self, name: str = "run", **args: Any):
+        self.name = name
+        self.args = dict(args)
+        self.pid = os.getpid()
+        self.start_ns = time.perf_counter_ns()
+        self.end_ns: Optional[int] = None
+        self.spans: List[Span] = []
+        self.hooks: List[Any] = []
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def add_hook(self, hook: Any) -> None:
+        """Register an object with on_start(span) / on_end(span), called around every span."""
+        self.hooks.append(hook)
+
+    def _call_hooks(self, method: str, sp: Span) -> None:
+        for hook in self.hooks:
+            try:
+                getattr(hook, method)(sp)
+            except Exception as e:
+                sp.args.setdefault("hook_errors", []).append(f"{type(hook).__name__}.{method}: {e}")
+
+    def _stack(self) -> List[Span]:
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    @contextmanager
+    def span(self, name: str, **args: Any) -> Iterator[Span]:
+        stack = self._stack()
+        sp = Span(name, dict(args), len(stack), threading.get_ident())
+        stack.append(sp)
+        if self.hooks:
+            self._call_hooks("on_start", sp)
+        try:
+            yield sp
+        except BaseException as e:
+            sp.args["error"] = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            sp.end_ns = time.perf_counter_ns()
+            if self.hooks:
+                self._call_hooks("on_end", sp)
+            stack.pop()
+            with self._lock:
+                self.spans.append(sp)
+
+    def finish(self) -> "Tracer":
+        self.end_ns = time.perf_counter_ns()
+        return self
+
+    def elapsed_ms(self) -> float:
+        end = self.end_ns if self.end_ns is not None else time.perf_counter_ns()
+        return (end - self.start_ns) / 1e6
+
+    def stage_ms(self) -> Dict[str, float]:
+        """Milliseconds per top-level span name (repeated stages are summed)."""
+        out: Dict[str, float] = {}
+        for sp in sorted(self.spans, key=lambda s: s.start_ns):
+            if sp.depth == 0:
+                out[sp.name] = round(out.get(sp.name, 0.0) + sp.duration_ms, 3)
+        return out
+
+    def to_chrome(self) -> Dict[str, Any]:
+        """Chrome trace-event JSON (timestamps in microseconds since the trace started)."""
+        main_tid = threading.main_thread().ident or 0
+
+        def event(name: str, start_ns: int, end_ns: int, tid: int, args: Dict[str, Any]) -> Dict[str, Any]:
+            return {
+                "name": name,
+                "cat": "stage",
+                "ph": "X",
+                "ts": (start_ns - self.start_ns) / 1e3,
+                "dur": (end_ns - start_ns) / 1e3,
+                "pid": self.pid,
+                "tid": tid,
+                "args": args,
+            }
+
+        events: List[Dict[str, Any]] = [
+            {"name": "process_name", "ph": "M", "pid": self.pid, "tid": main_tid, "args": {"name": self.name}},
+        ]
+        if self.end_ns is not None:
+            events.append(event(self.name, self.start_ns, self.end_ns, main_tid, self.args))
+        with self._lock:
+            spans = sorted(self.spans, key=lambda s: (s.start_ns, s.depth))
+        events.extend(event(sp.name, sp.start_ns, sp.end_ns or sp.start_ns, sp.tid, sp.args) for sp in spans)
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def write_chrome_trace(self, path: str) -> str:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp = f"{path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as fh:
+            json.dump(self.to_chrome(), fh, default=str)
+        os.replace(tmp, path)
+        return path
+
+
+_TRACER = Tracer()
+
+
+def start_trace(name: str = "run", **args: Any) -> Tracer:
+    """Start a new trace; span() records into it from now on."""
+    global _TRACER
+    _TRACER = Tracer(name, **args)
+    return _TRACER
+
+
+def get_tracer() -> Tracer:
+    return _TRACER
+
+
+def span(name: str, **args: Any):
+    """Time a block as a span of the current trace: `with span("load", rows=n) as sp: ...`."""
+    return _TRACER.span(name, **args)
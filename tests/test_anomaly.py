@@ -0,0 +1,76 @@
+import pandas as pd
+
+from src.agents.insight_agent import generate_insights
+from src.utils.anomaly import scan_segment_anomalies
+from src.utils.cube import RollupCube
+
+
+def make_segments_df(n_campaigns=6, days=20):
+    rows = []
+    for c in range(n_campaigns):
+        for d, date in enumerate(pd.date_range("2025-01-01", periods=days, freq="D")):
+            clicks = 20 + (d % 3)
+            revenue = 300.0 + (d % 4) * 5
+            # campaign C2 on mobile collapses on the last day
+            if c == 2 and d == days - 1:
+                clicks, revenue = 4, 60.0
+            for platform in ("mobile", "desktop"):
+                drop = c == 2 and platform == "mobile"
+                rows.append({
+                    "date": date,
+                    "campaign_name": f"C{c}",
+                    "platform": platform,
+                    "impressions": 1000,
+                    "clicks": clicks if drop else 20 + (d % 3),
+                    "spend": 100.0,
+                    "revenue": revenue if drop else 300.0 + (d % 4) * 5,
+                })
+    return pd.DataFrame(rows)
+
+
+def test_scan_finds_dropping_segment_first():
+    df = make_segments_df()
+    found = scan_segment_anomalies(df, ["campaign_name", "platform"], window_days=14, min_days=5, min_z=2.0)
+    assert found
+    assert all(a["segment"] == {"campaign_name": "C2", "platform": "mobile"} for a in found)
+    assert {a["metric"] for a in found} == {"ctr", "roas"}
+    top = found[0]
+    assert top["z_score"] < -2.0
+    assert top["delta_pct"] < -0.5
+    assert top["baseline_days"] == 14
+    assert top["latest_date"].startswith("2025-01-20")
+
+
+def test_scan_cube_matches_frame_and_respects_top_n():
+    df = make_segments_df()
+    dims = ["campaign_name", "platform"]
+    cube = RollupCube.from_frame(df, dims=dims)
+    from_frame = scan_segment_anomalies(df, dims, direction="both")
+    from_cube = scan_segment_anomalies(cube, dims, direction="both")
+    assert from_frame == from_cube
+    assert len(scan_segment_anomalies(cube, dims, direction="both", top_n=1)) == 1
+    # unknown dims are skipped, too few baseline days scores nothing
+    assert scan_segment_anomalies(cube, ["missing"]) == []
+    assert scan_segment_anomalies(cube, dims, min_days=30) == []
+
+
+def test_scan_anchors_on_latest_day_in_data():
+    df = make_segments_df()
+    # C2/mobile stops reporting five days early, right after its collapse
+    last = df["date"].max()
+    stale = (df["campaign_name"] == "C2") & (df["platform"] == "mobile")
+    df = df[~stale | (df["date"] <= last - pd.Timedelta(days=5))].copy()
+    df.loc[stale & (df["date"] == last - pd.Timedelta(days=5)), ["clicks", "revenue"]] = [4, 60.0]
+    found = scan_segment_anomalies(df, ["campaign_name", "platform"], direction="both")
+    assert found
+    assert all(a["segment"] != {"campaign_name": "C2", "platform": "mobile"} for a in found)
+    assert all(a["latest_date"].startswith("2025-01-20") for a in found)
+
+
+def test_segment_anomalies_become_hypotheses(tmp_path):
+    found = scan_segment_anomalies(make_segments_df(), ["campaign_name", "platform"], min_z=2.0)
+    hyps = generate_insights({}, {}, segment_anomalies=found, base_dir=str(tmp_path))
+    seg = [h for h in hyps if h.get("segment")]
+    assert len(seg) == len(found)
+    assert seg[0]["segment"]["campaign_name"] == "C2"
+    assert seg[0]["evidence_hint"][f"{found[0]['metric']}_delta_pct"] < 0
@@ -0,0 +1,58 @@
+import numpy as np
+import pandas as pd
+
+from src.utils.aggregates import DailyAggregate
+from src.utils.backfill import BACKFILL_COLUMNS, backfill_thresholds
+from src.utils.thresholds import compute_global_ctr_baseline, compute_roas_drop_threshold
+
+
+def make_history(days=60, seed=3):
+    rng = np.random.default_rng(seed)
+    dates = pd.date_range("2025-01-01", periods=days, freq="D")
+    df = pd.DataFrame({
+        "date": dates,
+        "impressions": rng.integers(500, 1500, days),
+        "clicks": rng.integers(5, 40, days),
+        "spend": rng.uniform(50, 150, days).round(2),
+        "revenue": rng.uniform(100, 400, days).round(2),
+    })
+    # a zero-impression day, a zero-spend day and a gap in the calendar
+    df.loc[10, "impressions"] = 0
+    df.loc[20, "spend"] = 0.0
+    return df.drop(index=[30, 31]).reset_index(drop=True)
+
+
+def test_backfill_matches_as_of_day_thresholds():
+    daily = DailyAggregate.from_frame(make_history())
+    out = backfill_thresholds(daily, window_days=14, min_days=5, ctr_z=1.5, roas_z=1.0)
+    assert list(out.columns) == BACKFILL_COLUMNS
+    assert len(out) == daily.n_days
+    assert out.index[0] == pd.Timestamp("2025-01-01")
+
+    for d in range(daily.n_days):
+        upto = DailyAggregate(daily.start, daily.values[:d + 1], daily.present)
+        ctr = compute_global_ctr_baseline(upto, window_days=14, min_days=5, z_score=1.5)
+        roas = compute_roas_drop_threshold(upto, window_days=14, min_days=5, z_score=1.0)
+        row = out.iloc[d]
+        assert row["ctr_rows_used"] == ctr["rows_used"]
+        assert row["roas_rows_used"] == roas["rows_used"]
+        np.testing.assert_allclose(row["baseline_ctr"], ctr["baseline_ctr"], rtol=1e-9)
+        np.testing.assert_allclose(row["ctr_std"], ctr["ctr_std"], rtol=1e-6, atol=1e-12)
+        np.testing.assert_allclose(row["ctr_low_threshold"], ctr["ctr_low_threshold"], rtol=1e-9)
+        roas_days = upto.column("spend") > 0
+        daily_roas = (upto.column("revenue")[roas_days] / upto.column("spend")[roas_days])
+        day_idx = np.flatnonzero(roas_days)
+        if len(day_idx) > 14:
+            daily_roas = daily_roas[day_idx > day_idx.max() - 14]
+        np.testing.assert_allclose(row["baseline_roas"], daily_roas.mean() if len(daily_roas) else 0.0, rtol=1e-9)
+        np.testing.assert_allclose(row["median_drop"], roas["median_drop"], rtol=1e-12)
+        np.testing.assert_allclose(row["drop_std"], roas["drop_std"], rtol=1e-6, atol=1e-12)
+        np.testing.assert_allclose(row["roas_drop_threshold"], roas["roas_drop_threshold"], rtol=1e-9)
+
+
+def test_backfill_handles_frames_without_measures():
+    df = pd.DataFrame({"date": pd.date_range("2025-01-01", periods=3), "impressions": [1, 2, 3]})
+    out = backfill_thresholds(df)
+    assert (out["ctr_low_threshold"] == 0.01).all()
+    assert (out["roas_drop_threshold"] == 0.08).all()
+    assert backfill_thresholds(pd.DataFrame({"clicks": [1]})).empty
@@ -0,0 +1,84 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.agents.evaluator import validate
+from src.agents.insight_agent import generate_insights
+from src.orchestrator.backtest import backtest, main, replay, replay_inputs
+from src.utils.aggregates import DailyAggregate
+from src.utils.thresholds import compute_dynamic_thresholds
+
+
+@pytest.fixture(scope="module")
+def daily():
+    return DailyAggregate.from_frame(pd.read_csv("data/sample_fb_ads.csv", parse_dates=["date"]))
+
+
+def test_replay_thresholds_match_as_of_day_pipeline(daily):
+    inputs = replay_inputs(daily, window_days=14, min_days=5)
+    days = replay(inputs, {"ctr_z": 2.0, "roas_z": 0.5})
+    assert len(days) == daily.n_days
+    for d in (3, 20, daily.n_days - 1):
+        upto = DailyAggregate(daily.start, daily.values[:d + 1], daily.present)
+        want = compute_dynamic_thresholds(upto, window_days=14, min_days=5, ctr_z=2.0, roas_z=0.5, cache=False)
+        assert days["ctr_low_threshold"].iloc[d] == pytest.approx(want["ctr_low_threshold"])
+        assert days["roas_drop_threshold"].iloc[d] == pytest.approx(want["roas_drop_threshold"])
+
+    # stricter severity thresholds never raise more high-impact days
+    loose = replay(inputs, {"severity_critical_threshold": -0.2})
+    strict = replay(inputs, {"severity_critical_threshold": -0.6})
+    assert (strict["impact"] == "high").sum() <= (loose["impact"] == "high").sum()
+
+
+def test_replay_agrees_with_insight_and_evaluator(daily, tmp_path):
+    inputs = replay_inputs(daily)
+    days = replay(inputs, {"severity_high_threshold": -0.15}, confidence_min=0.5)
+    cfg = {"severity_high_threshold": -0.15, "confidence_min": 0.5}
+    impr, clicks = daily.column("impressions"), daily.column("clicks")
+    checked = 0
+    for d in np.flatnonzero(days["num_hypotheses"].to_numpy() > 0)[:10]:
+        # day d's CTR / ROAS as the summary evidence, the as-of-day baselines as the baseline
+        summary = {
+            "global": {"daily_roas": [{"roas": inputs["last_roas"][d]}]},
+            "by_campaign": [{"impressions": impr[d], "clicks": clicks[d]}],
+        }
+        baseline = {"ctr_baseline": inputs["baseline_ctr"][d], "roas_baseline": inputs["baseline_roas"][d],
+                    "rows_used": 30}
+        hyps = generate_insights(summary, baseline, base_dir=str(tmp_path))
+        validated, metrics = validate(hyps, summary, cfg, baseline=baseline, base_dir=str(tmp_path))
+        assert len(hyps) == days["num_hypotheses"].iloc[d]
+        assert metrics["num_passed"] == days["num_validated"].iloc[d]
+        assert {v["impact"] for v in validated} == {days["impact"].iloc[d]}
+        checked += 1
+    assert checked
+
+
+def test_backtest_pool_matches_serial(daily):
+    grid = {"ctr_z": [1.0, 2.0], "roas_z": [0.5, 1.0, 1.5]}
+    start, end = "2025-02-01", "2025-03-15"
+    serial = backtest(daily, grid, start=start, end=end, max_workers=1)
+    pooled = backtest(daily, grid, start=start, end=end, max_workers=2)
+    assert len(serial) == 6
+    assert (serial["days"] == 43).all()
+    pd.testing.assert_frame_equal(serial, pooled)
+
+    # higher roas_z -> higher drop thresholds -> never more ROAS alerts
+    by_z = serial[serial["ctr_z"] == 1.0].sort_values("roas_z")["roas_alerts"].to_numpy()
+    assert (np.diff(by_z) <= 0).all()
+
+    # scoring against known incident days
+    alerts = replay(replay_inputs(daily), {})
+    incident_days = alerts.loc[alerts["alert"], "date"].iloc[:3].tolist()
+    scored = backtest(daily, [{}], incidents=incident_days, max_workers=1).iloc[0]
+    assert scored["recall"] == 1.0
+    assert 0 < scored["precision"] <= 1.0
+
+    with pytest.raises(ValueError):
+        backtest(daily, [{"window": 3}])
+
+
+def test_backtest_cli_writes_csv(tmp_path):
+    out = tmp_path / "bt.csv"
+    res = main(["--ctr-z", "1", "1.5", "--workers", "1", "--out", str(out)])
+    assert len(res) == 2
+    assert list(pd.read_csv(out)["ctr_z"]) == [1.0, 1.5]
@@ -0,0 +1,38 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.utils.aggregates import DailyAggregate
+from src.utils.baseline import EwmaBaselines
+
+
+def test_ewma_baselines_incremental_matches_one_pass(tmp_path):
+    df = pd.read_csv("data/sample_fb_ads.csv", parse_dates=["date"])
+    days = sorted(df["date"].unique())
+    path = str(tmp_path / "ewma.json")
+
+    # two runs: the second folds in only the days closed since the first
+    first = df[df["date"] <= days[10]]
+    run1 = EwmaBaselines.load(path, halflife_days=5)
+    run1.update(DailyAggregate.from_frame(first), first, "campaign_name").save(path)
+    inc = EwmaBaselines.load(path, halflife_days=5)
+    inc.update(DailyAggregate.from_frame(df), df, "campaign_name", include_last_day=True)
+
+    full = EwmaBaselines(halflife_days=5).update(DailyAggregate.from_frame(df), df, "campaign_name",
+                                                 include_last_day=True)
+    assert inc.through == full.through == np.datetime64(days[-1], "D")
+    for name in [None] + list(df["campaign_name"].unique()[:5]):
+        assert inc.baselines(name) == pytest.approx(full.baselines(name))
+
+    # the global series is the standard (adjust=False) exponentially weighted mean / variance
+    daily = df.groupby("date")[["clicks", "impressions", "revenue", "spend"]].sum()
+    daily = daily[(daily["impressions"] != 0) & (daily["spend"] != 0)]
+    ctr = daily["clicks"] / daily["impressions"]
+    ewm = ctr.ewm(alpha=full.alpha, adjust=False)
+    got = full.baselines()
+    assert got["rows_used"] == len(ctr)
+    assert got["ctr_baseline"] == pytest.approx(ewm.mean().iloc[-1])
+    assert got["ctr_std"] == pytest.approx(np.sqrt(ewm.var(bias=True).iloc[-1]))
+
+    # a different half-life does not reuse the stored state
+    assert EwmaBaselines.load(path, halflife_days=3).through is None
@@ -0,0 +1,41 @@
+import pandas as pd
+import pytest
+from src.agents.data_agent import load_data
+from src.utils.cube import RollupCube
+
+
+def test_drill_matches_groupby_on_raw_frame():
+    df = load_data("data/sample_fb_ads.csv")
+    cube = RollupCube.from_frame(df)
+    assert {"campaign_name", "platform", "country"} <= set(cube.dims)
+
+    got = cube.drill(["platform", "country"], filters={"creative_type": ["Image", "Video"]},
+                     date_range=("2025-01-05", "2025-01-20"))
+    raw = df[df["creative_type"].isin(["Image", "Video"]) & df["date"].between("2025-01-05", "2025-01-20")]
+    want = raw.groupby(["platform", "country"], observed=True)[["spend", "clicks"]].sum()
+    assert len(got) == len(want)
+    for _, r in got.iterrows():
+        assert r["spend"] == pytest.approx(want.loc[(r["platform"], r["country"]), "spend"])
+        assert r["clicks"] == pytest.approx(want.loc[(r["platform"], r["country"]), "clicks"])
+
+    total = cube.drill()
+    assert total["spend"].iloc[0] == pytest.approx(df["spend"].sum())
+    assert total["roas"].iloc[0] == pytest.approx(df["revenue"].sum() / df["spend"].sum())
+
+
+def test_drill_by_date_and_missing_labels():
+    df = pd.DataFrame({
+        "date": pd.to_datetime(["2025-01-01", "2025-01-01", "2025-01-02"]),
+        "platform": ["Facebook", None, "Instagram"],
+        "spend": [10.0, 5.0, 0.0],
+        "impressions": [100, 50, 10],
+        "clicks": [2, 1, 0],
+        "revenue": [30.0, 5.0, 0.0],
+    })
+    cube = RollupCube.from_frame(df)
+    by_day = cube.drill(["platform"], by_date=True)
+    assert list(by_day["date"].dt.strftime("%Y-%m-%d")) == ["2025-01-01", "2025-01-01", "2025-01-02"]
+    assert None in set(by_day["platform"])
+    assert cube.to_records(["platform"], filters={"platform": "Instagram"})[0]["roas"] == 0.0
+    with pytest.raises(KeyError):
+        cube.drill(["country"])
@@ -20,3 +20,15 @@ def test_validate_small_sample_adjustment():
     validated, metrics = validate(hyps, summary, {"confidence_min": 0.5})
     assert metrics["num_hypotheses"] == 1
     assert isinstance(validated, list)
+
+
+def test_validate_uses_precomputed_baseline():
+    hyps = [{"id": "H1", "hypothesis": "roas declined", "initial_confidence": 0.4}]
+    summary = {"global": {"daily_roas": [{"date": "2025-01-31", "roas": 1.0}]},
+               "by_campaign": [{"impressions": 1000, "clicks": 10}]}
+    baseline = {"ctr_baseline": 0.01, "roas_baseline": 2.0, "rows_used": 30}
+    validated, metrics = validate(hyps, summary, {"confidence_min": 0.5}, baseline=baseline)
+    assert metrics["roas_baseline"] == 2.0
+    assert validated[0]["evidence"]["roas_delta_pct"] == -0.5
+    assert validated[0]["impact"] == "high"
+    assert validated[0]["passed"] is True
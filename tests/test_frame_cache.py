@@ -0,0 +1,117 @@
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from src.agents.data_agent import load_csv_safe
+from src.utils import frame_cache
+from src.utils.frame_cache import evict_lru, file_fingerprint, load_cached_frame, store_cached_frame
+from src.utils.partitions import load_partition_state, store_partition_state
+
+
+def _write_csv(path, n=20):
+    pd.DataFrame({
+        "date": pd.date_range("2025-01-01", periods=n).strftime("%Y-%m-%d"),
+        "campaign_name": ["A", "B"] * (n // 2),
+        "spend": np.arange(n, dtype=float),
+        "impressions": np.arange(n) * 100,
+        "clicks": np.arange(n),
+        "revenue": np.arange(n) * 3.0,
+        "creative_message": ["hello"] * (n - 1) + [None],
+    }).to_csv(path, index=False)
+
+
+def _entries(cache):
+    return [k for k in os.listdir(cache) if os.path.isdir(os.path.join(cache, k))]
+
+
+def test_cached_frame_round_trip(tmp_path):
+    src = tmp_path / "ads.csv"
+    cache = tmp_path / "cache"
+    _write_csv(src)
+
+    cold = load_csv_safe(str(src), cache_dir=str(cache))
+    assert len(_entries(cache)) == 1
+    warm = load_csv_safe(str(src), cache_dir=str(cache))
+    pd.testing.assert_frame_equal(cold, warm)
+
+
+def test_cache_invalidated_when_file_changes(tmp_path):
+    src = tmp_path / "ads.csv"
+    cache = tmp_path / "cache"
+    _write_csv(src, n=20)
+    load_csv_safe(str(src), cache_dir=str(cache))
+
+    _write_csv(src, n=30)
+    assert len(load_csv_safe(str(src), cache_dir=str(cache))) == 30
+    assert len(_entries(cache)) == 2
+
+
+def test_lru_eviction_keeps_recent_entries(tmp_path):
+    cache = str(tmp_path / "cache")
+    df = pd.DataFrame({"x": np.arange(1000, dtype=float)})
+    paths = []
+    for i in range(3):
+        p = tmp_path / f"f{i}.csv"
+        p.write_text(f"x\n{i}\n")
+        store_cached_frame(str(p), df, cache)
+        paths.append(str(p))
+
+    # touch the first entry so the second becomes least recently used
+    assert load_cached_frame(paths[0], cache) is not None
+    one_entry = max(os.path.getsize(os.path.join(cache, k, f)) for k in _entries(cache)
+                    for f in os.listdir(os.path.join(cache, k)))
+    removed = evict_lru(cache, max_bytes=2 * one_entry + 4096)
+
+    assert len(removed) == 1
+    assert load_cached_frame(paths[1], cache) is None
+    assert load_cached_frame(paths[0], cache) is not None
+    assert load_cached_frame(paths[2], cache) is not None
+
+
+def test_fingerprint_hashes_in_full_only_when_identity_changes(tmp_path, monkeypatch):
+    src = tmp_path / "ads.csv"
+    cache = str(tmp_path / "cache")
+    _write_csv(src)
+    calls = []
+    full_hash = frame_cache._content_hash
+    monkeypatch.setattr(frame_cache, "_content_hash", lambda p: calls.append(p) or full_hash(p))
+
+    first = file_fingerprint(str(src), cache)
+    assert file_fingerprint(str(src), cache) == first
+    assert len(calls) == 1
+
+    # a touch changes mtime but not the content: re-hashed once, same cache key
+    os.utime(src, ns=(first["mtime_ns"] + 10**9, first["mtime_ns"] + 10**9))
+    touched = file_fingerprint(str(src), cache)
+    assert len(calls) == 2
+    assert frame_cache.cache_key(touched) == frame_cache.cache_key(first)
+
+    _write_csv(src, n=30)
+    assert file_fingerprint(str(src), cache)["content_hash"] != first["content_hash"]
+    assert len(calls) == 3
+
+
+def test_lru_eviction_covers_partition_states(tmp_path):
+    cache = str(tmp_path / "cache")
+    src = tmp_path / "f.csv"
+    _write_csv(src)
+    store_cached_frame(str(src), pd.DataFrame({"x": np.arange(1000, dtype=float)}), cache)
+    fps = [{"path": f"part{i}.csv", "size": 1, "content_hash": str(i)} for i in range(3)]
+    paths = [store_partition_state(cache, fp, {"blob": "x" * 20_000}) for fp in fps]
+    for path, age in zip(paths, (300, 200, 100)):
+        os.utime(path, (time.time() - age, time.time() - age))
+
+    def total():
+        return sum(os.path.getsize(os.path.join(d, f)) for d, _, fs in os.walk(cache) for f in fs
+                   if f != "fingerprints.json")
+
+    # partition states count against the cap: the oldest one goes first
+    assert evict_lru(cache, max_bytes=total() - 1) == [os.path.join("partitions", os.path.basename(paths[0]))]
+    # a cache hit counts as an access, so part2 is now older than part1
+    assert load_partition_state(cache, fps[1]) is not None
+    evict_lru(cache, max_bytes=total() - 1)
+    assert load_partition_state(cache, fps[2]) is None
+    assert load_partition_state(cache, fps[1]) is not None
+    assert load_cached_frame(str(src), cache) is not None
@@ -0,0 +1,69 @@
+import tracemalloc
+
+import numpy as np
+
+from src.utils.memprof import MemoryProfiler, check_memory_budget, rss_bytes
+from src.utils.tracing import span, start_trace
+
+
+def profile(fn, **kwargs):
+    tracer = start_trace("unit")
+    profiler = MemoryProfiler(**kwargs).start()
+    tracer.add_hook(profiler)
+    try:
+        fn()
+    finally:
+        profiler.stop()
+    return tracer, profiler
+
+
+def test_stage_peaks_fold_nested_spans():
+    def work():
+        with span("outer"):
+            keep = np.ones(1_000_000)  # ~7.6 MB retained
+            with span("inner"):
+                tmp = np.ones(4_000_000)  # ~30.5 MB transient
+                del tmp
+            del keep
+
+    was_tracing = tracemalloc.is_tracing()
+    tracer, profiler = profile(work, top_n=3, rss_interval_s=0)
+    assert tracemalloc.is_tracing() == was_tracing
+    stages = {r["stage"]: r for r in profiler.stages}
+    assert stages["inner"]["peak_mb"] >= 30
+    assert abs(stages["inner"]["delta_mb"]) < 1
+    # the child's transient peak on top of what outer already held
+    assert stages["outer"]["peak_mb"] >= stages["inner"]["peak_mb"] + 7
+    assert "top_allocations" in stages["outer"] and "top_allocations" not in stages["inner"]
+    assert profiler.report()["peak_mb"] == {"outer": stages["outer"]["peak_mb"]}
+    outer_span = [sp for sp in tracer.spans if sp.name == "outer"][0]
+    assert outer_span.args["memory"]["peak_mb"] == stages["outer"]["peak_mb"]
+
+
+def test_top_allocations_name_the_call_site():
+    holder = []
+
+    def work():
+        with span("load"):
+            holder.append([bytearray(1024) for _ in range(2000)])
+
+    _, profiler = profile(work, top_n=2, rss_interval_s=0.01)
+    top = profiler.stages[0]["top_allocations"]
+    assert top and top[0]["site"].endswith(f"test_memprof.py:{work.__code__.co_firstlineno + 2}")
+    assert top[0]["size_mb"] >= 1.5
+    if rss_bytes() is not None:
+        assert profiler.stages[0]["rss_peak_mb"] >= profiler.stages[0]["rss_start_mb"]
+
+
+def test_check_memory_budget():
+    stages = [
+        {"stage": "load", "depth": 0, "peak_mb": 120.0, "rss_start_mb": 100.0, "rss_peak_mb": 300.0},
+        {"stage": "parse", "depth": 1, "peak_mb": 90.0},
+        {"stage": "summarize", "depth": 0, "peak_mb": 40.0},
+    ]
+    assert check_memory_budget(stages, None) == []
+    # RSS growth (200 MB) counts when larger than the traced peak
+    assert [(o["stage"], o["used_mb"]) for o in check_memory_budget(stages, 150)] == [("load", 200.0)]
+    over = check_memory_budget(stages, {"parse": 50, "default": 30})
+    assert [o["stage"] for o in over] == ["load", "parse", "summarize"]
+    assert check_memory_budget(stages, {"summarize": 50}) == []
@@ -0,0 +1,83 @@
+import pytest
+
+from src.utils.metrics import REGISTRY, Registry, STAGE_CALLS, STAGE_ERRORS, STAGE_LATENCY, timed
+
+
+def test_counters_gauges_and_prometheus_text():
+    reg = Registry()
+    rows = reg.counter("rows_total", "Rows read", ("source",))
+    rows.labels("a.csv").inc(10)
+    rows.labels("a.csv").inc(5)
+    reg.gauge("queue_depth", "Pending events").set(3)
+    text = reg.render_prometheus()
+    assert "# TYPE rows_total counter" in text
+    assert 'rows_total{source="a.csv"} 15' in text
+    assert "queue_depth 3" in text
+    with pytest.raises(ValueError):
+        reg.gauge("rows_total", "", ("source",))
+    with pytest.raises(ValueError):
+        rows.labels("a", "b")
+
+
+def test_histogram_buckets_and_quantiles():
+    reg = Registry()
+    h = reg.histogram("latency_seconds", "Latency", buckets=(0.1, 0.2, 0.5, 1.0))
+    for v in [0.05] * 50 + [0.15] * 49 + [0.7]:
+        h.observe(v)
+    child = h.labels()
+    assert list(child.counts) == [50, 49, 0, 1, 0]
+    assert child.count == 100
+    assert child.quantile(0.5) == pytest.approx(0.1)
+    assert 0.5 < child.quantile(0.995) <= 1.0
+    h.observe(5.0)  # +Inf bucket
+    text = reg.render_prometheus()
+    assert 'latency_seconds_bucket{le="0.2"} 99' in text
+    assert 'latency_seconds_bucket{le="+Inf"} 101' in text
+    assert "latency_seconds_count 101" in text
+    snap = reg.snapshot()["latency_seconds"][""]
+    assert snap["count"] == 101 and snap["p50"] is not None and snap["p99"] <= 1.0
+
+
+def test_state_round_trip_accumulates(tmp_path):
+    path = str(tmp_path / "state.json")
+    reg = Registry()
+    reg.histogram("h", "H", ("stage",)).labels("load").observe(0.003)
+    reg.counter("c", "C").inc(2)
+    reg.save(path)
+
+    again = Registry().load(path)
+    again.histogram("h", "H", ("stage",)).labels("load").observe(0.004)
+    again.counter("c", "C").inc()
+    snap = again.snapshot()
+    assert snap["h"]["stage=load"]["count"] == 2
+    assert snap["c"][""] == 3
+    assert "# HELP c C" in again.render_prometheus()
+    assert Registry().load(str(tmp_path / "missing.json")).snapshot() == {}
+
+
+@pytest.fixture
+def global_registry():
+    """The process-wide REGISTRY, restored afterwards without the test's series."""
+    saved = REGISTRY.to_state()
+    yield REGISTRY
+    for fam in (STAGE_LATENCY, STAGE_CALLS, STAGE_ERRORS):
+        fam.children.pop(("unit_stage",), None)
+    REGISTRY.reset()
+    REGISTRY.load_state(saved)
+
+
+def test_timed_decorator_records_latency_and_errors(global_registry):
+    @timed("unit_stage")
+    def work(x, *, fail=False):
+        if fail:
+            raise RuntimeError("boom")
+        return x * 2
+
+    global_registry.reset()
+    assert work(2) == 4
+    with pytest.raises(RuntimeError):
+        work(1, fail=True)
+    assert STAGE_CALLS.labels("unit_stage").value == 2
+    assert global_registry.snapshot()["stage_errors_total"]["stage=unit_stage"] == 1
+    assert STAGE_LATENCY.labels("unit_stage").count == 2
+    assert work.__name__ == "work"
@@ -0,0 +1,187 @@
+import json
+import multiprocessing as mp
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import pytest
+
+from src.utils import observability
+from src.utils.observability import (
+    FileSink,
+    JsonlSink,
+    QueueSink,
+    configure_sink,
+    event_stats,
+    flush_events,
+    log_event,
+    set_sink,
+)
+
+
+@pytest.fixture(autouse=True)
+def restore_sink():
+    old = observability.get_sink()
+    yield
+    set_sink(old)
+
+
+def read_jsonl(path):
+    with open(path, encoding="utf-8") as fh:
+        return [json.loads(line) for line in fh]
+
+
+def test_jsonl_sink_buffers_into_one_file(tmp_path):
+    set_sink(JsonlSink(flush_bytes=10**9, flush_interval_s=3600))
+    paths = {log_event("agent", f"e{i}", {"i": i}, base_dir=str(tmp_path)) for i in range(50)}
+    assert len(paths) == 1
+    path = paths.pop()
+    # nothing written until a threshold or an explicit flush
+    assert not (tmp_path / path.split("/")[-1]).exists()
+    flush_events()
+    recs = read_jsonl(path)
+    assert [r["payload"]["i"] for r in recs] == list(range(50))
+    assert recs[0]["agent"] == "agent" and recs[0]["event"] == "e0" and "timestamp" in recs[0]
+    assert len(list(tmp_path.iterdir())) == 1
+
+
+def test_jsonl_sink_flushes_on_size(tmp_path):
+    sink = JsonlSink(flush_bytes=200, flush_interval_s=3600)
+    set_sink(sink)
+    path = log_event("agent", "big", {"blob": "x" * 300}, base_dir=str(tmp_path))
+    assert len(read_jsonl(path)) == 1
+    log_event("agent", "small", {}, base_dir=str(tmp_path))
+    assert len(read_jsonl(path)) == 1
+    sink.close()
+    assert len(read_jsonl(path)) == 2
+
+
+def test_file_sink_and_explicit_filename(tmp_path):
+    assert isinstance(configure_sink("file"), FileSink)
+    path = log_event("my agent", "done", {"ok": True}, base_dir=str(tmp_path))
+    assert path.endswith(".json") and "my_agent_done_" in path
+    with open(path, encoding="utf-8") as fh:
+        assert json.load(fh)["payload"] == {"ok": True}
+
+    configure_sink("jsonl")
+    named = log_event("agent", "named", {}, base_dir=str(tmp_path), filename="named.json")
+    assert named == str(tmp_path / "named.json")
+    with pytest.raises(ValueError):
+        configure_sink("syslog")
+
+
+def _worker_logs(base_dir):
+    log_event("worker", "child", {}, base_dir=base_dir)
+    return True
+
+
+@pytest.mark.skipif("fork" not in mp.get_all_start_methods(), reason="fork start method unavailable")
+@pytest.mark.parametrize("queue_size", [None, 100])
+def test_forked_workers_do_not_duplicate_parent_buffer(tmp_path, queue_size):
+    base = str(tmp_path)
+    configure_sink("jsonl", flush_bytes=10**9, flush_interval_s=3600, queue_size=queue_size)
+    path = log_event("parent", "before_fork", {}, base_dir=base)
+    with ProcessPoolExecutor(max_workers=2, mp_context=mp.get_context("fork")) as pool:
+        assert all(pool.map(_worker_logs, [base] * 4))
+    flush_events()
+    events = [r["event"] for r in read_jsonl(path)]
+    assert events.count("before_fork") == 1
+    assert events.count("child") == 4
+
+
+class GatedSink:
+    """Inner sink whose writes wait until the gate opens (a slow disk)."""
+
+    def __init__(self):
+        self.gate = threading.Event()
+        self.events = []
+
+    def write(self, rec, base_dir):
+        self.gate.wait()
+        self.events.append(rec["payload"]["i"])
+        return base_dir
+
+    def flush(self):
+        pass
+
+    def close(self):
+        pass
+
+
+def fill(sink, n, start=0):
+    for i in range(start, start + n):
+        sink.write({"agent": "a", "event": "e", "timestamp": "t", "payload": {"i": i}}, "logs")
+
+
+def stall(sink):
+    """Queue one event and wait until the writer thread holds it (blocked on the gate)."""
+    fill(sink, 1, start=-1)
+    while sink.stats()["pending"]:
+        time.sleep(0.001)
+
+
+def test_queue_sink_writes_everything_off_thread(tmp_path):
+    sink = configure_sink("jsonl", queue_size=100, flush_bytes=10**9, flush_interval_s=3600)
+    assert isinstance(sink, QueueSink)
+    path = None
+    for i in range(500):
+        path = log_event("agent", "e", {"i": i}, base_dir=str(tmp_path))
+    flush_events()
+    assert [r["payload"]["i"] for r in read_jsonl(path)] == list(range(500))
+    stats = event_stats()
+    assert stats["queued"] == stats["written"] == 500
+    assert stats["dropped"] == 0 and stats["pending"] == 0
+
+
+def test_queue_sink_drop_oldest_keeps_newest():
+    inner = GatedSink()
+    sink = QueueSink(inner, maxsize=5, overflow="drop_oldest")
+    stall(sink)
+    fill(sink, 50)
+    assert sink.stats()["dropped"] == 45
+    inner.gate.set()
+    sink.close()
+    assert inner.events == [-1] + list(range(45, 50))
+    assert sink.stats()["written"] == 6
+
+
+def test_queue_sink_sample_keeps_every_nth_overflow():
+    inner = GatedSink()
+    sink = QueueSink(inner, maxsize=1000, overflow="sample", sample_every=10)
+    stall(sink)
+    fill(sink, 1000)
+    assert sink.stats()["dropped"] == 0
+    fill(sink, 100, start=1000)
+    stats = sink.stats()
+    # 100 overflowing events: 10 kept (each evicting one queued event), 90 dropped
+    assert stats["dropped"] == 90 + 10
+    assert stats["queued"] == 1 + 1000 + 10
+    inner.gate.set()
+    sink.flush()
+    assert sink.stats()["written"] == 1 + 1000
+    assert inner.events[-10:] == list(range(1000, 1100, 10))
+    with pytest.raises(ValueError):
+        QueueSink(inner, overflow="spill")
+
+
+def test_queue_sink_serializes_at_enqueue(tmp_path):
+    inner = JsonlSink(flush_bytes=10**9, flush_interval_s=3600)
+    gated = GatedSink()
+    sink = QueueSink(inner, maxsize=100)
+    set_sink(sink)
+    gated_sink = QueueSink(gated, maxsize=100)
+    payload = {"rows": [1, 2]}
+    path = log_event("agent", "snap", payload, base_dir=str(tmp_path))
+    # the caller keeps mutating its live payload after logging
+    payload["rows"].append(3)
+    payload["late"] = True
+    flush_events()
+    assert read_jsonl(path)[0]["payload"] == {"rows": [1, 2]}
+
+    # inner sinks without encode/write_encoded get a snapshot of the record
+    rec = {"agent": "a", "event": "e", "timestamp": "t", "payload": {"i": 7}}
+    gated_sink.write(rec, "logs")
+    rec["payload"]["i"] = 8
+    gated.gate.set()
+    gated_sink.close()
+    assert gated.events == [7]
@@ -5,3 +5,12 @@ def test_planner_structure():
     out = plan("test")
     assert "steps" in out
     assert len(out["steps"]) == 7
+
+
+def test_planner_infers_window_and_predicate():
+    from src.agents.planner import date_predicate
+
+    assert plan("Why did ROAS drop in the last 14 days?")["window_days"] == 14
+    assert plan("CTR over the past week")["window_days"] == 7
+    assert plan("analyze ROAS")["window_days"] is None
+    assert date_predicate(7, lookback_days=30, as_of="2025-03-31") == ("2025-02-23", "2025-03-31")
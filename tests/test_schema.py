@@ -14,3 +14,51 @@ def test_schema_fingerprint_and_drift():
     drift = detect_schema_drift(fp1, fp3)
     assert drift["drift"] is True
     assert "removed" in drift["diff"] and "b" in drift["diff"]["removed"]
+
+
+def test_typed_reader_categories_and_pruning(tmp_path):
+    from src.agents.data_agent import load_csv_safe
+
+    p = tmp_path / "ads.csv"
+    pd.DataFrame({
+        "date": ["2025-01-01", "2025-01-02"],
+        "campaign_name": ["A", "A"],
+        "platform": ["Facebook", "Instagram"],
+        "spend": [10, 20],
+        "impressions": [100, 200],
+        "clicks": [1, 2],
+        "revenue": [50, 100],
+        "ctr": [0.01, 0.01],
+        "creative_message": ["msg1", "msg2"],
+    }).to_csv(p, index=False)
+
+    df = load_csv_safe(str(p), prune=True, include_creative=False)
+    assert str(df["campaign_name"].dtype) == "category"
+    assert str(df["platform"].dtype) == "category"
+    # whole counts come back as int64, like an untyped read
+    assert str(df["impressions"].dtype) == "int64"
+    assert "creative_message" not in df.columns
+    assert "ctr" not in df.columns
+
+    assert "creative_message" in load_csv_safe(str(p), prune=True).columns
+
+
+def test_typed_read_keeps_dtypes_and_fingerprint(tmp_path):
+    from src.agents.data_agent import load_csv_safe
+
+    p = tmp_path / "ads.csv"
+    pd.DataFrame({
+        "date": ["2025-01-01", "2025-01-02", "2025-01-03"],
+        "campaign_name": ["A", "B", "A"],
+        "spend": [10.5, 20.0, 5.25],
+        "impressions": [100, 200, 300],
+        "clicks": [1.0, None, 3.0],
+        "revenue": [50.0, 100.0, 7.5],
+    }).to_csv(p, index=False)
+
+    typed, plain = load_csv_safe(str(p)), load_csv_safe(str(p), typed=False)
+    assert str(typed["campaign_name"].dtype) == "category"
+    assert str(typed["impressions"].dtype) == "int64"
+    # NaN-bearing counts stay float64, as inference gives them
+    assert str(typed["clicks"].dtype) == "float64"
+    assert schema_fingerprint_from_df(typed)["hash"] == schema_fingerprint_from_df(plain)["hash"]
@@ -0,0 +1,94 @@
+import numpy as np
+import pandas as pd
+import pytest
+from src.utils.aggregates import PartialAggregates
+from src.utils.sketches import HyperLogLog
+
+
+def test_hll_estimate_merge_and_state():
+    a = HyperLogLog(12).update(np.arange(0, 60_000))
+    b = HyperLogLog(12).update(np.arange(40_000, 100_000).astype(float))  # 5 and 5.0 hash alike
+    assert len(a) == pytest.approx(60_000, rel=0.05)
+    merged = HyperLogLog.from_state(a.to_state()).merge(b)
+    assert len(merged) == pytest.approx(100_000, rel=0.05)
+    assert len(HyperLogLog(12).update(["x", "y", "x", None])) == 2
+    with pytest.raises(ValueError):
+        a.merge(HyperLogLog(10))
+
+
+def test_partial_aggregates_hll_distinct_counts_merge():
+    rng = np.random.default_rng(0)
+    n = 20_000
+    df = pd.DataFrame({
+        "date": pd.Timestamp("2025-01-01") + pd.to_timedelta(rng.integers(0, 30, n), unit="D"),
+        "campaign_name": rng.integers(0, 300, n).astype(str),
+        "adset_name": rng.integers(0, 2_000, n).astype(str),
+        "creative_id": rng.integers(0, 5_000, n),
+        "spend": rng.random(n),
+        "revenue": rng.random(n),
+        "impressions": rng.integers(1, 100, n),
+        "clicks": rng.integers(0, 5, n),
+    })
+    parts = [PartialAggregates.from_frame(df.iloc[i::4], distinct="hll").to_state() for i in range(4)]
+    merged = PartialAggregates.from_state(parts[0])
+    for s in parts[1:]:
+        merged.merge(PartialAggregates.from_state(s))
+
+    counts = merged.finalize()["global"]["distinct_counts"]
+    assert counts["campaign"] == pytest.approx(df["campaign_name"].nunique(), rel=0.05)
+    assert counts["adset"] == pytest.approx(df["adset_name"].nunique(), rel=0.05)
+    assert merged.num_creatives == pytest.approx(df["creative_id"].nunique(), rel=0.05)
+    before = (merged.rows, dict(merged.missing_values), list(merged.columns))
+    with pytest.raises(ValueError):
+        merged.merge(PartialAggregates.from_frame(df.head(10)))
+    with pytest.raises(ValueError):
+        merged.merge(PartialAggregates.from_frame(df.head(10), distinct="hll", hll_precision=10))
+    # rejected merges leave the state untouched
+    assert (merged.rows, merged.missing_values, merged.columns) == before
+
+
+def test_tdigest_exact_then_approximate_and_mergeable():
+    from src.utils.sketches import TDigest
+
+    small = np.linspace(0.0, 1.0, 40)
+    assert TDigest().update(small).quantile(0.1) == pytest.approx(np.percentile(small, 10))
+
+    x = np.random.default_rng(1).lognormal(size=50_000)
+    a, b = TDigest(), TDigest()
+    for chunk in np.array_split(x[:20_000], 10):
+        a.update(chunk)
+    b.update(x[20_000:])
+    merged = TDigest.from_state(a.to_state()).merge(b)
+    assert merged.means.size <= 2 * merged.compression
+    for q in (0.1, 0.5, 0.9):
+        assert merged.quantile(q) == pytest.approx(np.quantile(x, q), rel=0.02)
+
+
+def test_baseline_sketches_add_closed_days_once(tmp_path):
+    from src.utils.aggregates import DailyAggregate
+    from src.utils.baseline import BaselineSketches, compute_global_baselines
+
+    df = pd.read_csv("data/sample_fb_ads.csv", parse_dates=["date"])
+    days = sorted(df["date"].unique())
+    path = str(tmp_path / "sketches.json")
+
+    first = df[df["date"] <= days[10]]
+    BaselineSketches.load(path).update(DailyAggregate.from_frame(first), first, "campaign_name").save(path)
+    sk = BaselineSketches.load(path)
+    sk.update(DailyAggregate.from_frame(df), df, "campaign_name", include_last_day=True)
+
+    want = compute_global_baselines(df, window_days=len(days))
+    got = sk.baselines()
+    assert got["rows_used"] == want["rows_used"]
+    for key in ("ctr_pctile_10", "ctr_pctile_90", "roas_pctile_10", "roas_pctile_90", "roas_baseline"):
+        assert got[key] == pytest.approx(want[key])
+    campaign = df["campaign_name"].iloc[0]
+    seg = df[df["campaign_name"] == campaign].groupby("date")[["impressions", "spend"]].sum()
+    assert sk.baselines(segment=campaign)["rows_used"] == int(((seg["impressions"] > 0) & (seg["spend"] > 0)).sum())
+    for name, seg in df.groupby("campaign_name"):
+        daily = seg.groupby("date")[["impressions", "clicks", "spend"]].sum()
+        daily = daily[(daily["impressions"] > 0) & (daily["spend"] > 0)]
+        got = sk.baselines(segment=name)
+        assert got["rows_used"] == len(daily)
+        if len(daily):
+            assert got["ctr_baseline"] == pytest.approx((daily["clicks"] / daily["impressions"]).mean())
@@ -0,0 +1,75 @@
+import importlib.util
+
+import pandas as pd
+import pytest
+
+from src.orchestrator.sweep import SWEEP_PARAMS, expand_spec, main, sweep
+
+
+def test_expand_spec_grid_and_random():
+    grid = expand_spec({"grid": {"ctr_z": [1.0, 2.0], "window_days": [14, 30]}})
+    assert len(grid) == 4
+    assert {"ctr_z": 2.0, "window_days": 14} in grid
+
+    spec = {"grid": {"ctr_z": [1.0, 2.0]}, "random": {"min_days": {"low": 3, "high": 9},
+                                                      "roas_z": {"low": 0.5, "high": 2.0}}, "n": 5, "seed": 1}
+    combos = expand_spec(spec)
+    assert len(combos) == 10
+    assert all(isinstance(c["min_days"], int) and 3 <= c["min_days"] <= 9 for c in combos)
+    assert combos == expand_spec(spec)  # seeded
+
+    with pytest.raises(ValueError):
+        expand_spec({"grid": {"bogus": [1]}})
+
+
+def test_sweep_pool_matches_serial():
+    df = pd.read_csv("data/sample_fb_ads.csv")
+    combos = expand_spec({"grid": {"window_days": [14, 30], "ctr_z": [1.0, 2.0],
+                                   "severity_critical_threshold": [-0.6, -0.1]}})
+    serial = sweep(df, combos, max_workers=1)
+    pooled = sweep(df, combos, max_workers=2)
+    assert len(serial) == 8
+    assert list(serial.columns[:len(SWEEP_PARAMS)]) == list(SWEEP_PARAMS)
+    assert (serial["total_ms"] >= 0).all()
+
+    stable = [c for c in serial.columns if not c.endswith("_ms") and c != "worker"]
+    pd.testing.assert_frame_equal(serial[stable], pooled[stable])
+    # only z changes the CTR threshold; only the severity cut-off changes impacts
+    by_z = serial.groupby("ctr_z")["ctr_low_threshold"].max()
+    assert by_z[2.0] <= by_z[1.0]
+    loose = serial[serial["severity_critical_threshold"] == -0.1]["impact_high"].sum()
+    strict = serial[serial["severity_critical_threshold"] == -0.6]["impact_high"].sum()
+    assert strict <= loose
+
+
+def test_sweep_cli_writes_table(tmp_path):
+    out = tmp_path / "sweep.csv"
+    res = main(["--grid", "ctr_z=1,2", "--random", "window_days=7:30", "--n", "2", "--seed", "0",
+                "--workers", "1", "--out", str(out)])
+    assert len(res) == 4
+    table = pd.read_csv(out)
+    assert len(table) == 4
+    assert {"thresholds_ms", "validate_ms", "total_ms"} <= set(table.columns)
+
+
+def test_sweep_hypotheses_follow_window_days(tmp_path):
+    from src.agents.insight_agent import generate_insights
+    from src.agents.data_agent import summarize
+    from src.orchestrator.sweep import write_results
+    from src.utils.aggregates import DailyAggregate
+    from src.utils.baseline import compute_global_baselines
+
+    df = pd.read_csv("data/sample_fb_ads.csv")
+    res = sweep(df, [{"window_days": 3}, {"window_days": 30}], max_workers=1).set_index("window_days")
+    daily = DailyAggregate.from_frame(df)
+    summary = summarize(df, daily=daily)
+    # the 3-day baseline is low enough that the ROAS decline hypothesis disappears
+    assert list(res["num_hypotheses"]) == [0, 1]
+    for window in (3, 30):
+        hyps = generate_insights(summary, compute_global_baselines(daily, window_days=window),
+                                 base_dir=str(tmp_path))
+        assert res.loc[window, "num_hypotheses"] == len(hyps)
+
+    if not any(importlib.util.find_spec(m) for m in ("pyarrow", "fastparquet")):
+        with pytest.raises(ValueError, match="pyarrow"):
+            write_results(res, str(tmp_path / "sweep.parquet"))
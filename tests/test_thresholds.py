@@ -26,3 +26,84 @@ def test_compute_dynamic_thresholds_basic():
     assert isinstance(t["roas_drop_threshold"], float)
     assert t["ctr_low_threshold"] >= 0
     assert t["roas_drop_threshold"] >= 0
+
+
+def test_thresholds_accept_daily_aggregate():
+    from src.utils.aggregates import DailyAggregate
+    from src.utils.baseline import compute_global_baselines
+
+    df = make_sample_df()
+    daily = DailyAggregate.from_frame(df)
+    assert daily.n_days == 40
+    assert compute_dynamic_thresholds(daily) == compute_dynamic_thresholds(df)
+    assert compute_global_baselines(daily) == compute_global_baselines(df)
+
+    # merging aggregates of disjoint halves reproduces the whole
+    merged = DailyAggregate.from_frame(df.iloc[:15]).merge(DailyAggregate.from_frame(df.iloc[15:]))
+    assert (merged.values == daily.values).all()
+
+
+def test_dynamic_thresholds_memoized(tmp_path, monkeypatch):
+    import src.utils.thresholds as thresholds
+    from src.utils.aggregates import DailyAggregate
+
+    thresholds.clear_threshold_cache()
+    daily = DailyAggregate.from_frame(make_sample_df())
+    first = compute_dynamic_thresholds(daily, cache_dir=str(tmp_path))
+    assert len(list(tmp_path.glob("*.json"))) == 1
+
+    calls = []
+    real = thresholds.compute_global_ctr_baseline
+    monkeypatch.setattr(thresholds, "compute_global_ctr_baseline", lambda *a, **k: calls.append(1) or real(*a, **k))
+
+    # in-process hit; callers get a copy, so mutating it does not poison the cache
+    hit = compute_dynamic_thresholds(daily, cache_dir=str(tmp_path))
+    hit["ctr_baseline"]["baseline_ctr"] = -1.0
+    assert compute_dynamic_thresholds(daily) == first
+    # disk hit in a fresh process (simulated by clearing the memo)
+    thresholds.clear_threshold_cache()
+    assert compute_dynamic_thresholds(daily, cache_dir=str(tmp_path)) == first
+    assert calls == []
+
+    # different parameters or data miss the cache
+    compute_dynamic_thresholds(daily, ctr_z=2.0)
+    compute_dynamic_thresholds(make_sample_df().iloc[:-1])
+    assert len(calls) == 2
+
+
+def test_segment_thresholds_match_per_segment_loop():
+    import numpy as np
+    from src.utils.cube import RollupCube
+    from src.utils.thresholds import (SEGMENT_THRESHOLD_COLUMNS, compute_global_ctr_baseline,
+                                      compute_roas_drop_threshold, compute_segment_thresholds)
+
+    rng = np.random.default_rng(7)
+    n = 1500
+    df = pd.DataFrame({
+        "date": pd.Timestamp("2025-01-01") + pd.to_timedelta(rng.integers(0, 45, n), unit="D"),
+        "campaign_name": rng.choice([f"C{i}" for i in range(12)], n),
+        "impressions": rng.integers(0, 1000, n),
+        "clicks": rng.integers(0, 30, n),
+        "spend": np.where(rng.random(n) < 0.05, 0.0, rng.uniform(10, 100, n)),
+        "revenue": rng.uniform(0, 300, n),
+    })
+    out = compute_segment_thresholds(df, "campaign_name", window_days=14, min_days=5)
+    assert list(out.columns) == SEGMENT_THRESHOLD_COLUMNS
+    assert sorted(out.index) == sorted(df["campaign_name"].unique())
+
+    for name, part in df.groupby("campaign_name"):
+        ctr = compute_global_ctr_baseline(part, window_days=14, min_days=5, z_score=1.5)
+        roas = compute_roas_drop_threshold(part, window_days=14, min_days=5, z_score=1.0)
+        row = out.loc[name]
+        assert row["ctr_rows_used"] == ctr["rows_used"]
+        assert row["roas_rows_used"] == roas["rows_used"]
+        for ours, theirs in [("baseline_ctr", ctr["baseline_ctr"]), ("ctr_std", ctr["ctr_std"]),
+                             ("ctr_low_threshold", ctr["ctr_low_threshold"]),
+                             ("median_drop", roas["median_drop"]), ("drop_std", roas["drop_std"]),
+                             ("roas_drop_threshold", roas["roas_drop_threshold"])]:
+            np.testing.assert_allclose(row[ours], theirs, rtol=1e-9, atol=1e-15)
+
+    # the rollup cube gives the same answer without touching the raw frame
+    cube = RollupCube.from_frame(df, dims=["campaign_name"])
+    from_cube = compute_segment_thresholds(cube, "campaign_name", window_days=14, min_days=5)
+    pd.testing.assert_frame_equal(from_cube, out, check_exact=False, rtol=1e-9)
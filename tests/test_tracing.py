@@ -0,0 +1,63 @@
+import json
+import threading
+
+import pytest
+
+from src.utils.tracing import get_tracer, span, start_trace
+
+
+def test_spans_nest_and_carry_attributes():
+    tracer = start_trace("unit", query="q")
+    assert get_tracer() is tracer
+    with span("load", source="x.csv") as sp:
+        with span("parse") as inner:
+            inner.set(rows=10)
+        sp.set(rows=10, bytes=400)
+    with span("load"):
+        pass
+    tracer.finish()
+
+    by_name = {sp.name: sp for sp in tracer.spans}
+    assert by_name["parse"].depth == 1 and by_name["load"].depth == 0
+    assert by_name["parse"].args == {"rows": 10}
+    outer = [sp for sp in tracer.spans if sp.name == "load"][0]
+    assert outer.args == {"source": "x.csv", "rows": 10, "bytes": 400}
+    assert outer.start_ns <= by_name["parse"].start_ns <= by_name["parse"].end_ns <= outer.end_ns
+    # repeated top-level stages are summed, nested spans are not listed
+    assert set(tracer.stage_ms()) == {"load"}
+    assert tracer.elapsed_ms() >= tracer.stage_ms()["load"]
+
+
+def test_span_records_errors():
+    tracer = start_trace()
+    with pytest.raises(KeyError):
+        with span("boom"):
+            raise KeyError("missing")
+    assert tracer.spans[0].args["error"].startswith("KeyError")
+    assert tracer.spans[0].end_ns is not None
+
+
+def test_chrome_trace_export(tmp_path):
+    tracer = start_trace("unit")
+    with span("summarize", rows=3):
+        pass
+
+    def worker():
+        with span("background"):
+            pass
+
+    t = threading.Thread(target=worker)
+    t.start()
+    t.join()
+    tracer.finish()
+
+    path = tracer.write_chrome_trace(str(tmp_path / "trace.json"))
+    with open(path, encoding="utf-8") as fh:
+        events = json.load(fh)["traceEvents"]
+    complete = [e for e in events if e["ph"] == "X"]
+    assert [e["name"] for e in complete] == ["unit", "summarize", "background"]
+    root, summarize, background = complete
+    assert root["ts"] == 0 and root["dur"] >= summarize["dur"]
+    assert summarize["args"] == {"rows": 3}
+    assert background["tid"] != summarize["tid"]
+    assert any(e["ph"] == "M" and e["args"]["name"] == "unit" for e in events)